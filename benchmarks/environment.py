@@ -0,0 +1,37 @@
+"""Point the application at a throwaway benchmark database.
+
+Must run before anything imports `config` or `database`: both read the
+environment at import time.
+"""
+import os
+
+BENCHMARK_DB = "dms_benchmark"
+PRODUCTION_DB = "document_management_system"
+
+# Settings the app requires but the benchmark never uses for real; stubs replace Cloudinary and SMTP
+PLACEHOLDER_SETTINGS = {
+    "SECRET_KEY": "benchmark-secret-key",
+    "CLOUD_NAME": "benchmark",
+    "API_KEY": "benchmark",
+    "API_SECRET": "benchmark",
+    "GMAIL_USER": "benchmark@example.com",
+    "GMAIL_PASS": "benchmark",
+}
+
+
+def configure(mongo_url: str, db_name: str, use_mongomock: bool):
+    if db_name == PRODUCTION_DB:
+        raise SystemExit(f"Refusing to benchmark against the application database '{PRODUCTION_DB}'")
+    os.environ["MONGO_URL"] = mongo_url
+    os.environ["MONGO_DB"] = db_name
+    for key, value in PLACEHOLDER_SETTINGS.items():
+        os.environ.setdefault(key, value)
+
+    if use_mongomock:
+        try:
+            import mongomock_motor
+        except ImportError:
+            raise SystemExit("--mongomock needs the mongomock-motor package (pip install mongomock-motor)")
+        import motor.motor_asyncio
+        # database.py builds its client from this name on import
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
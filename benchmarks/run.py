@@ -0,0 +1,207 @@
+"""Benchmark the API's routers in-process against a throwaway database.
+
+    python -m benchmarks.run                                  # local mongod, every scenario
+    python -m benchmarks.run --scenarios documents.create,documents.list --requests 500
+    python -m benchmarks.run --mongomock --cloudinary-latency 0.4 --smtp-latency 0.1
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+
+The app is driven through httpx's ASGI transport, so no server is started;
+Cloudinary and SMTP are replaced by stubs that sleep for the given latency.
+Results (p50/p95/p99 latency and throughput per scenario) are printed and
+written as JSON for comparing runs across commits. The database named by
+--db is wiped and reseeded on every run.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks import environment
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, statuses, elapsed):
+    ordered = sorted(latencies)
+    to_ms = lambda seconds: round(seconds * 1000, 2) if seconds is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "p50_ms": to_ms(percentile(ordered, 0.50)),
+        "p95_ms": to_ms(percentile(ordered, 0.95)),
+        "p99_ms": to_ms(percentile(ordered, 0.99)),
+        "mean_ms": to_ms(statistics.fmean(ordered)) if ordered else None,
+        "max_ms": to_ms(ordered[-1]) if ordered else None,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+    }
+
+
+async def run_scenario(client, scenario, fixtures, token, requests, concurrency, warmup, rng):
+    headers = {"Authorization": f"Bearer {token}"} if scenario.auth else {}
+
+    async def one():
+        request = scenario.build(fixtures, rng)
+        start = time.perf_counter()
+        response = await client.request(scenario.method, headers=headers, **request)
+        return time.perf_counter() - start, response.status_code
+
+    for _ in range(warmup):
+        await one()
+
+    latencies, statuses, errors = [], {}, 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            latency, status = await one()
+            latencies.append(latency)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, statuses, time.perf_counter() - started)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Print p95/throughput changes against an earlier run; returns the scenarios that regressed."""
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)["results"]
+    regressed = []
+    print(f"\nCompared with {baseline_path}:")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("p95_ms") or not current.get("p95_ms"):
+            continue
+        change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+        print(f"  {name:28} p95 {previous['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms ({change:+.1f}%)"
+              f"   rps {previous['throughput_rps']} -> {current['throughput_rps']}")
+        if change > threshold:
+            regressed.append(name)
+    return regressed
+
+
+async def main(args):
+    environment.configure(args.mongo_url, args.db, args.mongomock)
+
+    # Imported only now: config and database read the environment on import
+    import httpx
+    from main import app
+    from benchmarks import stubs
+    from benchmarks.seed import seed, BENCHMARK_PASSWORD
+    from benchmarks.scenarios import build_scenarios
+
+    stubs.install(args.cloudinary_latency, args.smtp_latency)
+    scenarios = build_scenarios(args.upload_size, args.duplicate_ratio)
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)}. Available: {', '.join(scenarios)}", file=sys.stderr)
+        return 2
+
+    rng = random.Random(args.seed)
+    results = {}
+    # The lifespan runs migrations and starts the background workers, as in production
+    async with app.router.lifespan_context(app):
+        fixtures = await seed(args.users, args.projects, args.documents, args.comments, args.reply_ratio, args.seed)
+        print(f"Seeded {fixtures['counts']}")
+
+        transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            login = await client.post("/api/auth/token", data={
+                "username": fixtures["user_emails"][0], "password": BENCHMARK_PASSWORD,
+            })
+            login.raise_for_status()
+            token = login.json()["access_token"]
+
+            for name in selected:
+                results[name] = await run_scenario(
+                    client, scenarios[name], fixtures, token, args.requests, args.concurrency, args.warmup, rng
+                )
+                result = results[name]
+                print(f"{name:28} p50 {result['p50_ms']:>9} ms  p95 {result['p95_ms']:>9} ms  "
+                      f"p99 {result['p99_ms']:>9} ms  {result['throughput_rps']:>8} rps  errors {result['errors']}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "backend": "mongomock" if args.mongomock else args.mongo_url,
+            "seeded": fixtures["counts"],
+            "options": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{report['meta']['commit'] or 'nocommit'}-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        regressed = compare(results, args.compare, args.threshold)
+        if regressed:
+            print(f"p95 regressed by more than {args.threshold}%: {', '.join(regressed)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017", help="a local mongod to seed")
+    parser.add_argument("--db", default=environment.BENCHMARK_DB, help="database to wipe and seed")
+    parser.add_argument("--mongomock", action="store_true",
+                        help="use mongomock-motor instead of a mongod; aggregation-heavy endpoints may error")
+    parser.add_argument("--scenarios", help="comma-separated scenario names (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per scenario")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--projects", type=int, default=300)
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--comments", type=float, default=3.0, help="mean comments per document")
+    parser.add_argument("--reply-ratio", type=float, default=0.3, help="share of documents that are replies")
+    parser.add_argument("--cloudinary-latency", type=float, default=0.3, help="seconds per Cloudinary call")
+    parser.add_argument("--smtp-latency", type=float, default=0.05, help="seconds per SMTP call")
+    parser.add_argument("--upload-size", type=int, default=256 * 1024, help="bytes per uploaded file")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="share of uploads repeating content")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p95 regression in %% that fails --compare")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,84 @@
+"""Endpoint scenarios. Each builds one request from the seeded fixtures and a random generator."""
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict
+from benchmarks.seed import BENCHMARK_PASSWORD, WORDS
+
+
+@dataclass
+class Scenario:
+    """One endpoint to drive; `build(fixtures, rng)` returns the httpx request kwargs.
+
+    Requests carry the benchmark user's bearer token unless `auth` is False.
+    """
+    name: str
+    method: str
+    build: Callable[[dict, object], Dict]
+    auth: bool = True
+    tags: list = field(default_factory=list)
+
+
+def _upload_files(rng, count, size, duplicate_ratio):
+    files = []
+    for index in range(count):
+        # A share of uploads repeat earlier content, as attachments do in correspondence
+        content = (b"%" * size if rng.random() < duplicate_ratio else os.urandom(size))
+        files.append(("files", (f"attachment-{index}.pdf", content, "application/pdf")))
+    return files
+
+
+def build_scenarios(upload_size: int = 256 * 1024, duplicate_ratio: float = 0.3) -> Dict[str, Scenario]:
+    scenarios = [
+        Scenario("auth.login", "POST", lambda f, rng: {
+            "url": "/api/auth/token",
+            "data": {"username": rng.choice(f["user_emails"]), "password": BENCHMARK_PASSWORD},
+        }, auth=False, tags=["auth", "write"]),
+        Scenario("auth.me", "GET", lambda f, rng: {"url": "/api/auth/me"}, tags=["auth"]),
+
+        Scenario("projects.list", "GET", lambda f, rng: {
+            "url": "/api/projects/", "params": {"limit": 20},
+        }, tags=["projects"]),
+        Scenario("projects.get", "GET", lambda f, rng: {
+            "url": f"/api/projects/id/{rng.choice(f['project_ids'])}",
+        }, tags=["projects"]),
+        Scenario("projects.recent", "GET", lambda f, rng: {"url": "/api/projects/recent"}, tags=["projects"]),
+        Scenario("projects.stats", "GET", lambda f, rng: {"url": "/api/projects/stats"}, tags=["projects"]),
+        Scenario("projects.documents", "GET", lambda f, rng: {
+            "url": f"/api/projects/{rng.choice(f['project_ids'])}/documents",
+        }, tags=["projects"]),
+
+        Scenario("documents.list", "GET", lambda f, rng: {
+            "url": "/api/documents/", "params": {"limit": 20},
+        }, tags=["documents"]),
+        Scenario("documents.list_by_project", "GET", lambda f, rng: {
+            "url": "/api/documents/", "params": {"limit": 20, "project_id": rng.choice(f["project_ids"])},
+        }, tags=["documents"]),
+        Scenario("documents.get", "GET", lambda f, rng: {
+            "url": f"/api/documents/{rng.choice(f['document_ids'])}",
+        }, tags=["documents"]),
+        Scenario("documents.recent", "GET", lambda f, rng: {"url": "/api/documents/recent"}, tags=["documents"]),
+        Scenario("documents.search", "GET", lambda f, rng: {
+            "url": "/api/documents/search", "params": {"q": f"{rng.choice(WORDS)} {rng.choice(WORDS)}"},
+        }, tags=["documents"]),
+        Scenario("documents.comments", "GET", lambda f, rng: {
+            "url": f"/api/documents/{rng.choice(f['commented_document_ids'] or f['document_ids'])}/comments",
+        }, tags=["documents"]),
+        Scenario("documents.thread", "GET", lambda f, rng: {
+            "url": f"/api/documents/{rng.choice(f['thread_root_ids'] or f['document_ids'])}/thread",
+        }, tags=["documents"]),
+        Scenario("documents.comment", "POST", lambda f, rng: {
+            "url": f"/api/documents/{rng.choice(f['document_ids'])}/comments",
+            "params": {"content": f"Noted, {rng.choice(WORDS)} to follow"},
+        }, tags=["documents", "write"]),
+        Scenario("documents.create", "POST", lambda f, rng: {
+            "url": "/api/documents/",
+            "data": {
+                "title": f"Benchmark {rng.choice(WORDS)} letter",
+                "project_id": rng.choice(f["project_ids"]),
+                "reference_number": f"MOW/BENCH/{rng.randint(0, 10 ** 9)}",
+                "document_type": "letter",
+            },
+            "files": _upload_files(rng, 2, upload_size, duplicate_ratio),
+        }, tags=["documents", "write", "upload"]),
+    ]
+    return {scenario.name: scenario for scenario in scenarios}
@@ -0,0 +1,144 @@
+"""Seed the benchmark database with realistic volumes of users, projects, documents and comments."""
+import hashlib
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+from database import db, users_collection, projects_collection, documents_collection, comments_collection
+from services.document_threads import thread_fields
+from services.passwords import hash_password
+
+BENCHMARK_PASSWORD = "benchmark-password"
+INSERT_BATCH_SIZE = 1000
+
+WORDS = [
+    "road", "bridge", "drainage", "culvert", "asphalt", "survey", "contract", "variation", "payment",
+    "certificate", "mobilisation", "retention", "inspection", "approval", "design", "school", "hospital",
+    "dualisation", "rehabilitation", "erosion", "flyover", "interchange", "valuation", "completion",
+]
+DOCUMENT_TYPES = ["letter", "memo", "contract", "approval", "report", "drawing"]
+CONTRACTORS = ["Julius Berger", "CCECC", "Arab Contractors", "Setraco", "RCC", "Dantata & Sawoe"]
+STATUSES = ["pending", "approved", "rejected"]
+
+
+def _phrase(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+async def _insert(collection, records):
+    for start in range(0, len(records), INSERT_BATCH_SIZE):
+        await collection.insert_many(records[start:start + INSERT_BATCH_SIZE], ordered=False)
+
+
+async def seed(users: int, projects: int, documents: int, comments_per_document: float,
+               reply_ratio: float, seed_value: int = 1) -> dict:
+    """Wipe the benchmark database and fill it; returns ids the scenarios pick from."""
+    rng = random.Random(seed_value)
+    for name in await db.list_collection_names():
+        if name != "_migrations":
+            await db[name].delete_many({})
+
+    now = datetime.utcnow()
+    password_hash = await hash_password(BENCHMARK_PASSWORD)  # one bcrypt run shared by every user
+    user_records = [{
+        "_id": ObjectId(),
+        "email": f"user{index}@works.example",
+        "first_name": f"User{index}",
+        "last_name": "Benchmark",
+        "role": "admin" if index == 0 else rng.choice(["staff", "staff", "commissioner"]),
+        "password_hash": password_hash,
+        "is_active": True,
+        "created_at": now - timedelta(days=rng.randint(0, 365)),
+    } for index in range(users)]
+    await _insert(users_collection, user_records)
+    user_ids = [str(user["_id"]) for user in user_records]
+
+    project_records = [{
+        "_id": ObjectId(),
+        "project_name": f"{_phrase(rng, 3).title()} {index}",
+        "contractor": rng.choice(CONTRACTORS),
+        "resident_engineer": f"Engr. {rng.choice(WORDS).title()}",
+        "project_tags": rng.choice(["roads", "bridges", "buildings", "drainage"]),
+        "award_date": (now - timedelta(days=rng.randint(30, 2000))).strftime("%Y-%m-%d"),
+        "contract_sum": round(rng.uniform(5e7, 5e10), 2),
+        "mobilisation_paid": round(rng.uniform(1e6, 5e9), 2),
+        "interim_certificate_earned": round(rng.uniform(0, 5e9), 2),
+        "duration": f"{rng.randint(6, 48)} months",
+        "remark": _phrase(rng, 8),
+        "progress_of_work": {"progress_summary": _phrase(rng, 12), "current_status": rng.choice(STATUSES)},
+        "created_by": rng.choice(user_ids),
+        "created_at": now - timedelta(days=rng.randint(0, 1000)),
+        "updated_at": now,
+    } for index in range(projects)]
+    await _insert(projects_collection, project_records)
+    project_ids = [str(project["_id"]) for project in project_records]
+
+    document_records = []
+    for index in range(documents):
+        parent = rng.choice(document_records) if document_records and rng.random() < reply_ratio else None
+        created_at = (parent["created_at"] if parent else now - timedelta(days=400)) + timedelta(
+            minutes=rng.randint(1, 60 * 24 * 30))
+        file_items = []
+        for position in range(rng.randint(1, 3)):
+            public_id = f"ministry_works/{ObjectId()}"
+            file_items.append({
+                "url": f"https://res.cloudinary.com/benchmark/raw/upload/v1/{public_id}.pdf",
+                "name": f"{rng.choice(WORDS)}-{index}-{position}.pdf",
+                "public_id": public_id,
+                "resource_type": "raw",
+                "bytes": rng.randint(50_000, 5_000_000),
+                "checksum": hashlib.sha256(public_id.encode()).hexdigest(),
+            })
+        document_records.append({
+            "_id": ObjectId(),
+            "title": _phrase(rng, 5).capitalize(),
+            "project_id": parent["project_id"] if parent else rng.choice(project_ids),
+            "reference_number": f"MOW/{rng.randint(2015, 2026)}/{index:06d}",
+            "document_type": rng.choice(DOCUMENT_TYPES),
+            "description": _phrase(rng, 20),
+            "uploaded_by": rng.choice(user_ids),
+            "file_items": file_items,
+            "parent_document_id": str(parent["_id"]) if parent else None,
+            **thread_fields(parent),
+            "status": rng.choice(STATUSES),
+            "signed_by": [],
+            "comment_count": 0,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+
+    comment_records = []
+    for document in document_records:
+        count = int(rng.expovariate(1 / comments_per_document)) if comments_per_document else 0
+        top_level = []
+        for _ in range(count):
+            parent = rng.choice(top_level) if top_level and rng.random() < 0.4 else None
+            comment = {
+                "_id": ObjectId(),
+                "document_id": str(document["_id"]),
+                "user_id": rng.choice(user_ids),
+                "content": _phrase(rng, 15),
+                "parent_comment_id": str(parent["_id"]) if parent else None,
+                "thread_id": str(parent["_id"]) if parent else None,
+                "timestamp": document["created_at"] + timedelta(minutes=rng.randint(1, 10_000)),
+            }
+            if parent is None:
+                top_level.append(comment)
+            comment_records.append(comment)
+        document["comment_count"] = count
+    await _insert(documents_collection, document_records)
+    await _insert(comments_collection, comment_records)
+
+    return {
+        "user_emails": [user["email"] for user in user_records],
+        "user_ids": user_ids,
+        "project_ids": project_ids,
+        "document_ids": [str(document["_id"]) for document in document_records],
+        "thread_root_ids": list({document["thread_root"] for document in document_records if document["thread_root"]}),
+        "commented_document_ids": list({comment["document_id"] for comment in comment_records}),
+        "counts": {
+            "users": len(user_records),
+            "projects": len(project_records),
+            "documents": len(document_records),
+            "comments": len(comment_records),
+        },
+    }
@@ -0,0 +1,110 @@
+"""Stand-ins for Cloudinary and SMTP with configurable latency.
+
+Latencies are in seconds; uploads additionally pay for their size at
+`bandwidth` bytes per second. The stubs sleep on the calling thread, like
+the blocking SDK calls they replace.
+"""
+import random
+import time
+import uuid
+from services.cloudinary_service import cloudinary_uploader, get_resource_type
+from services.metrics import timed_call
+import services.notification_outbox as notification_outbox
+
+
+def _jittered(latency: float, jitter: float) -> float:
+    return max(0.0, random.gauss(latency, latency * jitter)) if latency else 0.0
+
+
+class StubCloudinary:
+    def __init__(self, latency: float, jitter: float = 0.2, bandwidth: float = 10 * 1024 * 1024):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.uploads = 0
+        self.deletions = 0
+
+    def _wait(self, size: int = 0):
+        time.sleep(_jittered(self.latency, self.jitter) + size / self.bandwidth)
+
+    def _result(self, filename, folder, size):
+        resource_type = get_resource_type(filename)
+        public_id = f"{folder}/{uuid.uuid4().hex}"
+        return {
+            "secure_url": f"https://res.cloudinary.com/benchmark/{resource_type}/upload/v1/{public_id}",
+            "public_id": public_id,
+            "resource_type": resource_type,
+            "bytes": size,
+        }
+
+    @timed_call("cloudinary", "upload")
+    def upload(self, file, folder="ministry_works"):
+        size = len(file.read())
+        self._wait(size)
+        self.uploads += 1
+        return self._result(getattr(file, "filename", "unknown_file"), folder, size)["secure_url"]
+
+    @timed_call("cloudinary", "upload_large")
+    def upload_large(self, file, filename, folder="ministry_works"):
+        file.seek(0)
+        size = len(file.read())
+        self._wait(size)
+        self.uploads += 1
+        return self._result(filename, folder, size)
+
+    @timed_call("cloudinary", "delete")
+    def delete(self, public_id, resource_type="raw"):
+        self._wait()
+        self.deletions += 1
+
+    @timed_call("cloudinary", "delete_many")
+    def delete_many(self, public_ids, resource_type="raw"):
+        self._wait()
+        self.deletions += len(public_ids)
+        return {public_id: "deleted" for public_id in public_ids}
+
+    @timed_call("cloudinary", "resource")
+    def resource(self, public_id, resource_type="raw"):
+        self._wait()
+        return {
+            "public_id": public_id,
+            "resource_type": resource_type,
+            "secure_url": f"https://res.cloudinary.com/benchmark/{resource_type}/upload/v1/{public_id}",
+            "bytes": 0,
+        }
+
+    @timed_call("cloudinary", "list_resources")
+    def list_resources(self, prefix, resource_type="raw", next_cursor=None):
+        self._wait()
+        return [], None
+
+
+class StubSMTPBackend:
+    """Drop-in for SMTPBackend that only waits."""
+
+    latency = 0.0
+    jitter = 0.2
+    sent = 0
+
+    @timed_call("smtp", "connect")
+    def open(self):
+        time.sleep(_jittered(self.latency, self.jitter))
+
+    @timed_call("smtp", "send")
+    def send(self, to_email, subject, message):
+        time.sleep(_jittered(self.latency, self.jitter))
+        StubSMTPBackend.sent += 1
+
+    def close(self):
+        pass
+
+
+def install(cloudinary_latency: float, smtp_latency: float) -> StubCloudinary:
+    """Route every Cloudinary and SMTP call in the app through the stubs."""
+    stub = StubCloudinary(cloudinary_latency)
+    # Modules hold the shared `cloudinary_uploader` instance, so patching it reaches all of them
+    for name in ("upload", "upload_large", "delete", "delete_many", "resource", "list_resources"):
+        setattr(cloudinary_uploader, name, getattr(stub, name))
+    StubSMTPBackend.latency = smtp_latency
+    notification_outbox.get_email_backend = StubSMTPBackend
+    return stub
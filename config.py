@@ -1,15 +1,11 @@
-import os
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict, List, Optional
 
 # Load environment variables from .env
 load_dotenv()
 
-print(f"MONGO_URL from env: {os.getenv('MONGO_URL')}")  # Test
-print(f"CLOUD_NAME from env: {os.getenv('CLOUD_NAME')}")  # Test
-print(f"SECRET_KEY from env: {os.getenv('SECRET_KEY')}")  # Test
-
 class Settings(BaseSettings):
     # MongoDB settings
     MONGO_URL: str
@@ -17,6 +13,14 @@ class Settings(BaseSettings):
     # JWT settings
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+    # Signing keys by key id, as JSON. New tokens are signed with JWT_ACTIVE_KID;
+    # any listed key still verifies, so keys can be rotated without logging everyone out.
+    # Unset signs with SECRET_KEY under the "default" key id.
+    JWT_KEYS: Dict[str, str] = {}
+    JWT_ACTIVE_KID: Optional[str] = None
+    REVOCATION_SYNC_SECONDS: int = 15
 
     # Cloudinary settings
     CLOUD_NAME: str
@@ -28,6 +32,70 @@ class Settings(BaseSettings):
 
     GMAIL_USER: str
 
+    # Approval chains per document_type, as "role:action" steps (action is "approve" or "sign").
+    # Types without a chain use "default"; an empty chain approves documents on submission.
+    APPROVAL_CHAINS: Dict[str, List[str]] = {
+        "default": ["commissioner:approve"],
+        "contract": ["staff:approve", "commissioner:sign"],
+    }
+
+    # Project export job settings
+    EXPORT_WORKERS: int = 2
+    EXPORT_JOB_TIMEOUT_MINUTES: int = 30
+
+    # Notification outbox settings
+    EMAIL_BACKEND: str = "smtp"  # "smtp", or "local" to record messages in-process
+    SMTP_HOST: str = "smtp.gmail.com"
+    SMTP_PORT: int = 465
+    EMAIL_RATE_PER_MINUTE: int = 120
+    DIGEST_ROLES: List[str] = ["admin", "commissioner"]  # roles that get a digest of all activity
+    DIGEST_HOUR_UTC: int = 7  # when daily digests go out
+
+    # Authenticated-user cache settings
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: int = 60  # seconds
+
+    # Response cache settings
+    CACHE_BACKEND: str = "memory"  # "memory", or "shared" for a store all workers see
+    CACHE_URL: Optional[str] = None  # Redis URL for the shared backend; unset uses an in-process stand-in
+    CACHE_TTL: int = 30  # seconds
+    CACHE_MAX_ENTRIES: int = 2048
+
+    # Password hashing settings
+    BCRYPT_ROUNDS: int = 12  # raising this rehashes stored passwords on their next login
+    PASSWORD_WORKERS: int = 0  # 0 uses one thread per CPU core
+    PASSWORD_QUEUE_LIMIT: int = 64  # hash/verify jobs in flight before new ones get a 429
+
+    # Login throttling settings
+    LOGIN_MAX_FAILURES_PER_ACCOUNT: int = 5
+    LOGIN_MAX_FAILURES_PER_IP: int = 20
+    LOGIN_THROTTLE_WINDOW_SECONDS: int = 300
+
+    # Serve stored (write-normalised) projects without re-validating them through Pydantic
+    PROJECT_FAST_SERIALIZATION: bool = True
+
+    # Upload pipeline settings
+    UPLOAD_WORKERS: int = 8
+    UPLOAD_CHUNK_SIZE: int = 6 * 1024 * 1024  # Cloudinary requires chunks of at least 5MB
+
+    # Direct-to-Cloudinary upload settings
+    UPLOAD_FOLDER: str = "ministry_works"
+    DIRECT_UPLOAD_TTL_SECONDS: int = 900  # how long an upload signature stays valid
+    UPLOAD_NOTIFICATION_URL: Optional[str] = None  # public URL of /api/uploads/cloudinary/notify, if reachable
+
+    # Bulk ingestion settings
+    INGEST_CHUNK_SIZE: int = 200  # manifest rows uploaded and inserted together
+
+    # Metrics settings
+    METRICS_ENABLED: bool = True  # serve /metrics
+    SLOW_REQUEST_SECONDS: Optional[float] = None  # log requests slower than this with a call breakdown
+
+    # Audit log settings
+    AUDIT_BATCH_SIZE: int = 200  # entries written per insert_many
+    AUDIT_FLUSH_SECONDS: float = 2.0  # longest an entry waits in memory
+    AUDIT_MAX_BUFFERED: int = 10000  # oldest entries are dropped beyond this while Mongo is unreachable
+    AUDIT_RETENTION_DAYS: int = 180
+
     class Config:
         env_file = ".env"
 
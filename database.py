@@ -1,51 +1,46 @@
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 
 import os
 from dotenv import load_dotenv
+from services.metrics import MongoCommandListener
 
 load_dotenv()
 
 url = os.getenv("MONGO_URL")
+db_name = os.getenv("MONGO_DB", "document_management_system")
 
 # MongoDB Connection
-client = MongoClient(url)
-db = client["document_management_system"]
+# Motor connects lazily on first use; the app lifespan pings and closes it.
+client = AsyncIOMotorClient(url, event_listeners=[MongoCommandListener()])
+db = client[db_name]
 users_collection = db["users"]
 projects_collection = db["projects"]
 documents_collection = db["documents"]
+comments_collection = db["comments"]
 signatures_collection = db["signatures"]
 approvals_collection = db["approvals"]
 notifications_collection = db["notifications"]
 logs_collection = db["logs"]
+outbox_collection = db["notification_outbox"]
+export_jobs_collection = db["export_jobs"]
+migrations_collection = db["_migrations"]
+revoked_tokens_collection = db["revoked_tokens"]
+ingest_batches_collection = db["ingest_batches"]
+ingest_checkpoints_collection = db["ingest_checkpoints"]
+pending_uploads_collection = db["pending_uploads"]
+asset_deletions_collection = db["asset_deletions"]
+asset_reconciliations_collection = db["asset_reconciliations"]
+assets_collection = db["assets"]
+subscriptions_collection = db["subscriptions"]
+notification_digests_collection = db["notification_digests"]
+file_versions_collection = db["file_versions"]
 
 
-async def create_indexes():
-    # Users indexes
-    await users_collection.create_index("email", unique=True)
+async def connect_to_mongo():
+    """Verify the connection on startup so a bad MONGO_URL fails fast."""
+    await client.admin.command("ping")
 
-    # Documents indexes
-    await documents_collection.create_index("reference_number", unique=True)
-    await documents_collection.create_index("project_id")
-    await documents_collection.create_index("title")
-    await documents_collection.create_index("created_at")
 
-    # Projects indexes
-    await projects_collection.create_index("project_name")
-    await projects_collection.create_index("created_by")
+def close_mongo_connection():
+    client.close()
 
-    # Approvals indexes
-    await approvals_collection.create_index("document_id")
-    await approvals_collection.create_index("approved_by")
-
-    # Signatures indexes
-    await signatures_collection.create_index("document_id")
-    await signatures_collection.create_index("user_id")
-
-    # Notifications indexes
-    await notifications_collection.create_index("user_id")
-    await notifications_collection.create_index("is_read")
-
-    # Logs indexes
-    await logs_collection.create_index("user_id")
-    await logs_collection.create_index("document_id")
-    await logs_collection.create_index("timestamp")
\ No newline at end of file
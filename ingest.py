@@ -0,0 +1,54 @@
+"""Bulk-import archived documents from the command line.
+
+    python ingest.py manifest.csv /path/to/files-or-archive.zip --uploaded-by clerk@example.com
+
+Re-run with --batch-id <id> to resume an interrupted import; rows that were
+already imported are skipped.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from database import connect_to_mongo, close_mongo_connection, users_collection
+from services.migrations import run_migrations
+from services.bulk_ingest import open_source, parse_manifest, validate_manifest, create_ingest_batch, run_ingestion
+
+
+async def main(args):
+    await connect_to_mongo()
+    await run_migrations()
+    try:
+        user = await users_collection.find_one({"email": args.uploaded_by}, {"_id": 1})
+        if not user:
+            print(f"No user with email {args.uploaded_by}", file=sys.stderr)
+            return 1
+
+        with open(args.manifest, "rb") as manifest:
+            rows = parse_manifest(manifest.read(), args.manifest)
+        source = open_source(args.source)
+
+        errors = await validate_manifest(rows, source)
+        if errors:
+            source.close()
+            for error in errors:
+                print(f"Row {error['row']}: {error['error']}", file=sys.stderr)
+            return 1
+
+        batch = await create_ingest_batch(rows, str(user["_id"]), args.source, args.batch_id)
+        print(f"Importing {len(rows)} rows as batch {batch['_id']}")
+        batch = await run_ingestion(batch["_id"], rows, source, str(user["_id"]))
+        print(json.dumps({key: batch.get(key) for key in ("_id", "status", "total", "imported", "skipped", "failed")}))
+        for error in batch.get("errors", []):
+            print(f"Row {error['row']}: {error['error']}", file=sys.stderr)
+        return 0 if batch["status"] == "completed" else 2
+    finally:
+        close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import documents from a manifest")
+    parser.add_argument("manifest", help="CSV or JSON manifest")
+    parser.add_argument("source", help="directory or ZIP archive containing the files named in the manifest")
+    parser.add_argument("--uploaded-by", required=True, help="email of the user the documents are attributed to")
+    parser.add_argument("--batch-id", help="id of an earlier batch to resume")
+    sys.exit(asyncio.run(main(parser.parse_args())))
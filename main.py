@@ -1,5 +1,6 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import datetime, timedelta
 from typing import Optional, List
@@ -8,8 +9,18 @@ from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr
 from bson import ObjectId
 from fastapi_pagination import Page, add_pagination, paginate
+from contextlib import asynccontextmanager
 
 from config import settings
+from database import connect_to_mongo, close_mongo_connection
+from services.migrations import run_migrations, check_index_drift
+from services.notification_outbox import start_dispatcher, stop_dispatcher
+from services.project_export import fail_interrupted_jobs
+from services.bulk_ingest import fail_interrupted_batches
+from services.asset_gc import start_asset_gc, stop_asset_gc
+from services.token_revocation import start_revocation_sync, stop_revocation_sync
+from services.metrics import MetricsMiddleware, render_metrics
+from services.audit import AuditMiddleware, apply_retention, start_audit_writer, stop_audit_writer
 from models.user import User, UserCreate, UserUpdate, UserInDB
 from models.project import Project, ProjectCreate, ProjectUpdate
 from models.document import Document, DocumentCreate, DocumentUpdate
@@ -19,15 +30,36 @@ from services.auth import (
     get_current_user,
     get_current_active_user,
     authenticate_user,
-    create_access_token,
+    issue_tokens,
 )
 from services.cloudinary_service import cloudinary_uploader
-from routes import users, projects, documents, approvals, signatures, auth
+from routes import users, projects, documents, approvals, signatures, auth, ingest, uploads, assets, notifications, logs
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_to_mongo()
+    await run_migrations()
+    await apply_retention()
+    await check_index_drift()
+    await fail_interrupted_jobs()
+    await fail_interrupted_batches()
+    await start_revocation_sync()
+    start_audit_writer()
+    start_dispatcher()
+    start_asset_gc()
+    yield
+    await stop_asset_gc()
+    await stop_dispatcher()
+    await stop_revocation_sync()
+    await stop_audit_writer()
+    close_mongo_connection()
+
 
 app = FastAPI(
     title="Ministry of Works DMS",
     description="Document Management System for the Ministry of Works",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -38,14 +70,22 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(AuditMiddleware)
+# Outermost, so it times everything including CORS handling
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(projects.router, prefix="/api/projects", tags=["projects"])
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
-# app.include_router(approvals.router, prefix="/api/approvals", tags=["approvals"])
-# app.include_router(signatures.router, prefix="/api/signatures", tags=["signatures"])
+app.include_router(ingest.router, prefix="/api/ingest", tags=["ingest"])
+app.include_router(uploads.router, prefix="/api/uploads", tags=["uploads"])
+app.include_router(assets.router, prefix="/api/assets", tags=["assets"])
+app.include_router(notifications.router, prefix="/api/notifications", tags=["notifications"])
+app.include_router(logs.router, prefix="/api/logs", tags=["logs"])
+app.include_router(approvals.router, prefix="/api/approvals", tags=["approvals"])
+app.include_router(signatures.router, prefix="/api/signatures", tags=["signatures"])
 
 # Add pagination support
 add_pagination(app)
@@ -56,9 +96,17 @@ async def root():
     return {"message": "Ministry of Works Document Management System API"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/api/auth/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await authenticate_user(form_data.username, form_data.password)
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    client_ip = request.client.host if request.client else None
+    user = await authenticate_user(form_data.username, form_data.password, client_ip)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -66,10 +114,5 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token(data={"sub": user.email})
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": user
-    }
+    return {**issue_tokens(user), "user": user}
 
@@ -1,11 +1,11 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 
 class ApprovalBase(BaseModel):
     document_id: str
-    status: str  # approved, rejected
+    status: str  # pending, approved, signed, rejected, superseded, cancelled
     reason: Optional[str] = None
 
 class ApprovalCreate(ApprovalBase):
@@ -13,8 +13,29 @@ class ApprovalCreate(ApprovalBase):
 
 class Approval(ApprovalBase):
     id: str = Field(default_factory=lambda: str(ObjectId()))
-    approved_by: str
+    approved_by: Optional[str] = None  # who decided the task; None while pending
+    cycle: Optional[int] = None  # submission of the document this task belongs to
+    step: Optional[int] = None  # position in the document's approval chain
+    role: Optional[str] = None  # role the task is assigned to
+    action: Optional[str] = None  # "approve" or "sign"
+    document_type: Optional[str] = None
+    project_id: Optional[str] = None
+    title: Optional[str] = None
+    created_at: Optional[datetime] = None
+    decided_at: Optional[datetime] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ApprovalDecision(BaseModel):
+    reason: Optional[str] = None
+
+class BulkDecision(BaseModel):
+    task_ids: List[str]
+    decision: str  # approve or reject; sign tasks go through /api/signatures
+    reason: Optional[str] = None
+
+class BulkDecisionResult(BaseModel):
+    succeeded: List[str]
+    failed: List[dict]
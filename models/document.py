@@ -47,9 +47,14 @@ from typing import Optional, List
 from datetime import datetime
 
 class Comment(BaseModel):
+    id: Optional[str] = None
+    document_id: Optional[str] = None
     user_id: str
     content: str
+    parent_comment_id: Optional[str] = None  # None for top-level comments
+    thread_id: Optional[str] = None  # id of the top-level comment this reply belongs to
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = None
     replies: List["Comment"] = []
 
 # class DocumentBase(BaseModel):
@@ -65,6 +70,18 @@ class Comment(BaseModel):
 class FileItem(BaseModel):
     url: str
     name: str
+    public_id: Optional[str] = None  # None on items stored before uploads recorded it
+    resource_type: Optional[str] = None  # "image", "video" or "raw"
+    bytes: Optional[int] = None
+    checksum: Optional[str] = None  # SHA-256 of the file contents
+    version: int = 1  # bumped each time the file is replaced; earlier versions live in file_versions
+
+class FileVersion(FileItem):
+    id: str
+    document_id: str
+    file_index: int
+    replaced_at: datetime
+    replaced_by: Optional[str] = None
 
 class FileItemUpdate(BaseModel):
     url: Optional[str] = None
@@ -84,20 +101,47 @@ class DocumentCreate(DocumentBase):
 class DocumentUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
-    status: Optional[str] = None
     reference_number: Optional[str] = None
     # file_items: Optional[List[FileItemUpdate]] = None # No longer directly included here
+    # status only changes through the approval workflow (/api/approvals)
+
+    class Config:
+        extra = "forbid"
 
 class Document(DocumentBase):
     id: str = Field(default=None, alias="_id")
     uploaded_by: str
-    status: str = "pending"
+    status: str = "pending"  # pending, in_review, approved, rejected
+    workflow_cycle: int = 0  # number of times the document has been submitted for review
+    workflow_step: int = 0  # step of the approval chain currently waiting for a decision
     signed_by: List[str] = []
-    comments: List[Comment] = []
+    comments: List[Comment] = []  # comments live in their own collection, see GET /{id}/comments
+    comment_count: int = 0
     file_items: List[FileItem] = [] # List of FileItems
+    thread_root: Optional[str] = None  # top-level document of the reply chain, None for top-level documents
+    depth: int = 0  # number of replies between this document and its thread_root
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
         from_attributes = True
         populate_by_name = True
+
+
+class DocumentSearchHit(BaseModel):
+    document: Document
+    score: Optional[float] = None  # text relevance, None when no search terms were given
+    highlights: List[str] = []
+
+
+class DocumentSearchPage(BaseModel):
+    items: List[DocumentSearchHit]
+    page: int
+    page_size: int
+    has_more: bool
+
+
+class DocumentThreadPage(BaseModel):
+    document: Document
+    replies: List[Document]  # oldest first; rebuild the tree from parent_document_id
+    next_cursor: Optional[str] = None
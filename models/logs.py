@@ -1,8 +1,9 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
 from database import logs_collection
+from services.audit import audit_log
 
 
 def convert_id(obj):
@@ -14,17 +15,25 @@ def convert_id(obj):
 
 # Log Model
 class Log(BaseModel):
-    user_id: str
-    action: str
+    id: Optional[str] = None
+    user_id: Optional[str] = None  # None for anonymous requests such as failed logins
+    action: str  # name of the endpoint that handled the request
+    method: Optional[str] = None
+    path: Optional[str] = None
+    status_code: Optional[int] = None
     document_id: Optional[str] = None
-    timestamp: datetime = datetime.utcnow()
+    project_id: Optional[str] = None
+    ip: Optional[str] = None
+    duration_ms: Optional[float] = None
+    details: Optional[Dict[str, Any]] = None
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 # Log CRUD Functions
-def add_log(log: Log):
-    log_dict = log.dict()
-    result = logs_collection.insert_one(log_dict)
-    return {"id": str(result.inserted_id)}
+async def add_log(log: Log):
+    """Queue an audit entry; it is written in the next batch, not before returning."""
+    log_id = audit_log.record(log.dict(exclude={"id"}))
+    return {"id": str(log_id)}
 
-def get_log(log_id: str):
-    log = logs_collection.find_one({"_id": ObjectId(log_id)})
+async def get_log(log_id: str):
+    log = await logs_collection.find_one({"_id": ObjectId(log_id)})
     return convert_id(log) if log else None
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 from bson import ObjectId
@@ -16,15 +16,16 @@ def convert_id(obj):
 class Notification(BaseModel):
     user_id: str
     message: str
+    document_id: Optional[str] = None
     is_read: bool = False
-    timestamp: datetime = datetime.utcnow()
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 # Notification CRUD Functions
-def add_notification(notification: Notification):
+async def add_notification(notification: Notification):
     notification_dict = notification.dict()
-    result = notifications_collection.insert_one(notification_dict)
+    result = await notifications_collection.insert_one(notification_dict)
     return {"id": str(result.inserted_id)}
 
-def get_notification(notification_id: str):
-    notification = notifications_collection.find_one({"_id": ObjectId(notification_id)})
+async def get_notification(notification_id: str):
+    notification = await notifications_collection.find_one({"_id": ObjectId(notification_id)})
     return convert_id(notification) if notification else None
\ No newline at end of file
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 
@@ -11,8 +12,15 @@ class SignatureCreate(SignatureBase):
 class Signature(SignatureBase):
     id: str = Field(default_factory=lambda: str(ObjectId()))
     user_id: str
-    signature_url: str
+    approval_id: Optional[str] = None  # the sign task this signature completed
+    signature_url: Optional[str] = None  # image of the signature, if one was supplied
     signed_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SignRequest(BaseModel):
+    signature_url: Optional[str] = None
+
+class BulkSignRequest(SignRequest):
+    task_ids: List[str]
@@ -32,8 +32,16 @@ class User(UserBase):
     id: str
     profile_image: Optional[str] = None
     is_active: bool
+    notification_delivery: Optional[str] = None  # "immediate", "hourly" or "daily"; None uses each subscription's default
     created_at: datetime
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class Principal(BaseModel):
+    """The authenticated caller, as described by the claims of their access token."""
+    id: str
+    email: EmailStr
+    role: str = "staff"
+    is_active: bool = True
@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from typing import List, Optional
+from bson import ObjectId
+from database import approvals_collection
+from models.approval import Approval, ApprovalDecision, BulkDecision, BulkDecisionResult
+from models.pagination import CursorPage
+from models.user import Principal
+from services.auth import get_current_user
+from services.pagination import paginate_by_created_at, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.workflow import decide_tasks, inbox_query, submit_document
+
+router = APIRouter()
+
+
+def approval_out(task: dict) -> Approval:
+    task["id"] = str(task.pop("_id"))
+    return Approval(**task)
+
+
+def _single_result(result: dict):
+    if result["failed"]:
+        error = result["failed"][0]["error"]
+        status_code = 404 if error == "Task not found" else 403 if error.startswith("Task is assigned") else 409
+        raise HTTPException(status_code=status_code, detail=error)
+    return result
+
+
+@router.get("/inbox", response_model=CursorPage[Approval])
+async def get_my_pending_approvals(
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        current_user: Principal = Depends(get_current_user)
+):
+    """Pending tasks assigned to the current user's role, newest first (admins see every role's)."""
+    tasks, next_cursor = await paginate_by_created_at(approvals_collection, inbox_query(current_user), limit, cursor=cursor)
+    return {"items": [approval_out(task) for task in tasks], "next_cursor": next_cursor}
+
+
+@router.get("/documents/{document_id}", response_model=List[Approval])
+async def get_document_approvals(document_id: str, current_user: Principal = Depends(get_current_user)):
+    """Every task of a document's reviews, in order."""
+    cursor = approvals_collection.find({"document_id": document_id}).sort([("cycle", 1), ("step", 1)])
+    return [approval_out(task) async for task in cursor]
+
+
+@router.post("/documents/{document_id}/submit")
+async def submit_for_approval(document_id: str, current_user: Principal = Depends(get_current_user)):
+    """Put a pending or rejected document (back) into review."""
+    if not ObjectId.is_valid(document_id):
+        raise HTTPException(status_code=400, detail="Invalid document ID")
+    document = await submit_document(document_id)
+    return {"status": document["status"], "cycle": document["workflow_cycle"]}
+
+
+@router.post("/{task_id}/approve", response_model=BulkDecisionResult)
+async def approve(task_id: str, decision: ApprovalDecision = Body(ApprovalDecision()),
+                  current_user: Principal = Depends(get_current_user)):
+    return _single_result(await decide_tasks([task_id], current_user, "approve", decision.reason))
+
+
+@router.post("/{task_id}/reject", response_model=BulkDecisionResult)
+async def reject(task_id: str, decision: ApprovalDecision = Body(ApprovalDecision()),
+                 current_user: Principal = Depends(get_current_user)):
+    return _single_result(await decide_tasks([task_id], current_user, "reject", decision.reason))
+
+
+@router.post("/bulk", response_model=BulkDecisionResult)
+async def bulk_decide(request: BulkDecision, current_user: Principal = Depends(get_current_user)):
+    """Approve or reject up to 500 tasks at once; each task succeeds or fails on its own."""
+    if request.decision not in ("approve", "reject"):
+        raise HTTPException(status_code=422, detail="decision must be approve or reject")
+    return await decide_tasks(request.task_ids, current_user, request.decision, request.reason)
@@ -0,0 +1,39 @@
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, status
+from services.auth import get_current_admin_user
+from services.asset_gc import start_reconciliation, get_reconciliation, deletion_queue_stats
+
+router = APIRouter()
+
+
+@router.get("/deletions/stats", response_model=dict)
+async def get_deletion_queue_stats(current_admin=Depends(get_current_admin_user)):
+    """Number of queued asset deletions per status."""
+    return await deletion_queue_stats()
+
+
+@router.post("/reconcile", status_code=status.HTTP_202_ACCEPTED, response_model=dict)
+async def reconcile_assets(delete: bool = False, current_admin=Depends(get_current_admin_user)):
+    """Scan Cloudinary for uploaded assets no document references.
+
+    With `delete` the orphans found are queued for deletion; otherwise they
+    are only reported. Poll GET /reconcile/{job_id} for the result.
+    """
+    job = await start_reconciliation(delete, current_admin.id)
+    return serialize_reconciliation(job)
+
+
+@router.get("/reconcile/{job_id}", response_model=dict)
+async def get_reconciliation_status(job_id: str, current_admin=Depends(get_current_admin_user)):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+    job = await get_reconciliation(ObjectId(job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Reconciliation job not found")
+    return serialize_reconciliation(job)
+
+
+def serialize_reconciliation(job):
+    job = dict(job)
+    job["id"] = str(job.pop("_id"))
+    return job
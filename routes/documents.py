@@ -1,17 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Path, Query, Request
 from fastapi.responses import JSONResponse
 from typing import List, Optional
 from bson import ObjectId
-from models.document import Document, DocumentCreate, DocumentUpdate, Comment, FileItemUpdate, FileItem
-from database import documents_collection, users_collection
+from pymongo import ReturnDocument
+from models.document import Document, DocumentCreate, DocumentUpdate, Comment, FileItemUpdate, FileItem, \
+    DocumentSearchHit, DocumentSearchPage, DocumentThreadPage, FileVersion
+from models.pagination import CursorPage
+from database import documents_collection, users_collection, comments_collection, file_versions_collection
 from services.auth import get_current_user, get_current_admin_user
 from services.cloudinary_service import cloudinary_uploader
+from services.upload_pipeline import upload_files, rollback_uploads, file_item
+from services.assets import release_file_items
+from services.file_versions import replace_file, release_versions
+from services.audit import annotate_audit
+from services.pagination import paginate_by_created_at, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.search import text_search_filter, date_range_filter, search_terms, document_highlights
+from services.document_threads import thread_fields, thread_fields_for, get_thread_page
+from services.comments import comment_from_db, attach_replies, find_comment_matches
+from services.response_cache import cached_response, response_cache
+from services.workflow import workflow_fields, open_first_task, cancel_document_tasks
 from routes.notifications import send_comment_notification, send_upload_notification
 from datetime import datetime
+from starlette.concurrency import run_in_threadpool
 import re
 
 router = APIRouter()
 
+# Only fetch the fields the Document model exposes (comments live in their own collection)
+DOCUMENT_PROJECTION = {field: 1 for field in Document.model_fields if field not in ("id", "comments")}
+
 
 # parent_id = "67b0d24045ee190e437238e0"
 # document = documents_collection.find_one({"_id": ObjectId(parent_id)})
@@ -102,7 +119,7 @@ router = APIRouter()
 
 @router.post("/", response_model=Document)
 async def create_document(
-        files: List[UploadFile] = File(...),  # Accept multiple files
+        files: List[UploadFile] = File([]),  # Optional: files can also be uploaded directly, see /api/uploads
         title: str = Form(...),
         project_id: str = Form(...),
         reference_number: str = Form(...),
@@ -113,14 +130,10 @@ async def create_document(
 ):
     """Uploads multiple files to Cloudinary and saves the document data in MongoDB."""
 
-    file_items = []
     try:
-        for file in files:
-            try:
-                file_url = cloudinary_uploader.upload(file.file)
-                file_items.append(FileItem(url=file_url, name=file.filename))
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
+        # Uploads run concurrently; a failure rolls back the files already sent
+        uploaded = await upload_files(files)
+        file_items = [FileItem(**file_item(item)) for item in uploaded]
 
         document_data = {
             "title": title,
@@ -131,22 +144,29 @@ async def create_document(
             "uploaded_by": uploaded_by.id if hasattr(uploaded_by, "id") else uploaded_by,
             "file_items": [item.dict() for item in file_items],
             "parent_document_id": parent_document_id,
-            "status": "pending",
+            **await thread_fields_for(parent_document_id),
+            **workflow_fields(document_type),
             "signed_by": [],
-            "comments": [],
+            "comment_count": 0,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
 
-        result = documents_collection.insert_one(document_data)
-        new_document = documents_collection.find_one({"_id": result.inserted_id})
+        try:
+            result = await documents_collection.insert_one(document_data)
+        except Exception:
+            await rollback_uploads(uploaded)
+            raise
+        await open_first_task({**document_data, "_id": result.inserted_id})
+        annotate_audit(document_id=str(result.inserted_id), project_id=project_id)
+        await response_cache.invalidate("documents")
+        new_document = await documents_collection.find_one({"_id": result.inserted_id})
 
         if not new_document:
             raise HTTPException(status_code=500, detail="Failed to retrieve inserted document")
 
         new_document["id"] = str(new_document.pop("_id"))
-        users_to_notify = users_collection.find({})
-        send_upload_notification(Document(**new_document), list(users_to_notify))
+        await send_upload_notification(Document(**new_document))
 
         return Document(**new_document)
 
@@ -163,14 +183,12 @@ async def upload_document_reply(
     title: str = Form(...),
     uploaded_by: str = Depends(get_current_user)
 ):
-    parent_document = documents_collection.find_one({"_id": ObjectId(document_id)})
+    parent_document = await documents_collection.find_one({"_id": ObjectId(document_id)})
     if not parent_document:
         raise HTTPException(status_code=404, detail="Parent document not found")
 
-    file_items = []
-    for file in files:
-        file_url = cloudinary_uploader.upload(file.file)
-        file_items.append(FileItem(url=file_url, name=file.filename))
+    uploaded = await upload_files(files)
+    file_items = [FileItem(**file_item(item)) for item in uploaded]
 
     reply_data = {  # Use a dictionary directly
         "title": title,
@@ -180,29 +198,71 @@ async def upload_document_reply(
         "uploaded_by": uploaded_by.id,
         "file_items": [item.dict() for item in file_items],  # Store list of file items
         "parent_document_id": document_id,  # Important: Use the parent document ID
-        "status": "pending",
+        **thread_fields(parent_document),
+        **workflow_fields(parent_document["document_type"]),
         "signed_by": [],
-        "comments": [],
+        "comment_count": 0,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
 
-    result = documents_collection.insert_one(reply_data)
-    new_reply = documents_collection.find_one({"_id": result.inserted_id})
+    try:
+        result = await documents_collection.insert_one(reply_data)
+    except Exception:
+        await rollback_uploads(uploaded)
+        raise
+    await open_first_task({**reply_data, "_id": result.inserted_id})
+    annotate_audit(document_id=str(result.inserted_id), project_id=reply_data["project_id"], parent_document_id=document_id)
+    await response_cache.invalidate("documents")
+    new_reply = await documents_collection.find_one({"_id": result.inserted_id})
     new_reply["id"] = str(new_reply.pop("_id"))  # Convert _id to string
+    await send_upload_notification(Document(**new_reply))
     return Document(**new_reply)
 
 @router.get("/{document_id}/replies", response_model=List[Document])
-def get_document_replies(document_id: str, user=Depends(get_current_user)):
+async def get_document_replies(document_id: str, user=Depends(get_current_user)):
     replies = documents_collection.find({"parent_document_id": document_id})
-    return [Document(**{**reply, "_id": str(reply["_id"])}) for reply in replies]
+    return [Document(**{**reply, "_id": str(reply["_id"])}) async for reply in replies]
+
+
+@router.get("/{document_id}/thread", response_model=DocumentThreadPage)
+async def get_document_thread(
+        document_id: str,
+        from_root: bool = False,
+        max_depth: Optional[int] = Query(None, ge=1),
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        user=Depends(get_current_user)
+):
+    """Return a document and all replies below it, down to `max_depth` levels.
+
+    With `from_root` the whole correspondence chain the document belongs to
+    is returned instead. Replies are paged oldest first.
+    """
+    if not ObjectId.is_valid(document_id):
+        raise HTTPException(status_code=400, detail="Invalid document ID")
+    document = await documents_collection.find_one({"_id": ObjectId(document_id)})
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if from_root and document.get("thread_root") and ObjectId.is_valid(document["thread_root"]):
+        document = await documents_collection.find_one({"_id": ObjectId(document["thread_root"])}) or document
+
+    replies, next_cursor = await get_thread_page(document, max_depth, limit, cursor)
+    return DocumentThreadPage(
+        document=Document(**{**document, "_id": str(document["_id"])}),
+        replies=[Document(**{**reply, "_id": str(reply["_id"])}) for reply in replies],
+        next_cursor=next_cursor,
+    )
 
 
 @router.get("/recent", response_model=List[Document])
-def get_recent_documents(limit: int = 5, user=Depends(get_current_user)):  # Add limit parameter
+async def get_recent_documents(request: Request, limit: int = 5, user=Depends(get_current_user)):  # Add limit parameter
     """Retrieves the most recently uploaded documents."""
+    return await cached_response(request, ["documents"], lambda: load_recent_documents(limit))
+
 
-    documents = list(documents_collection.find().sort([("created_at", -1)]).limit(limit))
+async def load_recent_documents(limit: int):
+    documents = await documents_collection.find().sort([("created_at", -1)]).limit(limit).to_list(length=limit)
 
     # Convert ObjectIds to strings and return as Document objects
     recent_documents = []
@@ -212,32 +272,76 @@ def get_recent_documents(limit: int = 5, user=Depends(get_current_user)):  # Add
     return recent_documents
 
 
-@router.get("/", response_model=List[Document])
-def get_all_documents(user=Depends(get_current_user)):
-    """Retrieves all documents."""
+@router.get("/", response_model=CursorPage[Document])
+async def get_all_documents(
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        project_id: Optional[str] = None,
+        document_type: Optional[str] = None,
+        status: Optional[str] = None,
+        uploaded_by: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        user=Depends(get_current_user)
+):
+    """Retrieves documents newest first, one keyset page at a time."""
 
-    documents = list(documents_collection.find())  # Get all documents as a list
+    query = {}
+    if project_id:
+        query["project_id"] = project_id
+    if document_type:
+        query["document_type"] = document_type
+    if status:
+        query["status"] = status
+    if uploaded_by:
+        query["uploaded_by"] = uploaded_by
+    if created_from or created_to:
+        query["created_at"] = {}
+        if created_from:
+            query["created_at"]["$gte"] = created_from
+        if created_to:
+            query["created_at"]["$lte"] = created_to
+
+    documents, next_cursor = await paginate_by_created_at(
+        documents_collection, query, limit, cursor=cursor, projection=DOCUMENT_PROJECTION
+    )
 
     all_documents = []
     for doc in documents:
         doc["id"] = str(doc.pop("_id"))  # Convert ObjectId to string
         all_documents.append(Document(**doc))
 
-    return all_documents
+    return CursorPage[Document](items=all_documents, next_cursor=next_cursor)
 
 
-@router.get("/search", response_model=List[Document])
-def search_documents(
+@router.get("/search", response_model=DocumentSearchPage)
+async def search_documents(
+        q: Optional[str] = None,
         title: Optional[str] = None,
         project_id: Optional[str] = None,
         reference_number: Optional[str] = None,
         document_type: Optional[str] = None,
         status: Optional[str] = None,
-user=Depends(get_current_user)
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        page: int = Query(1, ge=1),
+        page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        user=Depends(get_current_user)
 ):
+    """Full-text search over title, description, reference number and comments.
+
+    Results are ranked by text relevance when `q` (or the legacy `title`) is
+    given, otherwise newest first. All filters can be combined.
+    """
+    search = q or title
     query = {}
-    if title:
-        query["title"] = {"$regex": f".*{title}.*", "$options": "i"}
+    comment_matches = {}
+    if search:
+        query = text_search_filter(search)
+        comment_matches = await find_comment_matches(search)
+        if comment_matches:
+            # Documents whose comments match are returned alongside direct text matches
+            query = {"$or": [query, {"_id": {"$in": [ObjectId(doc_id) for doc_id in comment_matches]}}]}
     if project_id:
         query["project_id"] = project_id
     if reference_number:
@@ -246,82 +350,140 @@ user=Depends(get_current_user)
         query["document_type"] = document_type
     if status:
         query["status"] = status
+    if date_filter := date_range_filter(created_from, created_to):
+        query["created_at"] = date_filter
 
-    documents = documents_collection.find(query)
+    if search:
+        projection = {"score": {"$meta": "textScore"}}
+        sort = [("score", {"$meta": "textScore"}), ("_id", -1)]
+    else:
+        projection = None
+        sort = [("created_at", -1), ("_id", -1)]
 
-    return [Document(**{**doc, "_id": str(doc["_id"])}) for doc in documents]
+    # Fetch one extra record to know whether another page exists
+    documents = await documents_collection.find(query, projection).sort(sort) \
+        .skip((page - 1) * page_size).limit(page_size + 1).to_list(length=page_size + 1)
 
+    terms = search_terms(search) if search else []
+    hits = []
+    for doc in documents[:page_size]:
+        highlights = document_highlights(doc, terms, comment_matches.get(str(doc["_id"]), []))
+        score = doc.pop("score", None)
+        doc["_id"] = str(doc["_id"])
+        hits.append(DocumentSearchHit(document=Document(**doc), score=score, highlights=highlights))
 
+    return DocumentSearchPage(items=hits, page=page, page_size=page_size, has_more=len(documents) > page_size)
 
 
 @router.put("/{document_id}/files/{file_index}", response_model=Document)
 async def update_document_file(
     document_id: str,
-    file_index: int,
+    file_index: int = Path(..., ge=0),
     file: UploadFile = File(...),
     user=Depends(get_current_admin_user)
 ):
-    """Updates a specific file within a document."""
-
-    document = documents_collection.find_one({"_id": ObjectId(document_id)})
-    if not document or len(document["file_items"]) <= file_index:
-        raise HTTPException(status_code=404, detail="File not found")
+    """Uploads a new version of a specific file within a document; the previous one is kept in its history.
+
+    Re-uploading the current contents changes nothing.
+    """
+    if not ObjectId.is_valid(document_id):
+        raise HTTPException(status_code=400, detail="Invalid document ID")
+    if await replace_file(document_id, file_index, file, user.id):
+        await response_cache.invalidate("documents")
+    updated_document = await documents_collection.find_one({"_id": ObjectId(document_id)})
+    updated_document["id"] = str(updated_document.pop("_id"))
+    return Document(**updated_document)
 
-    file_url = cloudinary_uploader.upload(file.file)
-    document["file_items"][file_index]["url"] = file_url  # Update the URL
-    document["file_items"][file_index]["name"] = file.filename # Update the name
 
-    documents_collection.update_one(
-        {"_id": ObjectId(document_id)}, {"$set": {"file_items": document["file_items"]}}
+@router.get("/{document_id}/files/{file_index}/versions", response_model=CursorPage[FileVersion])
+async def get_file_versions(
+    document_id: str,
+    file_index: int = Path(..., ge=0),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user=Depends(get_current_user)
+):
+    """Earlier versions of a document's file, most recently replaced first."""
+    versions, next_cursor = await paginate_by_created_at(
+        file_versions_collection, {"document_id": document_id, "file_index": file_index}, limit,
+        cursor=cursor, sort_field="replaced_at"
     )
-    updated_document = documents_collection.find_one({"_id": ObjectId(document_id)})
-    updated_document["id"] = str(updated_document.pop("_id"))
-    return Document(**updated_document)
+    for version in versions:
+        version["id"] = str(version.pop("_id"))
+    return {"items": versions, "next_cursor": next_cursor}
 
 
 
 
 @router.put("/{document_id}", response_model=Document)
-def update_document(document_id: str, update_data: DocumentUpdate, user=Depends(get_current_admin_user)):
+async def update_document(document_id: str, update_data: DocumentUpdate, user=Depends(get_current_admin_user)):
     # Exclude file_items from the main update, handle them separately
     update_data_dict = update_data.dict(exclude_unset=True)
     if update_data_dict:  # Check if there are other fields to update
-        documents_collection.update_one({"_id": ObjectId(document_id)}, {"$set": update_data_dict})
+        await documents_collection.update_one({"_id": ObjectId(document_id)}, {"$set": update_data_dict})
+        await response_cache.invalidate("documents")
 
-    updated_document = documents_collection.find_one({"_id": ObjectId(document_id)})
+    updated_document = await documents_collection.find_one({"_id": ObjectId(document_id)})
     updated_document["id"] = str(updated_document.pop("_id"))
     return Document(**updated_document)
 
 
-@router.put("/{document_id}/comments/{comment_index}", response_model=Document)
-def edit_comment(document_id: str, comment_index: int, content: str, user=Depends(get_current_user)):
-    document = documents_collection.find_one({"_id": ObjectId(document_id)})
-    if not document or len(document["comments"]) <= comment_index:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    if document["comments"][comment_index]["user_id"] != user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to edit this comment")
+def parse_comment_id(comment_id: str) -> ObjectId:
+    if not ObjectId.is_valid(comment_id):
+        raise HTTPException(status_code=400, detail="Invalid comment ID")
+    return ObjectId(comment_id)
 
-    document["comments"][comment_index]["content"] = content
-    documents_collection.update_one({"_id": ObjectId(document_id)}, {"$set": {"comments": document["comments"]}})
-    return Document(**document)
+
+async def raise_comment_not_editable(document_id: str, comment_oid: ObjectId):
+    """Explain why a user-scoped comment update matched nothing."""
+    if await comments_collection.find_one({"_id": comment_oid, "document_id": document_id}, {"_id": 1}):
+        raise HTTPException(status_code=403, detail="Not authorized to modify this comment")
+    raise HTTPException(status_code=404, detail="Comment not found")
 
 
-@router.delete("/{document_id}/comments/{comment_index}")
-def delete_comment(document_id: str, comment_index: int, user=Depends(get_current_user)):
-    document = documents_collection.find_one({"_id": ObjectId(document_id)})
-    if not document or len(document["comments"]) <= comment_index:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    if document["comments"][comment_index]["user_id"] != user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this comment")
+@router.put("/{document_id}/comments/{comment_id}", response_model=Comment)
+async def edit_comment(document_id: str, comment_id: str, content: str, user=Depends(get_current_user)):
+    comment_oid = parse_comment_id(comment_id)
+    updated_comment = await comments_collection.find_one_and_update(
+        {"_id": comment_oid, "document_id": document_id, "user_id": user.id},
+        {"$set": {"content": content, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_comment:
+        await raise_comment_not_editable(document_id, comment_oid)
+    return comment_from_db(updated_comment)
 
-    document["comments"].pop(comment_index)
-    documents_collection.update_one({"_id": ObjectId(document_id)}, {"$set": {"comments": document["comments"]}})
+
+@router.delete("/{document_id}/comments/{comment_id}")
+async def delete_comment(document_id: str, comment_id: str, user=Depends(get_current_user)):
+    """Deletes a comment together with all replies beneath it."""
+    comment_oid = parse_comment_id(comment_id)
+    deleted_comment = await comments_collection.find_one_and_delete(
+        {"_id": comment_oid, "document_id": document_id, "user_id": user.id}
+    )
+    if not deleted_comment:
+        await raise_comment_not_editable(document_id, comment_oid)
+
+    deleted_count = 1
+    parent_ids = [comment_id]
+    while parent_ids:
+        children = await comments_collection.find(
+            {"document_id": document_id, "parent_comment_id": {"$in": parent_ids}}, {"_id": 1}
+        ).to_list(length=None)
+        if not children:
+            break
+        await comments_collection.delete_many({"_id": {"$in": [child["_id"] for child in children]}})
+        deleted_count += len(children)
+        parent_ids = [str(child["_id"]) for child in children]
+
+    await documents_collection.update_one({"_id": ObjectId(document_id)}, {"$inc": {"comment_count": -deleted_count}})
+    await response_cache.invalidate("documents")
     return JSONResponse(content={"message": "Comment deleted successfully"})
 
 
 @router.get("/{document_id}/status", response_model=str)
-def get_document_status(document_id: str):
-    document = documents_collection.find_one({"_id": ObjectId(document_id)})
+async def get_document_status(document_id: str):
+    document = await documents_collection.find_one({"_id": ObjectId(document_id)})
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     return document["status"]
@@ -335,8 +497,8 @@ def get_document_status(document_id: str):
 
 
 @router.get("/{document_id}", response_model=Document)
-def get_document(document_id: str):
-    document = documents_collection.find_one({"_id": ObjectId(document_id)})
+async def get_document(document_id: str):
+    document = await documents_collection.find_one({"_id": ObjectId(document_id)})
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
@@ -344,43 +506,79 @@ def get_document(document_id: str):
     return Document(**document)
 
 
-@router.put("/{document_id}", response_model=Document)
-def update_document(document_id: str, update_data: DocumentUpdate, user=Depends(get_current_admin_user)):
-    documents_collection.update_one({"_id": ObjectId(document_id)}, {"$set": update_data.dict(exclude_unset=True)})
-    updated_document = documents_collection.find_one({"_id": ObjectId(document_id)})
-    return Document(**updated_document)
-
-
 @router.delete("/{document_id}")
-def delete_document(document_id: str, user=Depends(get_current_admin_user)):
-    """Deletes a document and its associated files from Cloudinary."""
-    document = documents_collection.find_one({"_id": ObjectId(document_id)})
+async def delete_document(document_id: str, user=Depends(get_current_admin_user)):
+    """Deletes a document; its files are removed from Cloudinary in the background."""
+    document = await documents_collection.find_one_and_delete({"_id": ObjectId(document_id)})
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
+    await release_file_items(document.get("file_items", []), reason="document_deleted")
+    await release_versions(document_id)
+    await cancel_document_tasks(document_id)
+    await comments_collection.delete_many({"document_id": document_id})
+    await response_cache.invalidate("documents")
+    return JSONResponse(content={"message": "Document deleted successfully"})
 
-    for file_item in document.get("file_items", []):
-        try:
-            cloudinary_uploader.delete(file_item["url"].split("/")[-1].split(".")[0])
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to delete file from Cloudinary: {str(e)}")
+@router.post("/{document_id}/comments", response_model=Comment)
+async def add_comment(
+        document_id: str,
+        content: str,
+        parent_comment_id: Optional[str] = None,
+        user=Depends(get_current_user)
+):
+    """Adds a comment, or a reply to `parent_comment_id`, to a document."""
+    thread_id = None
+    if parent_comment_id:
+        parent = await comments_collection.find_one(
+            {"_id": parse_comment_id(parent_comment_id), "document_id": document_id}, {"thread_id": 1}
+        )
+        if not parent:
+            raise HTTPException(status_code=404, detail="Parent comment not found")
+        thread_id = parent.get("thread_id") or parent_comment_id
+
+    document = await documents_collection.find_one_and_update(
+        {"_id": ObjectId(document_id)},
+        {"$inc": {"comment_count": 1}},
+        projection={"comments": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
 
-    documents_collection.delete_one({"_id": ObjectId(document_id)})
-    return JSONResponse(content={"message": "Document deleted successfully"})
+    comment = Comment(
+        document_id=document_id,
+        user_id=user.id,
+        content=content,
+        parent_comment_id=parent_comment_id,
+        thread_id=thread_id
+    )
+    result = await comments_collection.insert_one(comment.dict(exclude={"id", "replies"}))
+    comment.id = str(result.inserted_id)
+    await response_cache.invalidate("documents")
 
-@router.post("/{document_id}/comments", response_model=Document)
-def add_comment(document_id: str, content: str, user=Depends(get_current_user)):
-    comment = Comment(user_id=user.id, content=content)
-    documents_collection.update_one({"_id": ObjectId(document_id)}, {"$push": {"comments": comment.dict()}})
-    updated_document = documents_collection.find_one({"_id": ObjectId(document_id)})
-    users_to_notify = users_collection.find({})  # Fetch all users for now
-    send_comment_notification(Document(**updated_document), comment, list(users_to_notify))
+    document["_id"] = str(document["_id"])
+    await send_comment_notification(Document(**document), comment)
+    return comment
 
-    return Document(**updated_document)
 
-@router.get("/{document_id}/comments", response_model=List[Comment])
-def get_document_comments(document_id: str):
-    document = documents_collection.find_one({"_id": ObjectId(document_id)})
-    if not document:
+@router.get("/{document_id}/comments", response_model=CursorPage[Comment])
+async def get_document_comments(
+        document_id: str,
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Returns top-level comments oldest first, each with its full reply thread."""
+    if not await documents_collection.find_one({"_id": ObjectId(document_id)}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Document not found")
-    return document.get("comments", [])
+
+    comments, next_cursor = await paginate_by_created_at(
+        comments_collection,
+        {"document_id": document_id, "parent_comment_id": None},
+        limit,
+        cursor=cursor,
+        sort_field="timestamp",
+        ascending=True
+    )
+    items = await attach_replies([comment_from_db(comment) for comment in comments])
+    return CursorPage[Comment](items=items, next_cursor=next_cursor)
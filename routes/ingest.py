@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import Optional
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from services.auth import get_current_admin_user
+from services.bulk_ingest import (
+    MAX_REPORTED_ERRORS,
+    ZipSource,
+    parse_manifest,
+    validate_manifest,
+    create_ingest_batch,
+    start_ingestion,
+    get_ingest_batch,
+)
+
+router = APIRouter()
+
+
+def _save_archive(upload: UploadFile) -> str:
+    # The request's upload is gone once we respond, so keep a copy for the background import
+    with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as target:
+        shutil.copyfileobj(upload.file, target)
+        return target.name
+
+
+@router.post("/documents", status_code=status.HTTP_202_ACCEPTED, response_model=dict)
+async def ingest_documents(
+        manifest: UploadFile = File(...),
+        archive: UploadFile = File(...),
+        batch_id: Optional[str] = Form(None),
+        current_admin=Depends(get_current_admin_user)
+):
+    """Import many documents from a CSV/JSON manifest and a ZIP of their files.
+
+    The whole manifest is validated before anything is uploaded. Passing the
+    `batch_id` of an earlier, interrupted import resumes it; rows that were
+    already imported are skipped. Poll GET /batches/{batch_id} for progress.
+    """
+    try:
+        rows = parse_manifest(await manifest.read(), manifest.filename or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid manifest: {e}")
+    if not rows:
+        raise HTTPException(status_code=400, detail="Manifest is empty")
+
+    path = await run_in_threadpool(_save_archive, archive)
+    try:
+        source = ZipSource(path, delete_on_close=True)
+    except zipfile.BadZipFile:
+        await run_in_threadpool(os.unlink, path)
+        raise HTTPException(status_code=400, detail="Archive is not a valid ZIP file")
+
+    try:
+        errors = await validate_manifest(rows, source)
+        if errors:
+            raise HTTPException(status_code=400, detail={
+                "message": "Manifest validation failed",
+                "error_count": len(errors),
+                "errors": errors[:MAX_REPORTED_ERRORS],
+            })
+        batch = await create_ingest_batch(rows, current_admin.id, archive.filename or "upload", batch_id)
+    except ValueError as e:
+        source.close()
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception:
+        source.close()
+        raise
+
+    start_ingestion(batch["_id"], rows, source, current_admin.id)
+    return serialize_ingest_batch(batch)
+
+
+@router.get("/batches/{batch_id}", response_model=dict)
+async def get_ingest_batch_status(batch_id: str, current_admin=Depends(get_current_admin_user)):
+    """Return the progress and row errors of an ingestion batch."""
+    batch = await get_ingest_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Ingestion batch not found")
+    return serialize_ingest_batch(batch)
+
+
+def serialize_ingest_batch(batch):
+    batch = dict(batch)
+    batch["id"] = str(batch.pop("_id"))
+    return batch
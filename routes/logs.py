@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import datetime
+from typing import Optional
+from database import logs_collection
+from models.logs import Log
+from models.pagination import CursorPage
+from models.user import Principal
+from services.audit import audit_log
+from services.auth import get_current_admin_user
+from services.pagination import paginate_by_created_at, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+router = APIRouter()
+
+
+@router.get("/", response_model=CursorPage[Log])
+async def get_logs(
+        user_id: Optional[str] = None,
+        document_id: Optional[str] = None,
+        project_id: Optional[str] = None,
+        action: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        current_admin: Principal = Depends(get_current_admin_user)
+):
+    """Audit entries newest first, filtered by user, document or project and a time range (Admin only)."""
+    if start and end and start > end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+
+    # Each of user_id, document_id and project_id has a (field, timestamp, _id) index
+    query = {}
+    for field, value in (("user_id", user_id), ("document_id", document_id), ("project_id", project_id)):
+        if value:
+            query[field] = value
+    if action:
+        query["action"] = action
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
+
+    logs, next_cursor = await paginate_by_created_at(
+        logs_collection, query, limit, cursor=cursor, sort_field="timestamp"
+    )
+    for log in logs:
+        log["id"] = str(log.pop("_id"))
+    return {"items": logs, "next_cursor": next_cursor}
+
+
+@router.get("/writer/stats")
+async def get_audit_writer_stats(current_admin: Principal = Depends(get_current_admin_user)):
+    """Buffered, written and dropped audit entries in this worker (Admin only)."""
+    return audit_log.stats()
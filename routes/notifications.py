@@ -1,58 +1,114 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from database import users_collection, projects_collection
-from config import settings
-import requests
-import json
+from fastapi import APIRouter, Body, Depends, HTTPException
+from typing import List
+from database import projects_collection, documents_collection
+from models.user import Principal
+from services.auth import get_current_user
+from services.user_cache import user_cache
+from services.notification_outbox import enqueue_notification
+from services.subscriptions import (
+    DELIVERY_MODES,
+    TARGET_TYPES,
+    event_targets,
+    list_subscriptions,
+    mute,
+    set_delivery,
+    subscribe,
+    watch,
+)
 from bson import ObjectId
 import logging
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+router = APIRouter()
+
 
-def get_project_name(project_id):
+async def get_project_name(project_id):
     # Convert project_id to ObjectId
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
+    project = await projects_collection.find_one({"_id": ObjectId(project_id)})
     return project.get("project_name", "Unknown Project") if project else "Unknown Project"
 
 
-def send_email(to_email, subject, message):
-    sender_email = os.getenv("GMAIL_USER")
-    sender_password = os.getenv("GMAIL_PASS")
+async def send_upload_notification(document):
+    """Subscribe the uploader and queue the new-upload email for the project's and thread's subscribers."""
+    await subscribe(document.uploaded_by, "document", document.id, "uploader")
+    project_name = await get_project_name(document.project_id)
+    if document.parent_document_id:
+        subject = f"New Reply Uploaded: {document.title}"
+    else:
+        subject = f"New Document Uploaded: {document.title}"
+    message = f"A new document '{document.title}' has been uploaded to project {project_name}."
+    await enqueue_notification(
+        subject, message, dedup_key=f"upload:{document.id}", document_id=document.id,
+        targets=event_targets(document.project_id, document.id, document.thread_root),
+        actor_id=document.uploaded_by
+    )
 
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(message, 'plain'))
 
-    try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:  # Using Gmail SMTP
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, to_email, msg.as_string())
-        logger.info(f"Email sent successfully to {to_email}!")
-    except Exception as e:
-        logger.error(f"Error sending email to {to_email}: {e}")
+async def send_comment_notification(document, comment):
+    """Subscribe the commenter and queue the new-comment email for the document's subscribers."""
+    await subscribe(comment.user_id, "document", document.id, "commenter")
+    subject = f"New Comment on Document: {document.title}"
+    message = f"A new comment has been added to document '{document.title}': {comment.content}"
+    dedup_key = f"comment:{document.id}:{comment.user_id}:{comment.timestamp.isoformat()}"
+    await enqueue_notification(
+        subject, message, dedup_key=dedup_key, document_id=document.id,
+        targets=event_targets(document.project_id, document.id, document.thread_root),
+        actor_id=comment.user_id
+    )
 
 
-def send_upload_notification(document, users):
-    project_name = get_project_name(document.project_id)
-    subject = f"New Document Uploaded: {document.title}"
-    message = f"A new document '{document.title}' has been uploaded to project {project_name}."
-    for user in users:
-        send_email(user["email"], subject, message)
+async def send_ingest_summary_notification(batch, imported):
+    """Queue a single summary email for a bulk import instead of one per document."""
+    if not imported:
+        return
+    subject = f"{imported} archived documents imported"
+    message = (
+        f"A bulk import ({batch.get('source', 'archive')}) added {imported} documents. "
+        f"{batch.get('skipped', 0)} rows were already imported and {batch.get('failed', 0)} failed."
+    )
+    dedup_key = f"ingest:{batch['_id']}:{batch['finished_at'].isoformat()}"
+    # No targets: only the digest roles hear about bulk imports
+    await enqueue_notification(subject, message, dedup_key=dedup_key, targets=[], actor_id=batch.get("uploaded_by"))
 
 
-def send_comment_notification(document, comment, users):
-    subject = f"New Comment on Document: {document.title}"
-    message = f"A new comment has been added to document '{document.title}': {comment.content}"
-    for user in users:
-        send_email(user["email"], subject, message)
\ No newline at end of file
+async def _check_target(target_type: str, target_id: str):
+    if target_type not in TARGET_TYPES:
+        raise HTTPException(status_code=422, detail=f"target_type must be one of {TARGET_TYPES}")
+    collection = projects_collection if target_type == "project" else documents_collection
+    if not ObjectId.is_valid(target_id) or not await collection.find_one({"_id": ObjectId(target_id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail=f"{target_type.capitalize()} not found")
+
+
+@router.get("/subscriptions", response_model=List[dict])
+async def get_my_subscriptions(current_user: Principal = Depends(get_current_user)):
+    return await list_subscriptions(current_user.id)
+
+
+@router.put("/subscriptions/{target_type}/{target_id}")
+async def watch_target(target_type: str, target_id: str, current_user: Principal = Depends(get_current_user)):
+    """Follow a project or document."""
+    await _check_target(target_type, target_id)
+    await watch(current_user.id, target_type, target_id)
+    return {"detail": f"Watching {target_type} {target_id}"}
+
+
+@router.delete("/subscriptions/{target_type}/{target_id}")
+async def mute_target(target_type: str, target_id: str, current_user: Principal = Depends(get_current_user)):
+    """Stop notifications about a project or document."""
+    if not await mute(current_user.id, target_type, target_id):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return {"detail": f"Muted {target_type} {target_id}"}
+
+
+@router.put("/preferences")
+async def update_delivery_preference(delivery: str = Body(..., embed=True),
+                                     current_user: Principal = Depends(get_current_user)):
+    """Choose immediate emails, or hourly or daily digests, for all subscriptions."""
+    if delivery not in DELIVERY_MODES:
+        raise HTTPException(status_code=422, detail=f"delivery must be one of {DELIVERY_MODES}")
+    await set_delivery(current_user.id, delivery)
+    user_cache.invalidate(current_user.id)
+    return {"delivery": delivery}
@@ -1,39 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Form, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Form, File, Query, Request
 from bson import ObjectId
 from datetime import datetime
 from database import projects_collection, documents_collection
 from models.document import Document
 from models.project import Project, ProgressEntry
+from models.pagination import CursorPage
 from services.auth import get_current_user, get_current_admin_user
 from typing import List, Optional, Dict, Any, Union
 from services.cloudinary_service import cloudinary_uploader
-import pandas as pd
-import io
-import docx
-from docx.shared import Pt, Inches
-from docx import Document as DocxDocument
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from services.pagination import paginate_by_created_at, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.search import text_search_filter
+from services.project_export import create_export_job, get_export_job
+from services.response_cache import cached_response, response_cache
+from services.project_stats import load_project_stats
+from services.subscriptions import subscribe
+from services.audit import annotate_audit
+from services.project_records import (
+    PROJECT_PROJECTION,
+    normalize_project_fields,
+    normalize_progress,
+    project_out,
+)
 import json
 import math
-from pydantic import ValidationError
+import re
+from starlette.concurrency import run_in_threadpool
 
 
 
-def get_project_or_404(project_id: str):
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
+async def get_project_or_404(project_id: str):
+    project = await projects_collection.find_one({"_id": ObjectId(project_id)})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
 
 
-def format_date(dt):
-    day = dt.day
-    suffix = "th" if 11 <= day <= 13 else {1: "st", 2: "nd", 3: "rd"}.get(day % 10, "th")
-    month = dt.strftime("%B")  # Full month name
-    year = dt.year
-    return f"{day}{suffix} {month} {year}"
-
-
 def format_number(value):
     if value is None:
         return ""
@@ -44,22 +45,19 @@ def parse_optional_float(value: Optional[str]) -> Optional[float]:
     if value in (None, "", "null"):
         return None
     try:
-        return float(value)
+        number = float(value)
     except ValueError:
         raise HTTPException(status_code=422, detail=f"Invalid float value: {value}")
-
-def format_currency(value):
-    try:
-        return f"₦{float(value):,.2f}"
-    except (ValueError, TypeError):
-        return "N/A"
+    if not math.isfinite(number):
+        raise HTTPException(status_code=422, detail=f"Invalid float value: {value}")
+    return number
 
 
 router = APIRouter()
 
 
 @router.post("/", response_model=Project)
-def create_project(
+async def create_project(
         project_name: str = Form(...),
         description: Optional[str] = Form(None),
         contractor: Optional[str] = Form(None),
@@ -99,7 +97,7 @@ def create_project(
             "contractor": contractor,
             "resident_engineer": resident_engineer,
             "progress_report": progress_report,
-            "project_tags": project_tags.lower(),
+            "project_tags": project_tags,
             "award_date": award_date,
             "contract_sum": contract_sum,
             "duration": duration,
@@ -111,8 +109,12 @@ def create_project(
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
-        result = projects_collection.insert_one(project_dict)
+        project_dict = normalize_project_fields(project_dict)
+        result = await projects_collection.insert_one(project_dict)
+        await response_cache.invalidate("projects")
         project_dict["id"] = str(result.inserted_id)
+        annotate_audit(project_id=project_dict["id"])
+        await subscribe(current_user.id, "project", project_dict["id"], "member")
         return Project(**project_dict)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating project: {str(e)}")
@@ -176,257 +178,112 @@ async def update_project_progress(project_id: str, entry: ProgressEntry):
     project_obj_id = ObjectId(project_id)
 
     # Check if project exists
-    project = projects_collection.find_one({"_id": project_obj_id})
+    project = await projects_collection.find_one({"_id": project_obj_id})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
     # Ensure 'progress_of_work' exists and merge updates
-    existing_progress = project.get("progress_of_work", {})  # Get current progress if available
+    existing_progress = normalize_progress(project.get("progress_of_work")) or {}  # Get current progress if available
     updated_progress = {**existing_progress, **entry.progress}  # Merge new updates with existing ones
 
     # Update project progress_of_work
-    update_result = projects_collection.update_one(
+    update_result = await projects_collection.update_one(
         {"_id": project_obj_id},
         {"$set": {"progress_of_work": updated_progress}}
     )
 
     if update_result.modified_count == 0:
         raise HTTPException(status_code=500, detail="Failed to update progress_of_work")
+    await response_cache.invalidate("projects", f"project:{project_id}")
 
     return {"message": "Project progress updated successfully", "progress_of_work": updated_progress}
 
 
 
-@router.get("/export", response_model=dict)
-def export_projects():
-    """Generate spreadsheet and upload to Cloudinary, including detailed progress_of_work."""
-    projects = list(projects_collection.find())
-    if not projects:
-        raise HTTPException(status_code=404, detail="No projects found")
-
-    project_data = []
-
-    for idx, proj in enumerate(projects):
-        # Extract progress details
-        progress_details = ""
-        if isinstance(proj.get("progress_of_work"), dict):
-            sections = []
-            for section, value in proj["progress_of_work"].items():
-                if value:
-                    sections.append(f"{section.replace('_', ' ').title()}: {value}")
-            progress_details = "\n".join(sections) if sections else "No progress reported"
-        else:
-            progress_details = str(proj.get("progress_of_work", "No progress reported"))
-
-        project_entry = {
-            "S/N": idx + 1,
-            "Project Name": proj.get("project_name", "N/A"),
-            "Contractor": proj.get("contractor", "N/A"),
-            "Resident Engineer": proj.get("resident_engineer", "N/A"),
-            "Progress Report": proj.get("progress_report", "N/A"),
-            "Project Tags": proj.get("project_tags", "N/A"),
-            "Award Date": proj.get("award_date", "N/A"),
-            "Contract Sum": format_currency(proj.get("contract_sum", "N/A")),
-            "Duration": proj.get("duration", "N/A"),
-            "Mobilisation Paid": format_currency(proj.get("mobilisation_paid", "N/A")),
-            "Interim Certificate Earned": format_currency(proj.get("interim_certificate_earned", "N/A")),
-            "Progress of Work": progress_details,
-            "Remark": proj.get("remark", "N/A"),
-        }
-        project_data.append(project_entry)
-
-    # Export to Excel
-    df = pd.DataFrame(project_data)
-    output_excel = io.BytesIO()
-    df.to_excel(output_excel, index=False, engine="openpyxl")
-    output_excel.seek(0)
-
-    # Upload Excel file to Cloudinary
-    output_excel_file = UploadFile(filename="projects_export.xlsx", file=output_excel)
-    upload_result_excel = cloudinary_uploader.upload(output_excel_file.file, folder="project_exports")
-
-    # Create Word document with formatted progress details
-    doc = docx.Document()
-    now = datetime.now()
-    formatted_date_str = format_date(now)
-    doc.add_heading(f"PROJECT PROGRESS REPORT AS OF {formatted_date_str}", level=1)
-
-    table = doc.add_table(rows=1, cols=len(project_data[0]))
-    table.style = "Table Grid"
-
-    for row in table.rows:
-        for cell in row.cells:
-            cell.width = docx.shared.Inches(1.5)
-            for paragraph in cell.paragraphs:
-                paragraph.paragraph_format.space_after = docx.shared.Pt(6)
-
-
-    hdr_cells = table.rows[0].cells
-    for i, key in enumerate(project_data[0].keys()):
-        hdr_cells[i].text = key
-        hdr_cells[i].paragraphs[0].runs[0].bold = True
-
-    # Add rows
-    for proj in project_data:
-        row_cells = table.add_row().cells
-        for i, (key, value) in enumerate(proj.items()):
-            if key == "Progress of Work":
-                paragraph = row_cells[i].paragraphs[0]
-                lines = str(value).split("\n")
-                if lines:
-                    paragraph.text = lines[0]
-                    for line in lines[1:]:
-                        if line.strip():
-                            paragraph.add_run("\n" + line)
-            else:
-                row_cells[i].text = str(value)
-
-    # Save and upload Word document
-    output_word = io.BytesIO()
-    doc.save(output_word)
-    output_word.seek(0)
-
-    output_word_file = UploadFile(filename="projects_export.docx", file=output_word)
-    upload_result_word = cloudinary_uploader.upload(output_word_file.file, folder="project_exports")
-
-    return {
-        "spreadsheet_url": upload_result_excel,
-        "word_doc_url": upload_result_word,
-        "row_count": len(project_data),
-        "column_count": len(project_data[0])
-    }
-
+@router.post("/export", status_code=status.HTTP_202_ACCEPTED, response_model=dict)
+async def export_projects(
+        kind: str = Query("all", pattern="^(all|ongoing)$"),
+        current_user=Depends(get_current_user)
+):
+    """Queue a spreadsheet + Word export of all (or only ongoing) projects.
+
+    Poll GET /export/jobs/{job_id} for progress and the resulting file URLs.
+    """
+    job = await create_export_job(kind, current_user.id)
+    return serialize_export_job(job)
+
+
+@router.get("/export/jobs/{job_id}", response_model=dict)
+async def get_export_job_status(job_id: str, current_user=Depends(get_current_user)):
+    """Return the status, progress and (once completed) file URLs of an export job."""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+    job = await get_export_job(ObjectId(job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return serialize_export_job(job)
+
+
+def serialize_export_job(job):
+    job = dict(job)
+    job["id"] = str(job.pop("_id"))
+    job.pop("content_hash", None)
+    return job
+
+
+@router.get("/", response_model=CursorPage[Project])
+async def get_projects(
+        request: Request,
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        project_tags: Optional[str] = None,
+        contractor: Optional[str] = None,
+        created_by: Optional[str] = None
+):
+    """Retrieve projects sorted by creation date, one keyset page at a time."""
+    return await cached_response(
+        request, ["projects"], lambda: load_projects_page(cursor, limit, project_tags, contractor, created_by)
+    )
 
-@router.get("/export/ongoing", response_model=dict)
-def export_ongoing_projects():
-    """Generate spreadsheet for ongoing projects and upload to Cloudinary."""
-    projects = list(projects_collection.find({"project_tags": "ongoing"}))
-    if not projects:
-        raise HTTPException(status_code=404, detail="No ongoing projects found")
-
-    project_data = []
-
-    for idx, proj in enumerate(projects):
-        progress_details = ""
-        if isinstance(proj.get("progress_of_work"), dict):
-            sections = [f"{key.replace('_', ' ').title()}: {value}" for key, value in proj["progress_of_work"].items()
-                        if value]
-            progress_details = "\n".join(sections) if sections else "No progress reported"
-        else:
-            progress_details = str(proj.get("progress_of_work", "No progress reported"))
-
-        project_entry = {
-            "S/N": idx + 1,
-            "Project Name": proj.get("project_name", "N/A"),
-            "Contractor": proj.get("contractor", "N/A"),
-            "Resident Engineer": proj.get("resident_engineer", "N/A"),
-            "Progress Report": proj.get("progress_report", "N/A"),
-            # "Progress of Work": progress_details
-        }
-        project_data.append(project_entry)
-
-    # Export to Excel
-    df = pd.DataFrame(project_data)
-    output_excel = io.BytesIO()
-    df.to_excel(output_excel, index=False, engine="openpyxl")
-    output_excel.seek(0)
-
-    # Create Word document
-    doc = docx.Document()
-    now = datetime.now()
-    formatted_date_str = format_date(now)
-    doc.add_heading(f"ONGOING PROJECTS PROGRESS REPORT AS OF {formatted_date_str}", level=1)
-
-    table = doc.add_table(rows=1, cols=len(project_data[0]))
-    table.style = "Table Grid"
-
-    for row in table.rows:
-        for cell in row.cells:
-            cell.width = docx.shared.Inches(1.5)
-            for paragraph in cell.paragraphs:
-                paragraph.paragraph_format.space_after = docx.shared.Pt(6)
-
-
-
-    hdr_cells = table.rows[0].cells
-    for i, key in enumerate(project_data[0].keys()):
-        hdr_cells[i].text = key
-        hdr_cells[i].paragraphs[0].runs[0].bold = True
-
-
-    for proj in project_data:
-        row_cells = table.add_row().cells
-        for i, (key, value) in enumerate(proj.items()):
-            if key == "Progress of Work":
-                paragraph = row_cells[i].paragraphs[0]
-                lines = str(value).split("\n")
-                if lines:
-                    paragraph.text = lines[0]
-                    for line in lines[1:]:
-                        if line.strip():
-                            paragraph.add_run("\n" + line)
-            else:
-                row_cells[i].text = str(value)
-
-    # Save and upload Word document
-    output_word = io.BytesIO()
-    doc.save(output_word)
-    output_word.seek(0)
-
-    # Upload to Cloudinary
-    upload_result_excel = cloudinary_uploader.upload(output_excel, folder="project_exports")
-    upload_result_word = cloudinary_uploader.upload(output_word, folder="project_exports")
 
-    return {
-        "spreadsheet_url": upload_result_excel,
-        "word_document_url": upload_result_word
-    }
+async def load_projects_page(cursor, limit, project_tags, contractor, created_by):
+    query = {}
+    if project_tags:
+        query["project_tags"] = project_tags.lower()
+    if contractor:
+        query["contractor"] = contractor
+    if created_by:
+        query["created_by"] = created_by
 
+    projects, next_cursor = await paginate_by_created_at(
+        projects_collection, query, limit, cursor=cursor, projection=PROJECT_PROJECTION
+    )
 
-@router.get("/", response_model=List[Project])
-def get_projects():
-    """Retrieve all projects sorted by creation date."""
-    projects = projects_collection.find().sort("created_at", -1)
-
-    def sanitize_data(data):
-        """Recursively replace NaN values with None."""
-        import math
-        if isinstance(data, float) and math.isnan(data):
-            return None
-        elif isinstance(data, dict):
-            return {k: sanitize_data(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [sanitize_data(v) for v in data]
-        return data
-
-    return [
-        Project(
-            **sanitize_data(
-                {
-                    **project,
-                    "id": str(project["_id"]),
-                    "progress_of_work": project.get("progress_of_work", {}) if isinstance(
-                        project.get("progress_of_work"), dict) else {}
-                }
-            )
-        )
-        for project in projects
-    ]
+    # Stored projects are normalised on write, so they go out as-is
+    return {"items": [project_out(project) for project in projects], "next_cursor": next_cursor}
 
 
 @router.get("/id/{project_id}", response_model=Project)
-def get_project_by_id(project_id: str):
+async def get_project_by_id(project_id: str, request: Request):
     """Retrieve a project by its ID."""
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
+    return await cached_response(request, [f"project:{project_id}"], lambda: load_project(project_id))
+
+
+async def load_project(project_id: str):
+    project = await projects_collection.find_one({"_id": ObjectId(project_id)}, PROJECT_PROJECTION)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    return Project(**project, id=str(project["_id"]))
+    return project_out(project)
 
 
 @router.get("/progress/{project_id}", response_model=Dict[str, Any])
-def get_project_progress(project_id: str):
+async def get_project_progress(project_id: str, request: Request):
     """Get detailed progress information for a project."""
-    project = get_project_or_404(project_id)
+    return await cached_response(request, [f"project:{project_id}"], lambda: load_project_progress(project_id))
+
+
+async def load_project_progress(project_id: str):
+    project = await get_project_or_404(project_id)
 
     progress = project.get("progress_of_work", {})
     if not progress:
@@ -440,58 +297,54 @@ def get_project_progress(project_id: str):
 
 
 @router.get("/name/{project_name}", response_model=List[Project])
-def get_project_by_name(project_name: str):
-    """Retrieve projects by name using regex matching."""
+async def get_project_by_name(project_name: str):
+    """Retrieve projects by name, best text matches first.
+
+    Falls back to a case-insensitive substring match for partial words the
+    text index can't match (e.g. "Abu" for "Abuja").
+    """
     projects = projects_collection.find(
-        {"project_name": {"$regex": project_name, "$options": "i"}}
-    )
-    projects_list = list(projects)
+        text_search_filter(project_name), {"score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"})])
+    projects_list = await projects.to_list(length=MAX_PAGE_SIZE)
+    if not projects_list:
+        projects = projects_collection.find(
+            {"project_name": {"$regex": re.escape(project_name), "$options": "i"}}
+        )
+        projects_list = await projects.to_list(length=MAX_PAGE_SIZE)
     if not projects_list:
         raise HTTPException(status_code=404, detail="No projects found with this name")
-    return [
-        Project(**{**project, "id": str(project["_id"])} if "_id" in project else project)
-        for project in projects_list
-    ]
+    return [project_out(project) for project in projects_list]
 
 
 @router.get("/recent", response_model=List[Project])
-def get_recent_projects(limit: int = 5, user=Depends(get_current_user)):
+async def get_recent_projects(request: Request, limit: int = 5, user=Depends(get_current_user)):
     """Retrieve the most recently uploaded projects."""
+    return await cached_response(request, ["projects"], lambda: load_recent_projects(limit))
 
-    projects = list(projects_collection.find().sort([("created_at", -1)]).limit(limit))
-
-    cleaned_projects = []
-    for proj in projects:
-        proj["id"] = str(proj.pop("_id", ""))  # Convert ObjectId to string
 
-        # Ensure required fields exist
-        proj.setdefault("contract_sum", 0)
-        proj.setdefault("mobilisation_paid", 0)
-        proj.setdefault("interim_certificate_earned", 0)
+async def load_recent_projects(limit: int):
+    projects = await projects_collection.find({}, PROJECT_PROJECTION).sort([("created_at", -1)]).limit(limit).to_list(length=limit)
+    return [project_out(project) for project in projects]
 
-        # Replace NaN with 0 (or another appropriate value)
-        for key, value in proj.items():
-            if isinstance(value, float) and math.isnan(value):  # Check for NaN
-                proj[key] = 0
 
-        try:
-            cleaned_projects.append(Project(**proj))
-        except ValidationError as e:
-            print(f"Skipping project due to validation error: {e}")
+@router.get("/stats", response_model=Dict[str, Any])
+async def get_project_stats(request: Request, current_user=Depends(get_current_user)):
+    """Dashboard figures: money totals by tag and contractor, document counts per project, recent activity."""
+    return await cached_response(request, ["projects", "documents"], load_project_stats)
 
-    return cleaned_projects
 
 @router.get("/{project_id}/documents", response_model=List[Document])
-def get_project_documents(project_id: str):
+async def get_project_documents(project_id: str):
     """Retrieve all documents associated with a specific project."""
-    documents = list(documents_collection.find({"project_id": project_id}))
+    documents = await documents_collection.find({"project_id": project_id}).to_list(length=None)
     if not documents:
         raise HTTPException(status_code=404, detail="No documents found for this project")
     return [Document(**{**doc, "id": str(doc["_id"]), "_id": str(doc["_id"])}) for doc in documents]
 
 
 @router.put("/projects/{project_id}")
-def update_project(
+async def update_project(
     project_id: str,
     project_name: Optional[str] = Form(None),
     contractor: Optional[str] = Form(None),
@@ -506,7 +359,7 @@ def update_project(
     remark: Optional[str] = Form(None),
     current_user: dict = Depends(get_current_user),
 ):
-    project = get_project_or_404(project_id)
+    project = await get_project_or_404(project_id)
 
     update_data = {}
 
@@ -520,7 +373,7 @@ def update_project(
     if progress_report:
         update_data["progress_report"] = progress_report
     if project_tags:
-        update_data["project_tags"] = project_tags.lower()
+        update_data["project_tags"] = project_tags
     if award_date:
         update_data["award_date"] = award_date
         # try:
@@ -542,26 +395,29 @@ def update_project(
 
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields provided for update")
+    update_data = normalize_project_fields(update_data)
 
     update_data["updated_at"] = datetime.utcnow()
 
     # Update only the provided fields
-    projects_collection.update_one({"_id": ObjectId(project_id)}, {"$set": update_data})
+    await projects_collection.update_one({"_id": ObjectId(project_id)}, {"$set": update_data})
+    await response_cache.invalidate("projects", f"project:{project_id}")
 
     return {"message": "Project updated successfully", "updated_fields": list(update_data.keys())}
 
 @router.delete("/{project_id}", response_model=dict)
-def delete_project(project_id: str, current_user=Depends(get_current_admin_user)):
+async def delete_project(project_id: str, current_user=Depends(get_current_admin_user)):
     """Delete a project (Admin only)."""
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
+    project = await projects_collection.find_one({"_id": ObjectId(project_id)})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
     if "file_url" in project:
         try:
-            cloudinary_uploader.delete(project["file_url"].split("/")[-1].split(".")[0])
+            await run_in_threadpool(cloudinary_uploader.delete, project["file_url"].split("/")[-1].split(".")[0])
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error deleting file: {str(e)}")
 
-    projects_collection.delete_one({"_id": ObjectId(project_id)})
+    await projects_collection.delete_one({"_id": ObjectId(project_id)})
+    await response_cache.invalidate("projects", f"project:{project_id}")
     return {"message": "Project deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Body, Depends
+from typing import List
+from database import signatures_collection
+from models.approval import BulkDecisionResult
+from models.signature import Signature, SignRequest, BulkSignRequest
+from models.user import Principal
+from services.auth import get_current_user
+from services.workflow import decide_tasks
+from routes.approvals import _single_result
+
+router = APIRouter()
+
+
+@router.get("/documents/{document_id}", response_model=List[Signature])
+async def get_document_signatures(document_id: str, current_user: Principal = Depends(get_current_user)):
+    signatures = []
+    async for signature in signatures_collection.find({"document_id": document_id}).sort("signed_at", 1):
+        signature["id"] = str(signature.pop("_id"))
+        signatures.append(Signature(**signature))
+    return signatures
+
+
+@router.post("/{task_id}/sign", response_model=BulkDecisionResult)
+async def sign(task_id: str, request: SignRequest = Body(SignRequest()),
+               current_user: Principal = Depends(get_current_user)):
+    """Sign a document at its sign step."""
+    return _single_result(
+        await decide_tasks([task_id], current_user, "sign", signature_url=request.signature_url)
+    )
+
+
+@router.post("/bulk", response_model=BulkDecisionResult)
+async def bulk_sign(request: BulkSignRequest, current_user: Principal = Depends(get_current_user)):
+    """Sign up to 500 documents at once; each task succeeds or fails on its own."""
+    return await decide_tasks(request.task_ids, current_user, "sign", signature_url=request.signature_url)
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Body, Depends, Request
+from services.auth import get_current_user
+from services.direct_uploads import create_upload_signature, confirm_upload, attach_upload, verify_notification
+
+router = APIRouter()
+
+
+@router.post("/signature", response_model=dict)
+async def sign_upload(
+        document_id: str = Body(...),
+        filename: str = Body(...),
+        current_user=Depends(get_current_user)
+):
+    """Sign a direct-to-Cloudinary upload of one file for a document.
+
+    POST the file to `upload_url` together with every entry of `params`,
+    then call /confirm with the returned `public_id`.
+    """
+    return await create_upload_signature(document_id, filename, current_user.id)
+
+
+@router.post("/confirm", response_model=dict)
+async def confirm_direct_upload(public_id: str = Body(..., embed=True), current_user=Depends(get_current_user)):
+    """Attach a finished direct upload to its document."""
+    document_id = await confirm_upload(public_id, current_user.id)
+    return {"document_id": document_id, "public_id": public_id, "status": "attached"}
+
+
+@router.post("/cloudinary/notify")
+async def cloudinary_notification(request: Request):
+    """Cloudinary's upload webhook; authenticated by its signature instead of a user token."""
+    payload = verify_notification(
+        await request.body(),
+        request.headers.get("X-Cld-Timestamp"),
+        request.headers.get("X-Cld-Signature"),
+    )
+    if payload.get("notification_type") == "upload" and payload.get("public_id"):
+        await attach_upload(
+            payload["public_id"], payload["secure_url"], payload.get("bytes"), payload.get("resource_type")
+        )
+    return {"detail": "ok"}
@@ -2,10 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from typing import List
 from bson import ObjectId
 from database import users_collection
-from models.user import User, UserCreate, UserUpdate, UserInDB
-from services.auth import get_current_user, get_current_admin_user, get_password_hash
+from models.user import User, UserCreate, UserUpdate, UserInDB, Principal
+from services.auth import get_current_user, get_current_admin_user
+from services.passwords import hash_password
 from services.cloudinary_service import cloudinary_uploader
+from services.token_revocation import revocation_list
+from services.user_cache import user_cache
+from services.subscriptions import sync_user, remove_user
 from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
 import logging
 
@@ -18,19 +23,25 @@ router = APIRouter()
 
 # Get all users (Admin only)
 @router.get("/", response_model=List[User])
-def get_users(current_admin: User = Depends(get_current_admin_user)):
+async def get_users(current_admin: Principal = Depends(get_current_admin_user)):
     cursor = users_collection.find()
     usersarr = []
-    for user in cursor:
+    async for user in cursor:
         user["id"] = str(user.pop("_id"))
         usersarr.append(User(**user))
     return usersarr
 
 
+# User cache hit/miss metrics (Admin only)
+@router.get("/cache/stats")
+async def get_user_cache_stats(current_admin: Principal = Depends(get_current_admin_user)):
+    return user_cache.stats()
+
+
 # Get user by ID (Admin only)
 @router.get("/{user_id}", response_model=User)
-def get_user(user_id: str, current_admin: User = Depends(get_current_admin_user)):
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
+async def get_user(user_id: str, current_admin: Principal = Depends(get_current_admin_user)):
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -40,24 +51,25 @@ def get_user(user_id: str, current_admin: User = Depends(get_current_admin_user)
 
 # Create a new user (Admin only)
 @router.post("/", response_model=User)
-def create_user(user_data: UserCreate):
-    if users_collection.find_one({"email": user_data.email}):
+async def create_user(user_data: UserCreate):
+    if await users_collection.find_one({"email": user_data.email}):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     user_dict = user_data.dict(exclude={"password"})
     user_dict["password_hash"] = hashed_password
     user_dict["created_at"] = user_dict["updated_at"] = datetime.utcnow()
     user_dict["is_active"] = True
 
-    new_user = users_collection.insert_one(user_dict)
+    new_user = await users_collection.insert_one(user_dict)
+    await sync_user(user_dict)
     user_dict["id"] = str(new_user.inserted_id)
 
     return User(**user_dict)
 
 
 @router.put("/{user_id}", response_model=User)
-def update_user(user_id: str, user_data: UserUpdate, current_user: User = Depends(get_current_user)):
+async def update_user(user_id: str, user_data: UserUpdate, current_user: Principal = Depends(get_current_user)):
     if current_user.id != user_id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Permission denied")
 
@@ -65,7 +77,10 @@ def update_user(user_id: str, user_data: UserUpdate, current_user: User = Depend
         update_data = {k: v for k, v in user_data.dict(exclude_unset=True).items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
 
-        updated_user = users_collection.find_one_and_update(
+        previous = None
+        if "role" in update_data:
+            previous = await users_collection.find_one({"_id": ObjectId(user_id)}, {"role": 1})
+        updated_user = await users_collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
             {"$set": update_data},
             return_document=ReturnDocument.AFTER
@@ -74,6 +89,12 @@ def update_user(user_id: str, user_data: UserUpdate, current_user: User = Depend
         if not updated_user:
             raise HTTPException(status_code=404, detail="User not found")
 
+        user_cache.invalidate(user_id)
+        await sync_user(updated_user)
+        if previous and previous.get("role") != updated_user.get("role"):
+            # Issued tokens carry the old role; make the user pick up the new one
+            await revocation_list.revoke_user(user_id)
+
         if updated_user:
             updated_user["id"] = str(updated_user["_id"])  # Convert ObjectId to string
             del updated_user["_id"]  # Remove _id since Pydantic doesn't expect it
@@ -88,14 +109,14 @@ def update_user(user_id: str, user_data: UserUpdate, current_user: User = Depend
 
 # Upload profile image
 @router.post("/{user_id}/upload-profile", response_model=User)
-def upload_profile_image(user_id: str, file: UploadFile = File(...),
-                         current_user: User = Depends(get_current_user)):
+async def upload_profile_image(user_id: str, file: UploadFile = File(...),
+                         current_user: Principal = Depends(get_current_user)):
     if current_user.id != user_id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Permission denied")
 
     try:
-        image_url = cloudinary_uploader.upload(file.file, folder="users")
-        updated_user = users_collection.find_one_and_update(
+        image_url = await run_in_threadpool(cloudinary_uploader.upload, file.file, folder="users")
+        updated_user = await users_collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
             {"$set": {"profile_image": image_url, "updated_at": datetime.utcnow()}},
             return_document=ReturnDocument.AFTER
@@ -104,6 +125,8 @@ def upload_profile_image(user_id: str, file: UploadFile = File(...),
         if not updated_user:
             raise HTTPException(status_code=404, detail="User not found")
 
+        user_cache.invalidate(user_id)
+
         # Convert ObjectId to string and remove _id before returning
         updated_user["id"] = str(updated_user.pop("_id"))  # Crucial fix
         return User(**updated_user)
@@ -115,8 +138,11 @@ def upload_profile_image(user_id: str, file: UploadFile = File(...),
 
 # Delete user (Admin only)
 @router.delete("/{user_id}")
-def delete_user(user_id: str, current_admin: User = Depends(get_current_admin_user)):
-    deleted_user = users_collection.find_one_and_delete({"_id": ObjectId(user_id)})
+async def delete_user(user_id: str, current_admin: Principal = Depends(get_current_admin_user)):
+    deleted_user = await users_collection.find_one_and_delete({"_id": ObjectId(user_id)})
     if not deleted_user:
         raise HTTPException(status_code=404, detail="User not found")
+    user_cache.invalidate(user_id)
+    await revocation_list.revoke_user(user_id)
+    await remove_user(user_id)
     return {"detail": "User deleted successfully"}
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable
+from bson import ObjectId
+from starlette.concurrency import run_in_threadpool
+from config import settings
+from database import (
+    asset_deletions_collection,
+    asset_reconciliations_collection,
+    assets_collection,
+    documents_collection,
+    file_versions_collection,
+    pending_uploads_collection,
+)
+from services.cloudinary_service import cloudinary_uploader, parse_cloudinary_url
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100  # Cloudinary's limit of public_ids per delete_resources call
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 60  # backoff is RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+POLL_INTERVAL_SECONDS = 5
+STALE_CLAIM_MINUTES = 10
+RESOURCE_TYPES = ["image", "video", "raw"]
+RECONCILE_GRACE_HOURS = 24  # assets younger than this may still be waiting for their document
+
+# Asset deletions are queued in `asset_deletions` and carried out in the
+# background with Cloudinary's bulk delete, so removing a document with many
+# attachments is a single database write and a Cloudinary outage only
+# delays the cleanup.
+
+
+def asset_ref(item: dict):
+    """(public_id, resource_type) of a stored file item, parsing the URL for legacy items."""
+    if item.get("public_id"):
+        return item["public_id"], item.get("resource_type") or "raw"
+    if item.get("url"):
+        return parse_cloudinary_url(item["url"])
+    return None, None
+
+
+async def enqueue_asset_deletions(items: Iterable[dict], reason: str):
+    now = datetime.utcnow()
+    records = []
+    for item in items:
+        public_id, resource_type = asset_ref(item)
+        if not public_id:
+            logger.warning(f"Cannot delete asset without a public_id: {item.get('url')}")
+            continue
+        records.append({
+            "public_id": public_id,
+            "resource_type": resource_type,
+            "reason": reason,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+    if records:
+        await asset_deletions_collection.insert_many(records, ordered=False)
+
+
+async def _claim_batch():
+    """Claim up to BATCH_SIZE due deletions of one resource type."""
+    now = datetime.utcnow()
+    due = {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now}},
+        {"status": "deleting", "claimed_at": {"$lte": now - timedelta(minutes=STALE_CLAIM_MINUTES)}},
+    ]}
+    first = await asset_deletions_collection.find_one(due, {"resource_type": 1}, sort=[("next_attempt_at", 1)])
+    if not first:
+        return []
+    candidates = await asset_deletions_collection.find(
+        {**due, "resource_type": first["resource_type"]}, {"_id": 1}
+    ).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+
+    claim_id = uuid.uuid4().hex
+    await asset_deletions_collection.update_many(
+        {**due, "_id": {"$in": [doc["_id"] for doc in candidates]}},
+        {"$set": {"status": "deleting", "claimed_at": now, "claim_id": claim_id}}
+    )
+    return await asset_deletions_collection.find({"claim_id": claim_id}).to_list(length=BATCH_SIZE)
+
+
+async def process_deletions() -> int:
+    """Delete one batch of queued assets. Returns the number of queue entries handled."""
+    batch = await _claim_batch()
+    if not batch:
+        return 0
+
+    resource_type = batch[0]["resource_type"]
+    public_ids = list({entry["public_id"] for entry in batch})
+    try:
+        results = await run_in_threadpool(cloudinary_uploader.delete_many, public_ids, resource_type)
+        error = None
+    except Exception as e:
+        results, error = {}, e
+
+    now = datetime.utcnow()
+    for entry in batch:
+        outcome = results.get(entry["public_id"])
+        if outcome in ("deleted", "not_found"):
+            update = {"status": "done", "outcome": outcome, "finished_at": now}
+        else:
+            attempts = entry.get("attempts", 0) + 1
+            last_error = str(error) if error else f"Cloudinary reported {outcome!r}"
+            if attempts >= MAX_ATTEMPTS:
+                logger.error(f"Giving up deleting asset {entry['public_id']} after {attempts} attempts: {last_error}")
+                update = {"status": "failed", "attempts": attempts, "last_error": last_error, "finished_at": now}
+            else:
+                update = {
+                    "status": "pending",
+                    "attempts": attempts,
+                    "last_error": last_error,
+                    "next_attempt_at": now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1)),
+                }
+        await asset_deletions_collection.update_one({"_id": entry["_id"]}, {"$set": update, "$unset": {"claim_id": ""}})
+    return len(batch)
+
+
+async def _referenced_assets() -> set:
+    referenced = set()
+    async for doc in documents_collection.find({}, {"file_items": 1}):
+        for item in doc.get("file_items") or []:
+            public_id, _ = asset_ref(item)
+            if public_id:
+                referenced.add(public_id)
+    async for version in file_versions_collection.find({}, {"url": 1, "public_id": 1, "resource_type": 1}):
+        public_id, _ = asset_ref(version)
+        if public_id:
+            referenced.add(public_id)
+    async for asset in assets_collection.find({"refcount": {"$gt": 0}}, {"public_id": 1}):
+        referenced.add(asset["public_id"])
+    async for upload in pending_uploads_collection.find({}, {"_id": 1}):
+        referenced.add(upload["_id"])
+    async for entry in asset_deletions_collection.find({"status": {"$in": ["pending", "deleting"]}}, {"public_id": 1}):
+        referenced.add(entry["public_id"])  # already on its way out
+    return referenced
+
+
+async def run_reconciliation(job_id: ObjectId, delete: bool):
+    """List assets under UPLOAD_FOLDER on Cloudinary and find the ones no document references."""
+    jobs = asset_reconciliations_collection
+    await jobs.update_one({"_id": job_id}, {"$set": {"status": "running", "started_at": datetime.utcnow()}})
+    try:
+        referenced = await _referenced_assets()
+        cutoff = datetime.utcnow() - timedelta(hours=RECONCILE_GRACE_HOURS)
+        orphans, scanned = [], 0
+        for resource_type in RESOURCE_TYPES:
+            next_cursor = None
+            while True:
+                resources, next_cursor = await run_in_threadpool(
+                    cloudinary_uploader.list_resources, settings.UPLOAD_FOLDER + "/", resource_type, next_cursor
+                )
+                scanned += len(resources)
+                for resource in resources:
+                    created_at = datetime.strptime(resource["created_at"], "%Y-%m-%dT%H:%M:%SZ")
+                    if resource["public_id"] not in referenced and created_at < cutoff:
+                        orphans.append({
+                            "public_id": resource["public_id"],
+                            "resource_type": resource_type,
+                            "bytes": resource.get("bytes", 0),
+                        })
+                if not next_cursor:
+                    break
+
+        if delete and orphans:
+            await enqueue_asset_deletions(orphans, reason="orphaned")
+        await jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "completed",
+            "scanned": scanned,
+            "orphan_count": len(orphans),
+            "orphan_bytes": sum(orphan["bytes"] for orphan in orphans),
+            "orphans": orphans[:500],
+            "deletion_queued": bool(delete and orphans),
+            "finished_at": datetime.utcnow(),
+        }})
+    except Exception as e:
+        logger.error(f"Asset reconciliation {job_id} failed: {e}", exc_info=True)
+        await jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "failed", "error": str(e), "finished_at": datetime.utcnow()
+        }})
+
+
+_running = set()
+
+
+async def start_reconciliation(delete: bool, requested_by: str) -> dict:
+    job = {
+        "_id": ObjectId(),
+        "status": "queued",
+        "delete": delete,
+        "requested_by": requested_by,
+        "created_at": datetime.utcnow(),
+    }
+    await asset_reconciliations_collection.insert_one(job)
+    task = asyncio.create_task(run_reconciliation(job["_id"], delete))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return job
+
+
+async def get_reconciliation(job_id: ObjectId):
+    return await asset_reconciliations_collection.find_one({"_id": job_id})
+
+
+async def deletion_queue_stats() -> dict:
+    counts = asset_deletions_collection.aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}])
+    return {row["_id"]: row["n"] async for row in counts}
+
+
+_gc_task = None
+
+
+async def _gc_loop():
+    while True:
+        try:
+            processed = await process_deletions()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Asset GC error: {e}", exc_info=True)
+            processed = 0
+        if not processed:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+def start_asset_gc():
+    global _gc_task
+    _gc_task = asyncio.create_task(_gc_loop())
+
+
+async def stop_asset_gc():
+    global _gc_task
+    if _gc_task is None:
+        return
+    _gc_task.cancel()
+    try:
+        await _gc_task
+    except asyncio.CancelledError:
+        pass
+    _gc_task = None
@@ -0,0 +1,117 @@
+import logging
+from datetime import datetime
+from typing import Iterable, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import assets_collection, documents_collection
+from services.asset_gc import enqueue_asset_deletions
+
+logger = logging.getLogger(__name__)
+
+# Uploaded files are deduplicated by content: `assets` is keyed by the
+# SHA-256 of the bytes and counts the file items that point at the stored
+# Cloudinary asset. A repeat upload reuses the asset without sending any
+# bytes, and the asset is only deleted once its last reference is gone.
+# File items whose public_id differs from the asset's (uploaded before
+# deduplication, or direct uploads) are not counted and are deleted as usual.
+
+
+async def acquire_existing(checksum: str) -> Optional[dict]:
+    """Take a reference on an existing asset with this content, if there is one."""
+    return await assets_collection.find_one_and_update(
+        {"_id": checksum, "refcount": {"$gt": 0}},
+        {"$inc": {"refcount": 1}, "$set": {"last_used_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def register_upload(item: dict) -> dict:
+    """Record a fresh upload as the asset for its checksum, holding one reference.
+
+    If the same content was stored concurrently, the other asset wins: a
+    reference is taken on it and this upload is queued for deletion.
+    """
+    now = datetime.utcnow()
+    try:
+        await assets_collection.insert_one({
+            "_id": item["checksum"],
+            "public_id": item["public_id"],
+            "resource_type": item["resource_type"],
+            "url": item["url"],
+            "bytes": item["bytes"],
+            "refcount": 1,
+            "created_at": now,
+            "last_used_at": now,
+        })
+        return item
+    except DuplicateKeyError:
+        existing = await acquire_existing(item["checksum"])
+        if existing is None:
+            # The other copy is being released right now; keep ours unmanaged
+            return item
+        await enqueue_asset_deletions([item], reason="duplicate")
+        return asset_file_item(existing, item["name"])
+
+
+def asset_file_item(asset: dict, name: str) -> dict:
+    return {
+        "url": asset["url"],
+        "name": name,
+        "public_id": asset["public_id"],
+        "resource_type": asset["resource_type"],
+        "bytes": asset["bytes"],
+        "checksum": asset["_id"],
+    }
+
+
+async def release_file_items(items: Iterable[dict], reason: str):
+    """Drop the references held by file items; assets nobody references any more are deleted."""
+    to_delete = []
+    for item in items:
+        if not item.get("checksum"):
+            to_delete.append(item)
+            continue
+        asset = await assets_collection.find_one_and_update(
+            {"_id": item["checksum"], "public_id": item.get("public_id"), "refcount": {"$gt": 0}},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if asset is None:
+            to_delete.append(item)  # not a managed asset
+        elif asset["refcount"] <= 0:
+            # Only the caller that removes the record deletes the file
+            result = await assets_collection.delete_one({"_id": asset["_id"], "refcount": {"$lte": 0}})
+            if result.deleted_count:
+                to_delete.append(item)
+    await enqueue_asset_deletions(to_delete, reason=reason)
+
+
+async def backfill_assets():
+    """Register assets for file items that already carry a checksum."""
+    pipeline = [
+        {"$unwind": "$file_items"},
+        {"$match": {"file_items.checksum": {"$type": "string"}, "file_items.public_id": {"$type": "string"}}},
+        {"$group": {
+            "_id": {"checksum": "$file_items.checksum", "public_id": "$file_items.public_id"},
+            "refcount": {"$sum": 1},
+            "item": {"$first": "$file_items"},
+        }},
+    ]
+    registered = 0
+    async for group in documents_collection.aggregate(pipeline, allowDiskUse=True):
+        item = group["item"]
+        try:
+            await assets_collection.insert_one({
+                "_id": item["checksum"],
+                "public_id": item["public_id"],
+                "resource_type": item.get("resource_type") or "raw",
+                "url": item["url"],
+                "bytes": item.get("bytes"),
+                "refcount": group["refcount"],
+                "created_at": datetime.utcnow(),
+                "last_used_at": datetime.utcnow(),
+            })
+            registered += 1
+        except DuplicateKeyError:
+            pass  # another copy of the same content already owns the checksum
+    logger.info(f"Registered {registered} existing assets")
@@ -0,0 +1,193 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from config import settings
+from database import db, logs_collection
+
+logger = logging.getLogger(__name__)
+
+AUDITED_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# The audit trail of mutating requests. Entries are buffered in memory and
+# written with insert_many by a background task once AUDIT_BATCH_SIZE have
+# accumulated or AUDIT_FLUSH_SECONDS have passed, so requests never wait on an
+# audit insert. The buffer is bounded: if Mongo is unreachable for long, the
+# oldest entries are dropped (and counted) rather than growing without limit.
+# Entries still buffered when a worker is killed are lost; a clean shutdown
+# flushes them.
+
+
+class AuditBuffer:
+    def __init__(self, batch_size: int, max_entries: int):
+        self.batch_size = batch_size
+        self._entries = deque(maxlen=max_entries)
+        self._ready = asyncio.Event()
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def record(self, entry: dict) -> ObjectId:
+        entry.setdefault("_id", ObjectId())
+        entry.setdefault("timestamp", datetime.utcnow())
+        if len(self._entries) == self._entries.maxlen:
+            self.dropped += 1
+        self._entries.append(entry)
+        if len(self._entries) >= self.batch_size:
+            self._ready.set()
+        return entry["_id"]
+
+    async def flush(self) -> int:
+        written = 0
+        while self._entries:
+            batch = [self._entries.popleft() for _ in range(min(self.batch_size, len(self._entries)))]
+            try:
+                await logs_collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Ids are assigned up front, so duplicates are entries an earlier attempt already wrote
+                failed = [error["index"] for error in e.details.get("writeErrors", []) if error["code"] != 11000]
+                retry = [batch[index] for index in failed]
+                self._requeue(retry)
+                written += len(batch) - len(retry)
+                if retry:
+                    self.failed_flushes += 1
+                    logger.error(f"Audit flush failed for {len(retry)} entries: {e}")
+                    break
+                continue
+            except PyMongoError as e:
+                # Put the batch back for the next attempt
+                self._requeue(batch)
+                self.failed_flushes += 1
+                logger.error(f"Audit flush of {len(batch)} entries failed: {e}")
+                break
+            written += len(batch)
+        self.written += written
+        return written
+
+    def _requeue(self, entries: list):
+        """Put failed entries back at the front; they are the oldest, so what doesn't fit is dropped."""
+        space = self._entries.maxlen - len(self._entries)
+        if len(entries) > space:
+            self.dropped += len(entries) - space
+            entries = entries[len(entries) - space:]
+        self._entries.extendleft(reversed(entries))
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._ready.clear()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._entries),
+            "max_buffered": self._entries.maxlen,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+audit_log = AuditBuffer(settings.AUDIT_BATCH_SIZE, settings.AUDIT_MAX_BUFFERED)
+
+_current_entry = contextvars.ContextVar("audit_entry", default=None)
+
+
+def annotate_audit(**fields):
+    """Add fields (user_id, document_id, project_id, details...) to the current request's audit entry."""
+    entry = _current_entry.get()
+    if entry is not None:
+        entry.update({key: value for key, value in fields.items() if value is not None})
+
+
+class AuditMiddleware:
+    """Records one audit entry per mutating request, named after the endpoint that handled it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in AUDITED_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        entry = {}
+        token = _current_entry.set(entry)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_entry.reset(token)
+            endpoint = scope.get("endpoint")
+            path_params = dict(scope.get("path_params") or {})
+            client = scope.get("client")
+            audit_log.record({
+                "user_id": entry.pop("user_id", None),
+                "action": getattr(endpoint, "__name__", "unmatched"),
+                "method": scope["method"],
+                "path": scope["path"],
+                "status_code": status["code"],
+                "document_id": entry.pop("document_id", path_params.pop("document_id", None)),
+                "project_id": entry.pop("project_id", path_params.pop("project_id", None)),
+                "ip": client[0] if client else None,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "details": {**path_params, **entry} or None,
+            })
+
+
+async def apply_retention():
+    """Bring the TTL of the timestamp index (created by migration 19) in line with a changed AUDIT_RETENTION_DAYS.
+
+    A failure here shows up as drift on the logs collection in the startup index check.
+    """
+    try:
+        await db.command(
+            "collMod", logs_collection.name,
+            index={"keyPattern": {"timestamp": 1}, "expireAfterSeconds": settings.AUDIT_RETENTION_DAYS * 86400}
+        )
+    except OperationFailure as e:
+        logger.error(f"Could not update audit log retention: {e}")
+
+
+_writer_task = None
+
+
+async def _writer_loop():
+    while True:
+        await audit_log.wait(settings.AUDIT_FLUSH_SECONDS)
+        try:
+            await audit_log.flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Audit writer error: {e}", exc_info=True)
+
+
+def start_audit_writer():
+    global _writer_task
+    _writer_task = asyncio.create_task(_writer_loop())
+
+
+async def stop_audit_writer():
+    global _writer_task
+    if _writer_task is None:
+        return
+    _writer_task.cancel()
+    try:
+        await _writer_task
+    except asyncio.CancelledError:
+        pass
+    _writer_task = None
+    await audit_log.flush()
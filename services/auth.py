@@ -1,79 +1,142 @@
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from bson import ObjectId
+from bson.errors import InvalidId
 from database import users_collection
-from models.user import User, UserInDB
+from models.user import User, Principal
 from config import settings
-from routes.auth import pwd_context, oauth2_scheme
+from services.passwords import verify_and_upgrade, login_throttle
+from services.token_revocation import revocation_list
+from services.audit import annotate_audit
 
-# pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-# oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
+# Access tokens carry everything needed to authorize a request (id, role,
+# is_active), so get_current_user never touches Mongo. They are short-lived;
+# refresh tokens re-read the user, which is where role and status changes
+# are picked up. Revocations are checked against an in-memory list.
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
 
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+def signing_keys() -> dict:
+    return settings.JWT_KEYS or {"default": settings.SECRET_KEY}
 
 
-def get_user(email: str) -> Optional[UserInDB]:
-    if user_dict := users_collection.find_one({"email": email}):
-        return UserInDB(**user_dict)
-    return None
+def active_kid() -> str:
+    keys = signing_keys()
+    return settings.JWT_ACTIVE_KID if settings.JWT_ACTIVE_KID in keys else next(iter(keys))
 
 
-def authenticate_user(email: str, password: str) -> Optional[User]:
-    user = get_user(email)
-    if not user:
-        return None
-    if not verify_password(password, user.password_hash):
-        return None
-    return User(**user.dict())
+def _encode(claims: dict, lifetime: timedelta) -> str:
+    now = datetime.utcnow()
+    claims = {**claims, "iat": now, "exp": now + lifetime, "jti": uuid.uuid4().hex}
+    kid = active_kid()
+    return jwt.encode(claims, signing_keys()[kid], algorithm=settings.ALGORITHM, headers={"kid": kid})
+
 
+def create_access_token(user: User) -> str:
+    return _encode(
+        {"sub": user.email, "id": user.id, "role": user.role, "active": user.is_active, "type": "access"},
+        timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
+def create_refresh_token(user: User) -> str:
+    return _encode({"sub": user.email, "id": user.id, "type": "refresh"},
+                   timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS))
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+
+def issue_tokens(user: User) -> dict:
+    return {
+        "access_token": create_access_token(user),
+        "refresh_token": create_refresh_token(user),
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def decode_token(token: str, token_type: str) -> dict:
+    """Verify a token's signature, expiry, type and revocation status and return its claims."""
     try:
-        payload = jwt.decode(token, "settings.SECRET_KEY", algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = signing_keys().get(kid)
+        if key is None:
             raise credentials_exception
+        payload = jwt.decode(token, key, algorithms=[settings.ALGORITHM])
     except JWTError:
         raise credentials_exception
 
-    user = get_user(email)
-    if user is None:
+    if payload.get("type") != token_type or not payload.get("id") or not payload.get("sub"):
+        raise credentials_exception
+    issued_at = datetime.utcfromtimestamp(payload.get("iat", 0))
+    if revocation_list.is_revoked(payload.get("jti"), payload["id"], issued_at):
+        raise credentials_exception
+    return payload
+
+
+async def authenticate_user(email: str, password: str, client_ip: Optional[str] = None) -> Optional[User]:
+    annotate_audit(email=email)
+    login_throttle.check(email, client_ip)
+    user_dict = await users_collection.find_one({"email": email})
+    if not user_dict or not await verify_and_upgrade(user_dict, password):
+        login_throttle.record_failure(email, client_ip)
+        return None
+    login_throttle.record_success(email)
+    annotate_audit(user_id=str(user_dict["_id"]))
+    return User(**user_dict, id=str(user_dict["_id"]))
+
+
+async def refresh_tokens(refresh_token: str) -> dict:
+    """Exchange a refresh token for a new token pair, revoking the old refresh token."""
+    payload = decode_token(refresh_token, "refresh")
+    try:
+        user_dict = await users_collection.find_one({"_id": ObjectId(payload["id"])})
+    except InvalidId:
+        raise credentials_exception
+    if not user_dict or not user_dict.get("is_active", True):
         raise credentials_exception
-    return User(**user.dict())
+
+    await revocation_list.revoke_token(payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+    annotate_audit(user_id=payload["id"])
+    return issue_tokens(User(**user_dict, id=str(user_dict["_id"])))
 
 
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def revoke_token(token: str, token_type: str):
+    payload = decode_token(token, token_type)
+    await revocation_list.revoke_token(payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    payload = decode_token(token, "access")
+    annotate_audit(user_id=payload["id"])
+    return Principal(
+        id=payload["id"],
+        email=payload["sub"],
+        role=payload.get("role", "staff"),
+        is_active=payload.get("active", True),
+    )
+
+
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
-def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Ensure that the current user is an admin."""
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Insufficient permissions. Admin access required."
         )
-    return current_user
\ No newline at end of file
+    return current_user
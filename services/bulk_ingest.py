@@ -0,0 +1,402 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from typing import List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from config import settings
+from database import (
+    documents_collection,
+    projects_collection,
+    ingest_batches_collection,
+    ingest_checkpoints_collection,
+)
+from services.upload_pipeline import run_in_upload_pool, rollback_uploads, store_file, file_item
+from services.response_cache import response_cache
+from services.document_threads import thread_fields
+from services.workflow import workflow_fields, open_first_tasks
+from routes.notifications import send_ingest_summary_notification
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ["title", "project_id", "reference_number", "document_type", "files"]
+MAX_REPORTED_ERRORS = 200  # per-row errors kept on the batch record
+DUPLICATE_KEY_ERROR = 11000
+STALE_HEARTBEAT_MINUTES = 15  # a running batch that stopped reporting progress is considered dead
+
+# Every imported document carries `ingest_key` (batch id + row key), which is
+# unique. Together with the per-row checkpoints this makes a batch safe to
+# re-run after a crash: rows already checkpointed are skipped before any
+# upload, and a row whose insert landed but whose checkpoint did not is
+# caught by the unique index instead of being imported twice.
+
+
+class DirectorySource:
+    """Files referenced by the manifest, relative to a local directory."""
+
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+
+    def _path(self, name: str) -> str:
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"{name} is outside the source directory")
+        return path
+
+    def exists(self, name: str) -> bool:
+        try:
+            return os.path.isfile(self._path(name))
+        except ValueError:
+            return False
+
+    def open(self, name: str):
+        return open(self._path(name), "rb")
+
+    def close(self):
+        pass
+
+
+class ZipSource:
+    """Files referenced by the manifest, as members of a ZIP archive."""
+
+    def __init__(self, path: str, delete_on_close: bool = False):
+        self.path = path
+        self.delete_on_close = delete_on_close
+        self.archive = zipfile.ZipFile(path)
+        self.names = {info.filename for info in self.archive.infolist() if not info.is_dir()}
+        self._lock = threading.Lock()  # upload threads share one archive handle
+
+    def exists(self, name: str) -> bool:
+        return name in self.names
+
+    def open(self, name: str):
+        # Copy the member out so the uploader can seek; small files stay in memory
+        spooled = tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_CHUNK_SIZE)
+        with self._lock, self.archive.open(name) as member:
+            shutil.copyfileobj(member, spooled)
+        spooled.seek(0)
+        return spooled
+
+    def close(self):
+        self.archive.close()
+        if self.delete_on_close:
+            os.unlink(self.path)
+
+
+def open_source(path: str, delete_on_close: bool = False):
+    if zipfile.is_zipfile(path):
+        return ZipSource(path, delete_on_close)
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    raise ValueError(f"{path} is neither a directory nor a ZIP archive")
+
+
+def parse_manifest(data: bytes, filename: str) -> List[dict]:
+    """Read manifest rows from CSV or JSON (a list of objects).
+
+    `files` lists the row's file paths within the source, separated by ";"
+    in CSV or as a list in JSON. `source_id` optionally gives each row a
+    stable key; without it rows are keyed by position, so a resumed batch
+    must use the same manifest unchanged.
+    """
+    if filename.lower().endswith(".json"):
+        rows = json.loads(data)
+        if not isinstance(rows, list):
+            raise ValueError("JSON manifest must be a list of objects")
+    else:
+        rows = list(csv.DictReader(io.StringIO(data.decode("utf-8-sig"))))
+
+    parsed = []
+    for position, row in enumerate(rows, start=1):
+        files = row.get("files") or []
+        if isinstance(files, str):
+            files = [name.strip() for name in files.split(";") if name.strip()]
+        parsed.append({
+            **{key: (value.strip() if isinstance(value, str) else value) for key, value in row.items()},
+            "files": files,
+            "row_key": str(row.get("source_id") or f"row-{position}"),
+            "position": position,
+        })
+    return parsed
+
+
+async def validate_manifest(rows: List[dict], source) -> List[dict]:
+    """Check every row before anything is uploaded; returns a list of row errors."""
+    errors = []
+    seen_keys = set()
+    for row in rows:
+        missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+        if missing:
+            errors.append({"row": row["position"], "error": f"Missing {', '.join(missing)}"})
+        if row["row_key"] in seen_keys:
+            errors.append({"row": row["position"], "error": f"Duplicate source_id {row['row_key']}"})
+        seen_keys.add(row["row_key"])
+        for name in row["files"]:
+            if not source.exists(name):
+                errors.append({"row": row["position"], "error": f"File not found: {name}"})
+
+    # References are checked with one query per collection, not per row
+    errors.extend(await _check_references(rows, "project_id", projects_collection, "Unknown project"))
+    errors.extend(await _check_references(rows, "parent_document_id", documents_collection, "Unknown parent document"))
+    return sorted(errors, key=lambda error: error["row"])
+
+
+async def _check_references(rows, field, collection, message):
+    ids, errors = set(), []
+    for row in rows:
+        if not row.get(field):
+            continue
+        try:
+            ids.add(ObjectId(row[field]))
+        except (InvalidId, TypeError):
+            errors.append({"row": row["position"], "error": f"{message}: {row[field]}"})
+    found = {
+        str(doc["_id"])
+        async for doc in collection.find({"_id": {"$in": list(ids)}}, {"_id": 1})
+    } if ids else set()
+    for row in rows:
+        value = row.get(field)
+        if value and value not in found and ObjectId.is_valid(value):
+            errors.append({"row": row["position"], "error": f"{message}: {value}"})
+    return errors
+
+
+async def _upload_from_source(source, name: str, folder: str, limit: asyncio.Semaphore) -> dict:
+    # Each open file is spooled (up to UPLOAD_CHUNK_SIZE in memory), so only
+    # as many are open as the upload pool can work on
+    async with limit:
+        file = await run_in_upload_pool(source.open, name)
+        try:
+            return await store_file(file, os.path.basename(name), folder)
+        finally:
+            file.close()
+
+
+async def _upload_row(source, row, folder, limit):
+    results = await asyncio.gather(
+        *(_upload_from_source(source, name, folder, limit) for name in row["files"]),
+        return_exceptions=True
+    )
+    uploaded = [result for result in results if not isinstance(result, BaseException)]
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        await rollback_uploads(uploaded)
+        raise failures[0]
+    return uploaded
+
+
+def _document_record(batch_id, row, uploaded, uploaded_by, threads):
+    now = datetime.utcnow()
+    return {
+        "_id": ObjectId(),
+        "title": row["title"],
+        "project_id": row["project_id"],
+        "reference_number": row["reference_number"],
+        "document_type": row["document_type"],
+        "description": row.get("description") or None,
+        "uploaded_by": uploaded_by,
+        "file_items": [file_item(item) for item in uploaded],
+        "parent_document_id": row.get("parent_document_id") or None,
+        **threads.get(row.get("parent_document_id") or None, thread_fields(None)),
+        **workflow_fields(row["document_type"]),
+        "signed_by": [],
+        "comment_count": 0,
+        "ingest_key": f"{batch_id}:{row['row_key']}",
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+async def _parent_threads(rows):
+    """Thread fields for replies to each distinct parent in `rows`, fetched in one query."""
+    parent_ids = {row["parent_document_id"] for row in rows if row.get("parent_document_id")}
+    parents = documents_collection.find(
+        {"_id": {"$in": [ObjectId(parent_id) for parent_id in parent_ids]}}, {"ancestors": 1}
+    )
+    return {str(parent["_id"]): thread_fields(parent) async for parent in parents}
+
+
+async def _process_chunk(batch_id, chunk, source, uploaded_by, folder, threads):
+    """Upload and insert one chunk of rows; returns (imported, errors)."""
+    limit = asyncio.Semaphore(settings.UPLOAD_WORKERS)
+    upload_results = await asyncio.gather(
+        *(_upload_row(source, row, folder, limit) for row in chunk), return_exceptions=True
+    )
+
+    records, uploads, errors = [], [], []
+    for row, result in zip(chunk, upload_results):
+        if isinstance(result, BaseException):
+            errors.append({"row": row["position"], "row_key": row["row_key"], "error": f"Upload failed: {result}"})
+            continue
+        records.append((row, _document_record(batch_id, row, result, uploaded_by, threads)))
+        uploads.append(result)
+    if not records:
+        return 0, errors
+
+    failed_indexes = {}
+    try:
+        await documents_collection.insert_many([record for _, record in records], ordered=False)
+    except BulkWriteError as e:
+        failed_indexes = {error["index"]: error for error in e.details.get("writeErrors", [])}
+
+    checkpoints, inserted, imported = [], [], 0
+    for index, ((row, record), uploaded) in enumerate(zip(records, uploads)):
+        error = failed_indexes.get(index)
+        if error is None:
+            imported += 1
+            inserted.append(record)
+            checkpoints.append({
+                "_id": record["ingest_key"], "batch_id": batch_id, "row_key": row["row_key"],
+                "document_id": str(record["_id"]), "completed_at": datetime.utcnow(),
+            })
+            continue
+        # Either way these uploads are not referenced by any new document
+        await rollback_uploads(uploaded)
+        if error.get("code") == DUPLICATE_KEY_ERROR:
+            # Imported by an earlier run that died before checkpointing this row
+            existing = await documents_collection.find_one(
+                {"ingest_key": record["ingest_key"]},
+                {"status": 1, "workflow_steps": 1, "workflow_cycle": 1, "document_type": 1, "project_id": 1, "title": 1}
+            )
+            if existing:
+                inserted.append(existing)  # its first task may not have been created yet
+            imported += 1
+            checkpoints.append({
+                "_id": record["ingest_key"], "batch_id": batch_id, "row_key": row["row_key"],
+                "document_id": str(existing["_id"]) if existing else None, "completed_at": datetime.utcnow(),
+            })
+        else:
+            errors.append({"row": row["position"], "row_key": row["row_key"], "error": error.get("errmsg")})
+
+    # Tasks are upserts, so re-opening them for resumed rows is harmless
+    await open_first_tasks(inserted)
+    if checkpoints:
+        try:
+            await ingest_checkpoints_collection.insert_many(checkpoints, ordered=False)
+        except BulkWriteError:
+            pass  # rows checkpointed by a concurrent or earlier run
+    return imported, errors
+
+
+def _stale_cutoff():
+    return datetime.utcnow() - timedelta(minutes=STALE_HEARTBEAT_MINUTES)
+
+
+async def create_ingest_batch(rows: List[dict], uploaded_by: str, source_name: str,
+                              batch_id: Optional[str] = None) -> dict:
+    """Create a batch record, or reopen an existing one to resume it."""
+    now = datetime.utcnow()
+    if batch_id:
+        batch = await ingest_batches_collection.find_one_and_update(
+            {"_id": batch_id, "$or": [
+                {"status": {"$nin": ["queued", "running"]}},
+                {"heartbeat_at": {"$lt": _stale_cutoff()}},
+            ]},
+            {"$set": {"status": "queued", "total": len(rows), "resumed_at": now, "heartbeat_at": now}}
+        )
+        if batch:
+            return batch
+        if await ingest_batches_collection.find_one({"_id": batch_id}):
+            raise ValueError(f"Batch {batch_id} is already running")
+
+    batch = {
+        "_id": batch_id or str(ObjectId()),
+        "status": "queued",
+        "total": len(rows),
+        "imported": 0,
+        "skipped": 0,
+        "failed": 0,
+        "errors": [],
+        "source": source_name,
+        "uploaded_by": uploaded_by,
+        "created_at": now,
+        "heartbeat_at": now,
+    }
+    try:
+        await ingest_batches_collection.insert_one(batch)
+    except DuplicateKeyError:
+        raise ValueError(f"Batch {batch['_id']} already exists")
+    return batch
+
+
+async def run_ingestion(batch_id: str, rows: List[dict], source, uploaded_by: str,
+                        folder: str = "ministry_works"):
+    """Import all rows of a batch that have no checkpoint yet, chunk by chunk."""
+    batches = ingest_batches_collection
+    now = datetime.utcnow()
+    await batches.update_one({"_id": batch_id}, {"$set": {"status": "running", "started_at": now, "heartbeat_at": now}})
+    try:
+        done = {
+            checkpoint["row_key"]
+            async for checkpoint in ingest_checkpoints_collection.find({"batch_id": batch_id}, {"row_key": 1})
+        }
+        pending = [row for row in rows if row["row_key"] not in done]
+        threads = await _parent_threads(pending)
+        await batches.update_one({"_id": batch_id}, {"$set": {
+            "skipped": len(rows) - len(pending), "imported": 0, "failed": 0, "errors": []
+        }})
+
+        imported = failed = 0
+        chunk_size = settings.INGEST_CHUNK_SIZE
+        for start in range(0, len(pending), chunk_size):
+            chunk_imported, chunk_errors = await _process_chunk(
+                batch_id, pending[start:start + chunk_size], source, uploaded_by, folder, threads
+            )
+            imported += chunk_imported
+            failed += len(chunk_errors)
+            update = {"$inc": {"imported": chunk_imported}, "$set": {"failed": failed, "heartbeat_at": datetime.utcnow()}}
+            if chunk_errors:
+                update["$push"] = {"errors": {"$each": chunk_errors, "$slice": -MAX_REPORTED_ERRORS}}
+            await batches.update_one({"_id": batch_id}, update)
+            await response_cache.invalidate("documents")
+            logger.info(f"Ingest {batch_id}: {min(start + chunk_size, len(pending))} of {len(pending)} pending rows processed")
+
+        status = "completed" if not failed else "completed_with_errors"
+        batch = await batches.find_one_and_update(
+            {"_id": batch_id},
+            {"$set": {"status": status, "finished_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        await send_ingest_summary_notification(batch, imported)
+        return batch
+    except Exception as e:
+        logger.error(f"Ingest batch {batch_id} failed: {e}", exc_info=True)
+        await batches.update_one({"_id": batch_id}, {"$set": {
+            "status": "failed", "error": str(e), "finished_at": datetime.utcnow()
+        }})
+        raise
+    finally:
+        source.close()
+
+
+_running = set()
+
+
+def start_ingestion(batch_id: str, rows: List[dict], source, uploaded_by: str):
+    """Run an ingestion batch in the background of the API process."""
+    task = asyncio.create_task(run_ingestion(batch_id, rows, source, uploaded_by))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return task
+
+
+async def get_ingest_batch(batch_id: str):
+    return await ingest_batches_collection.find_one({"_id": batch_id})
+
+
+async def fail_interrupted_batches():
+    """Mark batches orphaned by a restart; they resume when re-submitted with the same batch id."""
+    await ingest_batches_collection.update_many(
+        {"status": {"$in": ["queued", "running"]}, "heartbeat_at": {"$lt": _stale_cutoff()}},
+        {"$set": {"status": "interrupted", "finished_at": datetime.utcnow()}}
+    )
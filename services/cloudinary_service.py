@@ -1,7 +1,11 @@
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
 from config import settings
+from services.metrics import timed_call
+from urllib.parse import urlparse
 import os
+import re
 import mimetypes
 
 cloudinary.config(
@@ -10,8 +14,43 @@ cloudinary.config(
     api_secret=os.getenv("API_SECRET")
 )
 
+def get_resource_type(filename):
+    # Detect file type using filename
+    mime_type, _ = mimetypes.guess_type(filename)
+
+    # Set resource type dynamically
+    if mime_type:
+        if mime_type.startswith("image"):
+            return "image"
+        elif mime_type.startswith("video"):
+            return "video"
+        return "raw"  # Default for PDFs, ZIPs, etc.
+    return "raw"  # Fallback for unknown types
+
+
+def parse_cloudinary_url(url):
+    """Recover (public_id, resource_type) from a Cloudinary delivery URL.
+
+    For records stored before uploads kept their public_id. Image and video
+    public_ids exclude the file extension; raw ones include it.
+    """
+    parts = urlparse(url).path.strip("/").split("/")
+    if "upload" not in parts:
+        return None, None
+    upload_at = parts.index("upload")
+    resource_type = parts[upload_at - 1] if upload_at > 0 else "raw"
+    rest = parts[upload_at + 1:]
+    if rest and re.fullmatch(r"v\d+", rest[0]):
+        rest = rest[1:]
+    public_id = "/".join(rest)
+    if resource_type != "raw":
+        public_id = os.path.splitext(public_id)[0]
+    return (public_id or None), resource_type
+
+
 class CloudinaryUploader:
     @staticmethod
+    @timed_call("cloudinary", "upload")
     def upload(file, folder="ministry_works"):
         try:
             # Extract filename from the SpooledTemporaryFile
@@ -20,19 +59,7 @@ class CloudinaryUploader:
             # Read file content as bytes
             file_bytes = file.read()
 
-            # Detect file type using filename
-            mime_type, _ = mimetypes.guess_type(filename)
-
-            # Set resource type dynamically
-            if mime_type:
-                if mime_type.startswith("image"):
-                    resource_type = "image"
-                elif mime_type.startswith("video"):
-                    resource_type = "video"
-                else:
-                    resource_type = "raw"  # Default for PDFs, ZIPs, etc.
-            else:
-                resource_type = "raw"  # Fallback for unknown types
+            resource_type = get_resource_type(filename)
 
             # Upload to Cloudinary using raw bytes
             result = cloudinary.uploader.upload(
@@ -46,10 +73,53 @@ class CloudinaryUploader:
             raise Exception(f"Failed to upload file to Cloudinary: {str(e)}")
 
     @staticmethod
+    @timed_call("cloudinary", "upload_large")
+    def upload_large(file, filename, folder="ministry_works"):
+        """Stream a file object to Cloudinary in chunks and return the full upload result."""
+        try:
+            file.seek(0)
+            return cloudinary.uploader.upload_large(
+                file,
+                folder=folder,
+                resource_type=get_resource_type(filename),
+                filename=filename,
+                chunk_size=settings.UPLOAD_CHUNK_SIZE
+            )
+        except Exception as e:
+            raise Exception(f"Failed to upload {filename} to Cloudinary: {str(e)}")
+
+    @staticmethod
+    @timed_call("cloudinary", "delete")
     def delete(public_id, resource_type="raw"):
         try:
             cloudinary.uploader.destroy(public_id, resource_type=resource_type)
         except Exception as e:
             raise Exception(f"Failed to delete file from Cloudinary: {str(e)}")
 
+    @staticmethod
+    @timed_call("cloudinary", "delete_many")
+    def delete_many(public_ids, resource_type="raw"):
+        """Delete up to 100 assets of one resource type in a single Admin API call.
+
+        Returns {public_id: "deleted" | "not_found" | ...} as reported by Cloudinary.
+        """
+        result = cloudinary.api.delete_resources(public_ids, resource_type=resource_type, type="upload")
+        return result.get("deleted", {})
+
+    @staticmethod
+    @timed_call("cloudinary", "resource")
+    def resource(public_id, resource_type="raw"):
+        """Admin API details of one uploaded asset; raises cloudinary.api.NotFound if missing."""
+        return cloudinary.api.resource(public_id, resource_type=resource_type)
+
+    @staticmethod
+    @timed_call("cloudinary", "list_resources")
+    def list_resources(prefix, resource_type="raw", next_cursor=None):
+        """One page of uploaded assets under `prefix`; returns (resources, next_cursor)."""
+        options = {"type": "upload", "prefix": prefix, "resource_type": resource_type, "max_results": 500}
+        if next_cursor:
+            options["next_cursor"] = next_cursor
+        result = cloudinary.api.resources(**options)
+        return result.get("resources", []), result.get("next_cursor")
+
 cloudinary_uploader = CloudinaryUploader()
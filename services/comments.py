@@ -0,0 +1,92 @@
+import logging
+from typing import Dict, List
+from bson import ObjectId
+from database import comments_collection, documents_collection
+from models.document import Comment
+from services.search import text_search_filter
+
+logger = logging.getLogger(__name__)
+
+MAX_COMMENT_SEARCH_DOCUMENTS = 500  # documents pulled into a search through comment matches
+MAX_COMMENT_SEARCH_MATCHES = 2000  # comments read per search, best scores first
+
+
+def comment_from_db(doc: dict) -> Comment:
+    return Comment(**{**doc, "id": str(doc["_id"])})
+
+
+async def attach_replies(comments: List[Comment]) -> List[Comment]:
+    """Load the full reply threads of top-level `comments` in a single query."""
+    if not comments:
+        return comments
+    by_id = {comment.id: comment for comment in comments}
+
+    replies = comments_collection.find({"thread_id": {"$in": list(by_id)}}).sort([("timestamp", 1), ("_id", 1)])
+    async for doc in replies:
+        reply = comment_from_db(doc)
+        by_id[reply.id] = reply
+        parent = by_id.get(reply.parent_comment_id)
+        if parent is not None:
+            parent.replies.append(reply)
+    return comments
+
+
+async def find_comment_matches(search: str) -> Dict[str, List[str]]:
+    """Map document ids to the contents of their comments matching `search`.
+
+    Stops at the first comment of a document beyond MAX_COMMENT_SEARCH_DOCUMENTS;
+    lower-scoring matches of documents already collected are not needed.
+    """
+    matches = {}
+    cursor = comments_collection.find(
+        text_search_filter(search), {"document_id": 1, "content": 1, "score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"})]).limit(MAX_COMMENT_SEARCH_MATCHES)
+    async for doc in cursor:
+        if doc["document_id"] not in matches and len(matches) >= MAX_COMMENT_SEARCH_DOCUMENTS:
+            break
+        matches.setdefault(doc["document_id"], []).append(doc["content"])
+    return matches
+
+
+def _flatten_embedded(document_id, embedded, parent_id=None, thread_id=None):
+    """Turn a legacy nested comments array into comment-collection records."""
+    records = []
+    for comment in embedded or []:
+        comment_id = ObjectId()
+        records.append({
+            "_id": comment_id,
+            "document_id": document_id,
+            "user_id": comment.get("user_id"),
+            "content": comment.get("content", ""),
+            "parent_comment_id": parent_id,
+            "thread_id": thread_id,
+            "timestamp": comment.get("timestamp"),
+        })
+        records.extend(_flatten_embedded(
+            document_id, comment.get("replies"), str(comment_id), thread_id or str(comment_id)
+        ))
+    return records
+
+
+async def migrate_embedded_comments():
+    """Move comments embedded on documents into the comments collection.
+
+    A document is only unset after its comments were inserted; if the process
+    dies in between, that single document's comments may be copied twice.
+    """
+    cursor = documents_collection.find({"comments.0": {"$exists": True}}, {"comments": 1})
+    async for doc in cursor:
+        document_id = str(doc["_id"])
+        records = _flatten_embedded(document_id, doc["comments"])
+        if records:
+            await comments_collection.insert_many(records, ordered=False)
+        await documents_collection.update_one(
+            {"_id": doc["_id"]},
+            {"$unset": {"comments": ""}, "$set": {"comment_count": len(records)}}
+        )
+        logger.info(f"Moved {len(records)} comments off document {document_id}")
+
+    # Documents that never had comments still need a counter
+    await documents_collection.update_many(
+        {"comment_count": {"$exists": False}}, {"$set": {"comment_count": 0}}
+    )
@@ -0,0 +1,144 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+import cloudinary.api
+import cloudinary.utils
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from config import settings
+from database import documents_collection, pending_uploads_collection
+from services.asset_gc import enqueue_asset_deletions
+from services.cloudinary_service import cloudinary_uploader, get_resource_type
+from services.response_cache import response_cache
+from services.upload_pipeline import run_in_upload_pool
+
+# Direct uploads: the API signs a Cloudinary upload for one public_id, the
+# client sends the bytes straight to Cloudinary, and the file is attached to
+# its document once the upload is confirmed, either by the client calling
+# the confirm endpoint or by Cloudinary's notification webhook. Whichever
+# arrives first attaches the file; the other is a no-op.
+
+
+async def create_upload_signature(document_id: str, filename: str, user_id: str) -> dict:
+    """Sign an upload of `filename` for the document, scoped to a fresh public_id."""
+    if not ObjectId.is_valid(document_id) or not await documents_collection.find_one(
+            {"_id": ObjectId(document_id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    resource_type = get_resource_type(filename)
+    public_id = f"{settings.UPLOAD_FOLDER}/{document_id}/{uuid.uuid4().hex}"
+    if resource_type == "raw":
+        # Raw assets keep their extension only if it is part of the public_id
+        public_id += os.path.splitext(filename)[1]
+
+    params = {"public_id": public_id, "timestamp": int(time.time())}
+    if settings.UPLOAD_NOTIFICATION_URL:
+        params["notification_url"] = settings.UPLOAD_NOTIFICATION_URL
+    signature = cloudinary.utils.api_sign_request(params, settings.API_SECRET)
+
+    expires_at = datetime.utcnow() + timedelta(seconds=settings.DIRECT_UPLOAD_TTL_SECONDS)
+    await pending_uploads_collection.insert_one({
+        "_id": public_id,
+        "document_id": document_id,
+        "name": filename,
+        "resource_type": resource_type,
+        "requested_by": user_id,
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+        "expires_at": expires_at,
+    })
+    return {
+        "upload_url": f"https://api.cloudinary.com/v1_1/{settings.CLOUD_NAME}/{resource_type}/upload",
+        "params": {**params, "api_key": settings.API_KEY, "signature": signature},
+        "public_id": public_id,
+        "resource_type": resource_type,
+        "expires_at": expires_at,
+    }
+
+
+async def attach_upload(public_id: str, url: str, size: Optional[int] = None,
+                        resource_type: Optional[str] = None) -> Optional[str]:
+    """Attach a finished upload to its document; returns the document id, or None if already attached.
+
+    If the document was deleted in the meantime the upload is marked orphaned,
+    queued for deletion, and None is returned as well.
+    """
+    pending = await pending_uploads_collection.find_one_and_update(
+        {"_id": public_id, "status": "pending"},
+        {"$set": {"status": "attached", "attached_at": datetime.utcnow(), "url": url, "bytes": size}},
+        return_document=ReturnDocument.AFTER
+    )
+    if pending is None:
+        return None
+
+    result = await documents_collection.update_one(
+        {"_id": ObjectId(pending["document_id"])},
+        {"$push": {"file_items": {
+            "url": url,
+            "name": pending["name"],
+            "public_id": public_id,
+            "resource_type": resource_type or pending["resource_type"],
+            "bytes": size,
+            "checksum": None,  # the bytes never pass through the API
+        }},
+         "$set": {"updated_at": datetime.utcnow()}}
+    )
+    if not result.matched_count:
+        await pending_uploads_collection.update_one({"_id": public_id}, {"$set": {"status": "orphaned"}})
+        await enqueue_asset_deletions(
+            [{"public_id": public_id, "resource_type": resource_type or pending["resource_type"], "url": url}],
+            reason="document_deleted"
+        )
+        return None
+    await response_cache.invalidate("documents")
+    return pending["document_id"]
+
+
+async def confirm_upload(public_id: str, user_id: str) -> str:
+    """Client-side confirmation: look the asset up on Cloudinary before attaching it."""
+    pending = await pending_uploads_collection.find_one({"_id": public_id})
+    if not pending or pending["requested_by"] != user_id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if pending["status"] == "attached":
+        return pending["document_id"]
+    if pending["status"] == "orphaned":
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    try:
+        resource = await run_in_upload_pool(cloudinary_uploader.resource, public_id, pending["resource_type"])
+    except cloudinary.api.NotFound:
+        raise HTTPException(status_code=409, detail="Upload has not reached Cloudinary yet")
+    document_id = await attach_upload(
+        public_id, resource["secure_url"], resource.get("bytes"), resource.get("resource_type")
+    )
+    if document_id is None:
+        # Attached by the webhook meanwhile, or its document is gone
+        current = await pending_uploads_collection.find_one({"_id": public_id}, {"status": 1})
+        if current and current["status"] == "orphaned":
+            raise HTTPException(status_code=404, detail="Document not found")
+    return pending["document_id"]
+
+
+def verify_notification(body: bytes, timestamp: str, signature: str) -> dict:
+    """Check a Cloudinary webhook's signature and freshness and return its payload."""
+    invalid = HTTPException(status_code=401, detail="Invalid notification signature")
+    try:
+        timestamp = int(timestamp)
+    except (TypeError, ValueError):
+        raise invalid
+    if not signature or not cloudinary.utils.verify_notification_signature(
+            body.decode(), timestamp, signature, valid_for=settings.DIRECT_UPLOAD_TTL_SECONDS):
+        raise invalid
+    return json.loads(body)
+
+
+def sign_local_notification(payload: dict) -> tuple:
+    """Build a webhook body and headers the way Cloudinary signs them, for local runs and tests."""
+    body = json.dumps(payload)
+    timestamp = str(int(time.time()))
+    signature = cloudinary.utils.compute_hex_hash(body + timestamp + settings.API_SECRET)
+    return body, {"X-Cld-Timestamp": timestamp, "X-Cld-Signature": signature}
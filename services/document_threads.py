@@ -0,0 +1,77 @@
+import logging
+from typing import Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from database import documents_collection
+from services.pagination import paginate_by_created_at
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+# Replies carry their ancestry, materialised when they are inserted:
+#   thread_root - id of the top-level document of the correspondence chain
+#   ancestors   - ids from thread_root down to the direct parent
+#   depth       - len(ancestors); top-level documents have depth 0
+# so a whole (sub)thread is one indexed query on `ancestors`.
+
+
+def thread_fields(parent: Optional[dict]) -> dict:
+    """Thread fields for a new document replying to `parent` (None for top-level documents)."""
+    if parent is None:
+        return {"thread_root": None, "ancestors": [], "depth": 0}
+    parent_id = str(parent["_id"])
+    ancestors = list(parent.get("ancestors") or []) + [parent_id]
+    return {"thread_root": ancestors[0], "ancestors": ancestors, "depth": len(ancestors)}
+
+
+async def thread_fields_for(parent_document_id: Optional[str]) -> dict:
+    if not parent_document_id:
+        return thread_fields(None)
+    parent = None
+    if ObjectId.is_valid(parent_document_id):
+        parent = await documents_collection.find_one({"_id": ObjectId(parent_document_id)}, {"ancestors": 1})
+    # A parent that can't be found still anchors the reply's thread
+    return thread_fields(parent or {"_id": parent_document_id})
+
+
+async def get_thread_page(document: dict, max_depth: Optional[int], limit: int, cursor: Optional[str] = None):
+    """Page through every reply below `document`, oldest first, down to `max_depth` levels."""
+    query = {"ancestors": str(document["_id"])}
+    if max_depth is not None:
+        query["depth"] = {"$lte": document.get("depth", 0) + max_depth}
+    return await paginate_by_created_at(documents_collection, query, limit, cursor=cursor, ascending=True)
+
+
+async def backfill_thread_paths():
+    """Materialise thread fields on documents created before they existed."""
+    parents = {}
+    async for doc in documents_collection.find({}, {"parent_document_id": 1}):
+        parents[str(doc["_id"])] = doc.get("parent_document_id")
+
+    def ancestry(document_id):
+        chain, seen = [], {document_id}
+        parent_id = parents.get(document_id)
+        while parent_id:
+            if parent_id in seen:
+                logger.warning(f"Reply cycle through document {parent_id}, cutting the thread there")
+                break
+            chain.append(parent_id)
+            seen.add(parent_id)
+            parent_id = parents.get(parent_id)
+        return list(reversed(chain))
+
+    updates = []
+    for document_id in parents:
+        ancestors = ancestry(document_id)
+        updates.append(UpdateOne({"_id": ObjectId(document_id)}, {"$set": {
+            "thread_root": ancestors[0] if ancestors else None,
+            "ancestors": ancestors,
+            "depth": len(ancestors),
+        }}))
+        if len(updates) >= BACKFILL_BATCH_SIZE:
+            await documents_collection.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await documents_collection.bulk_write(updates, ordered=False)
+    logger.info(f"Backfilled thread paths on {len(parents)} documents")
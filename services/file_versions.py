@@ -0,0 +1,85 @@
+import logging
+from datetime import datetime
+from bson import ObjectId
+from fastapi import HTTPException, UploadFile
+from database import documents_collection, file_versions_collection
+from services.assets import release_file_items
+from services.upload_pipeline import hash_file, run_in_upload_pool, store_file, file_item
+
+logger = logging.getLogger(__name__)
+
+# Each entry of a document's file_items is the current version of that file.
+# Replacing it moves the previous item into `file_versions`, one small record
+# per version keyed by (document_id, file_index, version), so documents stay
+# the same size however often a drawing is revised. History records hold
+# references on the content-addressed assets like file items do: identical
+# bytes are stored once, whichever version or document they belong to.
+
+ITEM_FIELDS = ("url", "name", "public_id", "resource_type", "bytes", "checksum")
+
+
+async def replace_file(document_id: str, file_index: int, file: UploadFile, user_id: str,
+                       folder: str = "ministry_works") -> bool:
+    """Make `file` the next version of a document's file; False if the contents are unchanged."""
+    document = await documents_collection.find_one(
+        {"_id": ObjectId(document_id)}, {"file_items": {"$slice": [file_index, 1]}}
+    )
+    if not document or not document.get("file_items"):
+        raise HTTPException(status_code=404, detail="File not found")
+    current = document["file_items"][0]
+
+    hashed = await run_in_upload_pool(hash_file, file.file)
+    if current.get("checksum") == hashed[0]:
+        return False
+
+    uploaded = await store_file(file.file, file.filename, folder, hashed=hashed)
+    version = current.get("version", 1)
+    now = datetime.utcnow()
+
+    # Archive first: the upsert is idempotent, so a request that loses the
+    # race below has only written the same record the winner needs
+    archived = await file_versions_collection.update_one(
+        {"document_id": document_id, "file_index": file_index, "version": version},
+        {"$setOnInsert": {
+            **{key: current.get(key) for key in ITEM_FIELDS},
+            "replaced_at": now,
+            "replaced_by": user_id,
+        }},
+        upsert=True
+    )
+    # Compare on the version, not the URL: content-addressed URLs come back
+    # when a file is reverted. Items stored before versioning count as 1.
+    current_version = f"file_items.{file_index}.version"
+    if version == 1:
+        version_filter = {"$or": [{current_version: 1}, {current_version: {"$exists": False}}]}
+    else:
+        version_filter = {current_version: version}
+    try:
+        result = await documents_collection.update_one(
+            {"_id": document["_id"], **version_filter},
+            {"$set": {
+                f"file_items.{file_index}": {**file_item(uploaded), "version": version + 1},
+                "updated_at": now,
+            }}
+        )
+    except Exception:
+        # Don't leave the current item recorded in its own history, where
+        # deleting the document would release its asset a second time
+        if archived.upserted_id is not None:
+            await file_versions_collection.delete_one({"_id": archived.upserted_id})
+        await release_file_items([uploaded], reason="rollback")
+        raise
+    if not result.modified_count:
+        await release_file_items([uploaded], reason="rollback")
+        raise HTTPException(status_code=409, detail="File was replaced by someone else, try again")
+    return True
+
+
+async def release_versions(document_id: str):
+    """Drop the history of a deleted document and the asset references it held."""
+    versions = await file_versions_collection.find(
+        {"document_id": document_id}, {key: 1 for key in ITEM_FIELDS}
+    ).to_list(length=None)
+    if versions:
+        await release_file_items(versions, reason="document_deleted")
+        await file_versions_collection.delete_many({"document_id": document_id})
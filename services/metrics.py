@@ -0,0 +1,257 @@
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pymongo import monitoring
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# In-process metrics in the Prometheus text format. Each worker process keeps
+# its own counters, so scrape every worker (or run a single one) to see
+# everything. Requests are traced through a context variable: Mongo commands
+# and Cloudinary/SMTP calls made while serving a request are attributed to it,
+# which is what the slow-request log breaks down.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()  # the Mongo listener and upload threads record too
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    def _render_sample(self, labels, value):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def _render_sample(self, labels, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+http_requests = _register(Counter(
+    "http_requests_total", "HTTP requests served.", ["method", "route", "status"]))
+http_duration = _register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ["method", "route"]))
+http_response_size = _register(Histogram(
+    "http_response_size_bytes", "HTTP response body size.", ["method", "route"], SIZE_BUCKETS))
+http_in_flight = _register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served."))
+mongo_duration = _register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency.", ["command", "collection"]))
+mongo_failures = _register(Counter(
+    "mongo_command_failures_total", "MongoDB commands that failed.", ["command", "collection"]))
+external_duration = _register(Histogram(
+    "external_call_duration_seconds", "Cloudinary and SMTP call latency.", ["service", "operation"]))
+external_failures = _register(Counter(
+    "external_call_failures_total", "Cloudinary and SMTP calls that raised.", ["service", "operation"]))
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestTrace:
+    """The Mongo and external calls made while serving one request."""
+
+    def __init__(self):
+        self.calls = []  # (kind, name, seconds)
+
+    def record(self, kind: str, name: str, seconds: float):
+        self.calls.append((kind, name, seconds))
+
+    def summary(self, slowest: int = 5) -> dict:
+        totals = {}
+        for kind, _, seconds in self.calls:
+            count, total = totals.get(kind, (0, 0.0))
+            totals[kind] = (count + 1, total + seconds)
+        top = sorted(self.calls, key=lambda call: call[2], reverse=True)[:slowest]
+        return {
+            "totals": {kind: {"calls": count, "seconds": round(total, 4)} for kind, (count, total) in totals.items()},
+            "slowest": [{"kind": kind, "name": name, "seconds": round(seconds, 4)} for kind, name, seconds in top],
+        }
+
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+def _trace(kind: str, name: str, seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(kind, name, seconds)
+
+
+@contextmanager
+def timed(service: str, operation: str):
+    """Time a blocking call to an external service."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        external_failures.inc(service, operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        external_duration.observe(elapsed, service, operation)
+        _trace(service, operation, elapsed)
+
+
+def timed_call(service: str, operation: str):
+    """Decorator form of `timed`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(service, operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds command latencies into the metrics and the current request's trace.
+
+    Motor runs pymongo on executor threads with a copy of the caller's
+    context, so the request trace is visible here.
+    """
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""  # admin and cursor commands don't name one
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finished(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1_000_000
+        mongo_duration.observe(seconds, event.command_name, collection)
+        _trace("mongo", f"{event.command_name} {collection}".strip(), seconds)
+        return collection
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        collection = self._finished(event)
+        mongo_failures.inc(event.command_name, collection)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status, response size and in-flight requests per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        response = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            _current_trace.reset(token)
+            # The route template, not the raw path, keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method, route, str(response["status"]))
+            http_duration.observe(elapsed, method, route)
+            http_response_size.observe(response["bytes"], method, route)
+            if settings.SLOW_REQUEST_SECONDS is not None and elapsed >= settings.SLOW_REQUEST_SECONDS:
+                logger.warning(
+                    f"Slow request {method} {scope['path']} ({route}) took {elapsed:.3f}s "
+                    f"status={response['status']} breakdown={trace.summary()}"
+                )
@@ -0,0 +1,480 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from config import settings
+from database import db, migrations_collection
+from services.comments import migrate_embedded_comments
+from services.document_threads import backfill_thread_paths
+from services.project_records import repair_project_records
+from services.assets import backfill_assets
+from services.subscriptions import backfill_subscriptions
+from services.workflow import start_pending_workflows
+import logging
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = uuid.uuid4().hex
+INDEX_NOT_FOUND = 27
+MIGRATION_HEARTBEAT_SECONDS = 10
+MIGRATION_LEASE_SECONDS = 60  # a claim not refreshed for this long belongs to a dead worker
+MIGRATION_POLL_SECONDS = 2
+MIGRATION_WAIT_SECONDS = 1800  # give up starting if another worker's migration takes longer
+
+
+# Ordered list of schema migrations. Each entry declares the indexes it
+# introduces per collection, optionally the (names of) earlier indexes it
+# drops, and optionally an async `apply` step for data changes. Versions are recorded in `_migrations` once applied, so a version
+# number must never be reused or reordered.
+MIGRATIONS = [
+    {
+        "version": 1,
+        "description": "Initial single-field indexes",
+        "indexes": {
+            "users": [
+                IndexModel([("email", ASCENDING)], unique=True),
+            ],
+            # Replies reuse their parent's reference_number, so this cannot be unique
+            "documents": [
+                IndexModel([("reference_number", ASCENDING)]),
+                IndexModel([("project_id", ASCENDING)]),
+                IndexModel([("title", ASCENDING)]),
+                IndexModel([("created_at", ASCENDING)]),
+            ],
+            "projects": [
+                IndexModel([("project_name", ASCENDING)]),
+                IndexModel([("created_by", ASCENDING)]),
+            ],
+            "approvals": [
+                IndexModel([("document_id", ASCENDING)]),
+                IndexModel([("approved_by", ASCENDING)]),
+            ],
+            "signatures": [
+                IndexModel([("document_id", ASCENDING)]),
+                IndexModel([("user_id", ASCENDING)]),
+            ],
+            "notifications": [
+                IndexModel([("user_id", ASCENDING)]),
+                IndexModel([("is_read", ASCENDING)]),
+            ],
+            "logs": [
+                IndexModel([("user_id", ASCENDING)]),
+                IndexModel([("document_id", ASCENDING)]),
+                IndexModel([("timestamp", ASCENDING)]),
+            ],
+        },
+    },
+    {
+        "version": 2,
+        "description": "Compound indexes for document and project list queries",
+        "indexes": {
+            "documents": [
+                IndexModel([("project_id", ASCENDING), ("created_at", DESCENDING)]),
+                IndexModel([("parent_document_id", ASCENDING)]),
+            ],
+            "projects": [
+                IndexModel([("project_tags", ASCENDING), ("created_at", DESCENDING)]),
+                IndexModel([("created_at", DESCENDING)]),
+            ],
+        },
+    },
+    {
+        "version": 3,
+        "description": "Notification outbox indexes",
+        "indexes": {
+            "notification_outbox": [
+                IndexModel([("dedup_key", ASCENDING)], unique=True),
+                IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+            ],
+            "notifications": [
+                IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+            ],
+        },
+    },
+    {
+        "version": 4,
+        "description": "Text indexes for document and project search",
+        "indexes": {
+            "documents": [
+                IndexModel(
+                    [("title", TEXT), ("reference_number", TEXT), ("description", TEXT), ("comments.content", TEXT)],
+                    name="documents_text",
+                    weights={"title": 10, "reference_number": 8, "description": 4, "comments.content": 1},
+                    default_language="english"
+                ),
+            ],
+            "projects": [
+                IndexModel(
+                    [("project_name", TEXT), ("contractor", TEXT)],
+                    name="projects_text",
+                    weights={"project_name": 5, "contractor": 1}
+                ),
+            ],
+        },
+    },
+    {
+        "version": 5,
+        "description": "Export job lookup indexes",
+        "indexes": {
+            "export_jobs": [
+                IndexModel([("kind", ASCENDING), ("content_hash", ASCENDING), ("status", ASCENDING)]),
+                IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+            ],
+        },
+    },
+    {
+        "version": 6,
+        "description": "Move embedded document comments into the comments collection",
+        "indexes": {
+            "comments": [
+                IndexModel([("document_id", ASCENDING), ("parent_comment_id", ASCENDING), ("timestamp", ASCENDING)]),
+                IndexModel([("thread_id", ASCENDING), ("timestamp", ASCENDING)]),
+                IndexModel([("content", TEXT)], name="comments_text"),
+            ],
+        },
+        "apply": migrate_embedded_comments,
+    },
+    {
+        "version": 7,
+        "description": "Token revocation list",
+        "indexes": {
+            "revoked_tokens": [
+                IndexModel([("revoked_at", ASCENDING)]),
+                # Entries are useless once the tokens they cover have expired
+                IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+            ],
+        },
+    },
+    {
+        "version": 8,
+        "description": "Bulk ingestion batches and checkpoints",
+        "indexes": {
+            # Guards against importing a manifest row twice when a batch is resumed
+            "documents": [
+                IndexModel(
+                    [("ingest_key", ASCENDING)],
+                    unique=True,
+                    partialFilterExpression={"ingest_key": {"$exists": True}}
+                ),
+            ],
+            "ingest_checkpoints": [
+                IndexModel([("batch_id", ASCENDING)]),
+            ],
+            "ingest_batches": [
+                IndexModel([("status", ASCENDING), ("heartbeat_at", ASCENDING)]),
+            ],
+        },
+    },
+    {
+        "version": 9,
+        "description": "Materialised reply-thread paths on documents",
+        "indexes": {
+            "documents": [
+                IndexModel([("ancestors", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+            ],
+        },
+        "apply": backfill_thread_paths,
+    },
+    {
+        "version": 10,
+        "description": "Repair legacy NaN and mixed-type project records",
+        "apply": repair_project_records,
+    },
+    {
+        "version": 11,
+        "description": "Pending direct uploads",
+        "indexes": {
+            "pending_uploads": [
+                IndexModel([("document_id", ASCENDING)]),
+                # Kept a day past expiry so late confirmations still find their record
+                IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=86400),
+            ],
+        },
+    },
+    {
+        "version": 12,
+        "description": "Asset deletion queue",
+        "indexes": {
+            "asset_deletions": [
+                IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+                IndexModel([("claim_id", ASCENDING)], sparse=True),
+            ],
+        },
+    },
+    {
+        "version": 13,
+        "description": "Content-addressed assets with reference counts",
+        "apply": backfill_assets,
+    },
+    {
+        "version": 14,
+        "description": "Notification subscriptions and digests",
+        "indexes": {
+            "subscriptions": [
+                IndexModel([("target_type", ASCENDING), ("target_id", ASCENDING), ("user_id", ASCENDING)], unique=True),
+                IndexModel([("user_id", ASCENDING)]),
+            ],
+            "notification_digests": [
+                IndexModel([("event_id", ASCENDING), ("user_id", ASCENDING)], unique=True),
+                IndexModel([("status", ASCENDING), ("due_at", ASCENDING)]),
+                IndexModel([("user_id", ASCENDING), ("status", ASCENDING)]),
+                IndexModel([("claim_id", ASCENDING)], sparse=True),
+                IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=30 * 86400, sparse=True),
+            ],
+        },
+        "apply": backfill_subscriptions,
+    },
+    {
+        "version": 15,
+        "description": "Audit log queries by user or document over a time range",
+        "indexes": {
+            "logs": [
+                IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+                IndexModel([("document_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+                IndexModel([("project_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+            ],
+        },
+    },
+    {
+        "version": 16,
+        "description": "Approval workflow tasks and inbox",
+        "indexes": {
+            "approvals": [
+                IndexModel(
+                    [("document_id", ASCENDING), ("cycle", ASCENDING), ("step", ASCENDING)],
+                    unique=True, partialFilterExpression={"cycle": {"$exists": True}}
+                ),
+                IndexModel([("role", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+                IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            ],
+        },
+        "apply": start_pending_workflows,
+    },
+    {
+        "version": 17,
+        "description": "File version history",
+        "indexes": {
+            "file_versions": [
+                IndexModel([("document_id", ASCENDING), ("file_index", ASCENDING), ("version", ASCENDING)], unique=True),
+                IndexModel([("document_id", ASCENDING), ("file_index", ASCENDING),
+                            ("replaced_at", DESCENDING), ("_id", DESCENDING)]),
+            ],
+        },
+    },
+    {
+        "version": 18,
+        "description": "Keyset pagination indexes ending in _id for document and project lists",
+        # Prefixes of the new indexes, kept up on every write for nothing
+        "drop_indexes": {
+            "documents": ["created_at_1", "project_id_1", "project_id_1_created_at_-1"],
+            "projects": ["created_at_-1", "project_tags_1_created_at_-1"],
+        },
+        "indexes": {
+            "documents": [
+                IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+                IndexModel([("project_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            ],
+            "projects": [
+                IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+                IndexModel([("project_tags", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            ],
+        },
+    },
+    {
+        "version": 19,
+        "description": "Expire audit log entries after AUDIT_RETENTION_DAYS",
+        "drop_indexes": {
+            "logs": ["timestamp_1"],
+        },
+        "indexes": {
+            "logs": [
+                IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=settings.AUDIT_RETENTION_DAYS * 86400),
+            ],
+        },
+    },
+    {
+        "version": 20,
+        "description": "Rebuild the document text index without embedded comments",
+        # Comments moved to their own collection (version 6) and are searched there
+        "drop_indexes": {
+            "documents": ["documents_text"],
+        },
+        "indexes": {
+            "documents": [
+                IndexModel(
+                    [("title", TEXT), ("reference_number", TEXT), ("description", TEXT)],
+                    name="documents_text",
+                    weights={"title": 10, "reference_number": 8, "description": 4},
+                    default_language="english"
+                ),
+            ],
+        },
+    },
+]
+
+
+def declared_indexes():
+    """Merge the index declarations of every migration, keyed by collection, leaving out dropped ones."""
+    indexes = {}
+    for migration in sorted(MIGRATIONS, key=lambda m: m["version"]):
+        for collection_name, names in migration.get("drop_indexes", {}).items():
+            indexes[collection_name] = [
+                model for model in indexes.get(collection_name, []) if model.document["name"] not in names
+            ]
+        for collection_name, models in migration.get("indexes", {}).items():
+            indexes.setdefault(collection_name, []).extend(models)
+    return indexes
+
+
+def _index_signature(keys, options):
+    key = []
+    for field, direction in keys:
+        if direction == TEXT or field in ("_fts", "_ftsx"):
+            # The server reports all text fields of an index as _fts/_ftsx;
+            # declared text fields and the server's own entries map to one pair
+            if ("_fts", TEXT) not in key:
+                key.extend([("_fts", TEXT), ("_ftsx", 1)])
+        elif isinstance(direction, (int, float)):
+            # Servers may report numeric directions as floats (1.0)
+            key.append((field, int(direction)))
+        else:
+            key.append((field, direction))
+    ttl = options.get("expireAfterSeconds")
+    return tuple(key), bool(options.get("unique", False)), int(ttl) if ttl is not None else None
+
+
+async def _apply_migration(migration):
+    for collection_name, names in migration.get("drop_indexes", {}).items():
+        for name in names:
+            try:
+                await db[collection_name].drop_index(name)
+            except OperationFailure as e:
+                if e.code != INDEX_NOT_FOUND:
+                    raise
+    for collection_name, models in migration.get("indexes", {}).items():
+        # create_indexes is a no-op for indexes that already exist with the same spec
+        await db[collection_name].create_indexes(models)
+    if migration.get("apply"):
+        await migration["apply"]()
+
+
+async def _claim(migration) -> bool:
+    """Claim a version for this worker, taking over claims whose owner stopped heartbeating.
+
+    Returns False once the version is applied. While another live worker
+    holds it, waits (up to MIGRATION_WAIT_SECONDS) rather than moving on,
+    since later migrations may depend on it.
+    """
+    version = migration["version"]
+    deadline = time.monotonic() + MIGRATION_WAIT_SECONDS
+    while True:
+        now = datetime.utcnow()
+        try:
+            await migrations_collection.insert_one({
+                "_id": version,
+                "description": migration["description"],
+                "status": "running",
+                "owner": WORKER_ID,
+                "started_at": now,
+                "heartbeat_at": now,
+            })
+            return True
+        except DuplicateKeyError:
+            pass
+
+        stale = now - timedelta(seconds=MIGRATION_LEASE_SECONDS)
+        record = await migrations_collection.find_one_and_update(
+            {"_id": version, "status": "running", "heartbeat_at": {"$lt": stale}},
+            {"$set": {"owner": WORKER_ID, "heartbeat_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if record is not None:
+            logger.warning(f"Taking over migration {version}, its previous owner stopped responding")
+            return True
+
+        record = await migrations_collection.find_one({"_id": version}, {"status": 1})
+        if record and record["status"] == "applied":
+            return False
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Migration {version} is still being applied by another worker")
+        if record:
+            logger.info(f"Waiting for migration {version}, which another worker is applying")
+        await asyncio.sleep(MIGRATION_POLL_SECONDS)
+
+
+async def _heartbeat(version: int):
+    while True:
+        await asyncio.sleep(MIGRATION_HEARTBEAT_SECONDS)
+        await migrations_collection.update_one(
+            {"_id": version, "owner": WORKER_ID}, {"$set": {"heartbeat_at": datetime.utcnow()}}
+        )
+
+
+async def run_migrations():
+    """Apply pending migrations in version order and record them in `_migrations`.
+
+    Migration steps must be safe to re-run: a claim left behind by a worker
+    that died mid-migration is taken over and the migration applied again.
+    """
+    applied = {
+        record["_id"]
+        async for record in migrations_collection.find({"status": "applied"}, {"_id": 1})
+    }
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m["version"]):
+        version = migration["version"]
+        if version in applied:
+            continue
+
+        # Claim the version first so concurrent workers don't apply it twice
+        if not await _claim(migration):
+            continue
+
+        heartbeat = asyncio.create_task(_heartbeat(version))
+        try:
+            await _apply_migration(migration)
+        except Exception as e:
+            await migrations_collection.delete_one({"_id": version, "owner": WORKER_ID})
+            logger.error(f"Migration {version} ({migration['description']}) failed: {e}")
+            raise
+        finally:
+            heartbeat.cancel()
+
+        await migrations_collection.update_one(
+            {"_id": version},
+            {"$set": {"status": "applied", "applied_at": datetime.utcnow()}}
+        )
+        logger.info(f"Applied migration {version}: {migration['description']}")
+
+
+async def check_index_drift():
+    """Compare declared indexes with the ones present on the server.
+
+    Returns a dict keyed by collection name with `missing` and `unexpected`
+    index key lists; collections without drift are omitted.
+    """
+    drift = {}
+    for collection_name, models in declared_indexes().items():
+        declared = {
+            _index_signature(model.document["key"].items(), model.document): model.document["name"]
+            for model in models
+        }
+        info = await db[collection_name].index_information()
+        actual = {
+            _index_signature(spec["key"], spec): name
+            for name, spec in info.items()
+            if name != "_id_"
+        }
+
+        missing = [declared[sig] for sig in declared.keys() - actual.keys()]
+        unexpected = [actual[sig] for sig in actual.keys() - declared.keys()]
+        if missing or unexpected:
+            drift[collection_name] = {"missing": sorted(missing), "unexpected": sorted(unexpected)}
+
+    for collection_name, report in drift.items():
+        logger.warning(
+            f"Index drift on '{collection_name}': missing={report['missing']} unexpected={report['unexpected']}"
+        )
+    return drift
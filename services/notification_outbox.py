@@ -0,0 +1,417 @@
+import asyncio
+import logging
+import smtplib
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+from config import settings
+from database import outbox_collection, users_collection, notifications_collection, notification_digests_collection
+from models.notification import Notification
+from services.metrics import timed_call
+from services.subscriptions import next_digest_at, resolve_subscribers
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 20  # outbox events sent over one SMTP session
+PROGRESS_EVERY = 50  # sends between recording delivery and renewing the batch's claims
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30  # backoff is RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+POLL_INTERVAL_SECONDS = 2
+STALE_CLAIM_MINUTES = 10  # events left "sending" by a crashed worker are retried after this
+DUPLICATE_KEY_ERROR = 11000
+DIGEST_MAX_ITEMS = 50  # events listed in one digest email; the rest go in the next one
+# Immediate emails claimed per round: half of what the rate limit sends within a claim's lease
+MAX_BATCH_EMAILS = max(1, settings.EMAIL_RATE_PER_MINUTE * STALE_CLAIM_MINUTES // 2)
+
+
+def build_message(sender_email, to_email, subject, message):
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(message, 'plain'))
+    return msg.as_string()
+
+
+class SMTPBackend:
+    """Sends mail over one authenticated SMTP_SSL session for a whole batch."""
+
+    def __init__(self):
+        self.server = None
+
+    @timed_call("smtp", "connect")
+    def open(self):
+        self.server = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT)
+        self.server.login(settings.GMAIL_USER, settings.GMAIL_PASS)
+
+    @timed_call("smtp", "send")
+    def send(self, to_email, subject, message):
+        self.server.sendmail(settings.GMAIL_USER, to_email, build_message(settings.GMAIL_USER, to_email, subject, message))
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except smtplib.SMTPException:
+            pass
+        self.server = None
+
+
+class LocalSMTPBackend:
+    """In-process stand-in for tests and local development; records messages instead of sending them."""
+
+    sent = []
+
+    def open(self):
+        pass
+
+    def send(self, to_email, subject, message):
+        LocalSMTPBackend.sent.append({"to": to_email, "subject": subject, "message": message})
+
+    def close(self):
+        pass
+
+
+def get_email_backend():
+    if settings.EMAIL_BACKEND == "local":
+        return LocalSMTPBackend()
+    return SMTPBackend()
+
+
+class RateLimiter:
+    """Spaces out sends so we stay under the provider's per-minute quota.
+
+    The limit is per process: with several workers, EMAIL_RATE_PER_MINUTE
+    has to be the provider's quota divided by the number of workers.
+    """
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self.next_at = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+_rate_limiter = RateLimiter(settings.EMAIL_RATE_PER_MINUTE)
+
+
+async def enqueue_notification(subject: str, message: str, dedup_key: str, document_id: str = None,
+                               targets: list = None, actor_id: str = None):
+    """Record a notification event; delivery happens in the background dispatcher.
+
+    The event reaches the subscribers of `targets` (see services.subscriptions)
+    other than the actor. Events with a dedup_key that was already queued are
+    ignored.
+    """
+    now = datetime.utcnow()
+    try:
+        await outbox_collection.insert_one({
+            "dedup_key": dedup_key,
+            "subject": subject,
+            "message": message,
+            "document_id": document_id,
+            "targets": targets or [],
+            "actor_id": actor_id,
+            "status": "pending",
+            "attempts": 0,
+            "delivered_to": [],
+            "in_app_created": False,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+    except DuplicateKeyError:
+        logger.info(f"Notification {dedup_key} already queued, skipping")
+
+
+async def resolve_recipients(event):
+    """Return the users an outbox event should reach, with their delivery mode."""
+    if "targets" not in event:
+        # Queued before subscriptions existed; these went to everyone
+        users = await users_collection.find({"is_active": {"$ne": False}}, {"email": 1}).to_list(length=None)
+        return [{**user, "delivery": "immediate"} for user in users]
+    return await resolve_subscribers(event["targets"], exclude_user_id=event.get("actor_id"))
+
+
+async def _claim_event():
+    now = datetime.utcnow()
+    return await outbox_collection.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "claimed_at": {"$lte": now - timedelta(minutes=STALE_CLAIM_MINUTES)}},
+        ]},
+        {"$set": {"status": "sending", "claimed_at": now}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _send_emails(backend, emails, subject, message):
+    """Send one message to each address in turn; returns (delivered, error) and stops at a session error."""
+    delivered = []
+    for email in emails:
+        _rate_limiter.wait()
+        try:
+            backend.send(email, subject, message)
+            delivered.append(email)
+        except smtplib.SMTPRecipientsRefused as e:
+            # Retrying won't help a rejected address
+            logger.error(f"Recipient {email} refused: {e}")
+            delivered.append(email)
+        except Exception as e:
+            return delivered, e
+    return delivered, None
+
+
+async def _send_batch(jobs, on_progress):
+    """Send every job over a single backend session.
+
+    `jobs` is a list of (key, emails, subject, message). `on_progress(key,
+    delivered)` is awaited after every PROGRESS_EVERY sends, so callers can
+    record what went out and renew their claims while a long batch sends.
+    Returns a dict of key -> (delivered emails, error or None).
+    """
+    backend = get_email_backend()
+    try:
+        await run_in_threadpool(backend.open)
+    except Exception as e:
+        return {key: ([], e) for key, _, _, _ in jobs}
+
+    results = {}
+    batch_error = None
+    try:
+        for key, emails, subject, message in jobs:
+            if batch_error is not None:
+                # The session is unusable, leave the rest of the batch for a retry
+                results[key] = ([], batch_error)
+                continue
+            delivered = []
+            for start in range(0, len(emails), PROGRESS_EVERY):
+                sent, batch_error = await run_in_threadpool(
+                    _send_emails, backend, emails[start:start + PROGRESS_EVERY], subject, message
+                )
+                delivered.extend(sent)
+                await on_progress(key, sent)
+                if batch_error is not None:
+                    break
+            results[key] = (delivered, batch_error)
+    finally:
+        await run_in_threadpool(backend.close)
+    return results
+
+
+async def _create_in_app_notifications(event, recipients):
+    if event.get("in_app_created") or not recipients:
+        return
+    await notifications_collection.insert_many([
+        Notification(user_id=str(user["_id"]), message=event["subject"], document_id=event.get("document_id")).dict()
+        for user in recipients
+    ])
+    await outbox_collection.update_one({"_id": event["_id"]}, {"$set": {"in_app_created": True}})
+
+
+async def _queue_digest_items(event, recipients):
+    """Hold the event for recipients who get hourly or daily digests instead of one email per event."""
+    if event.get("digests_queued"):
+        return
+    now = datetime.utcnow()
+    items = [{
+        "event_id": event["_id"],
+        "user_id": str(user["_id"]),
+        "email": user["email"],
+        "subject": event["subject"],
+        "document_id": event.get("document_id"),
+        "status": "pending",
+        "attempts": 0,
+        "due_at": next_digest_at(user["delivery"], now),
+        "created_at": now,
+    } for user in recipients if user.get("email")]
+    if items:
+        try:
+            await notification_digests_collection.insert_many(items, ordered=False)
+        except BulkWriteError as e:
+            # Items queued by an earlier attempt at this event are unique on (event_id, user_id)
+            if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                raise
+    await outbox_collection.update_one({"_id": event["_id"]}, {"$set": {"digests_queued": True}})
+
+
+async def dispatch_pending():
+    """Claim up to BATCH_SIZE due events, or MAX_BATCH_EMAILS emails, and deliver them.
+
+    Returns the number processed. Delivered addresses are saved as they go
+    out and the batch's claims renewed with them, so a retry after a crash
+    (or a slow batch) never mails anyone twice.
+    """
+    jobs = []
+    events = {}
+    email_count = 0
+    while len(jobs) < BATCH_SIZE and email_count < MAX_BATCH_EMAILS:
+        event = await _claim_event()
+        if not event:
+            break
+        recipients = await resolve_recipients(event)
+        await _create_in_app_notifications(event, recipients)
+        await _queue_digest_items(event, [user for user in recipients if user["delivery"] != "immediate"])
+
+        already_delivered = set(event.get("delivered_to", []))
+        emails = [
+            user["email"] for user in recipients
+            if user["delivery"] == "immediate" and user.get("email") and user["email"] not in already_delivered
+        ]
+        events[event["_id"]] = event
+        jobs.append((event["_id"], emails, event["subject"], event["message"]))
+        email_count += len(emails)
+
+    if not jobs:
+        return 0
+
+    async def record_progress(event_id, delivered):
+        await outbox_collection.update_one(
+            {"_id": event_id}, {"$addToSet": {"delivered_to": {"$each": delivered}}}
+        )
+        await outbox_collection.update_many(
+            {"_id": {"$in": list(events)}, "status": "sending"}, {"$set": {"claimed_at": datetime.utcnow()}}
+        )
+
+    results = await _send_batch(jobs, record_progress)
+
+    for event_id, (delivered, error) in results.items():
+        event = events[event_id]
+        update = {}
+        if error is None:
+            update["$set"] = {"status": "sent", "sent_at": datetime.utcnow()}
+        else:
+            attempts = event.get("attempts", 0) + 1
+            if attempts >= MAX_ATTEMPTS:
+                logger.error(f"Giving up on notification {event['dedup_key']} after {attempts} attempts: {error}")
+                update["$set"] = {"status": "failed", "attempts": attempts, "last_error": str(error)}
+            else:
+                delay = timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+                update["$set"] = {
+                    "status": "pending",
+                    "attempts": attempts,
+                    "last_error": str(error),
+                    "next_attempt_at": datetime.utcnow() + delay,
+                }
+        await outbox_collection.update_one({"_id": event_id}, update)
+
+    return len(jobs)
+
+
+async def _claim_digest():
+    """Claim the due digest items of one user."""
+    now = datetime.utcnow()
+    due = {"$or": [
+        {"status": "pending", "due_at": {"$lte": now}},
+        {"status": "sending", "claimed_at": {"$lte": now - timedelta(minutes=STALE_CLAIM_MINUTES)}},
+    ]}
+    first = await notification_digests_collection.find_one(due, {"user_id": 1}, sort=[("due_at", 1)])
+    if not first:
+        return []
+    candidates = await notification_digests_collection.find(
+        {**due, "user_id": first["user_id"]}, {"_id": 1}
+    ).sort("created_at", 1).limit(DIGEST_MAX_ITEMS).to_list(length=DIGEST_MAX_ITEMS)
+
+    claim_id = uuid.uuid4().hex
+    await notification_digests_collection.update_many(
+        {**due, "_id": {"$in": [item["_id"] for item in candidates]}},
+        {"$set": {"status": "sending", "claimed_at": now, "claim_id": claim_id}}
+    )
+    return await notification_digests_collection.find({"claim_id": claim_id}).sort("created_at", 1).to_list(
+        length=DIGEST_MAX_ITEMS)
+
+
+def build_digest(items):
+    subject = f"{len(items)} updates from the Document Management System"
+    lines = [f"- {item['subject']}" for item in items]
+    return subject, "Here is what happened since your last digest:\n\n" + "\n".join(lines)
+
+
+async def dispatch_digests():
+    """Send one digest email per user with due items, up to BATCH_SIZE users. Returns the number sent."""
+    jobs, claimed = [], {}
+    while len(jobs) < BATCH_SIZE:
+        items = await _claim_digest()
+        if not items:
+            break
+        key = items[0]["claim_id"]
+        claimed[key] = items
+        subject, message = build_digest(items)
+        jobs.append((key, [items[0]["email"]], subject, message))
+
+    if not jobs:
+        return 0
+
+    async def renew_claims(key, delivered):
+        await notification_digests_collection.update_many(
+            {"claim_id": {"$in": list(claimed)}}, {"$set": {"claimed_at": datetime.utcnow()}}
+        )
+
+    results = await _send_batch(jobs, renew_claims)
+
+    now = datetime.utcnow()
+    for key, (delivered, error) in results.items():
+        if error is None:
+            update = {"$set": {"status": "sent", "sent_at": now}, "$unset": {"claim_id": ""}}
+        else:
+            attempts = claimed[key][0].get("attempts", 0) + 1
+            if attempts >= MAX_ATTEMPTS:
+                logger.error(f"Giving up on digest for {claimed[key][0]['email']} after {attempts} attempts: {error}")
+                status = "failed"
+            else:
+                status = "pending"
+            update = {
+                "$set": {
+                    "status": status,
+                    "attempts": attempts,
+                    "last_error": str(error),
+                    "due_at": now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1)),
+                },
+                "$unset": {"claim_id": ""},
+            }
+        await notification_digests_collection.update_many({"claim_id": key}, update)
+    return len(jobs)
+
+
+_dispatcher_task = None
+
+
+async def _dispatch_loop():
+    while True:
+        try:
+            processed = await dispatch_pending()
+            processed += await dispatch_digests()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Notification dispatcher error: {e}", exc_info=True)
+            processed = 0
+        if not processed:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+def start_dispatcher():
+    global _dispatcher_task
+    _dispatcher_task = asyncio.create_task(_dispatch_loop())
+
+
+async def stop_dispatcher():
+    global _dispatcher_task
+    if _dispatcher_task is None:
+        return
+    _dispatcher_task.cancel()
+    try:
+        await _dispatcher_task
+    except asyncio.CancelledError:
+        pass
+    _dispatcher_task = None
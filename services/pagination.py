@@ -0,0 +1,71 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(doc: dict, sort_field: str = "created_at") -> str:
+    """Build an opaque cursor pointing just after `doc` in the page's sort order."""
+    value = doc.get(sort_field)
+    payload = {
+        "created_at": value.isoformat() if isinstance(value, datetime) else None,
+        "id": str(doc["_id"]),
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = datetime.fromisoformat(payload["created_at"]) if payload["created_at"] else None
+        return created_at, ObjectId(payload["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(value: Optional[datetime], last_id: ObjectId, sort_field: str = "created_at",
+                  ascending: bool = False) -> dict:
+    """Match records that sort strictly after (value, last_id).
+
+    Records without `sort_field` sort last when descending and first when
+    ascending, the same way Mongo orders nulls.
+    """
+    op = "$gt" if ascending else "$lt"
+    if value is None:
+        after_nulls = [{sort_field: {"$ne": None}}] if ascending else []
+        return {"$or": [{sort_field: None, "_id": {op: last_id}}, *after_nulls]}
+    clauses = [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}},
+    ]
+    if not ascending:
+        clauses.append({sort_field: None})
+    return {"$or": clauses}
+
+
+async def paginate_by_created_at(collection, query: dict, limit: int, cursor: Optional[str] = None,
+                                 projection: Optional[dict] = None, sort_field: str = "created_at",
+                                 ascending: bool = False):
+    """Fetch one keyset page of `collection`, newest first unless `ascending`.
+
+    `_id` breaks ties between records with the same `sort_field` value.
+    Returns the raw documents of the page and the cursor for the next page
+    (None on the last page).
+    """
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        query = {"$and": [query, keyset_filter(value, last_id, sort_field, ascending)]}
+
+    direction = 1 if ascending else -1
+    sort_order = [(sort_field, direction), ("_id", direction)]
+
+    # Fetch one extra record to know whether another page exists
+    docs = await collection.find(query, projection).sort(sort_order).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1], sort_field) if len(docs) > limit else None
+    return docs[:limit], next_cursor
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from config import settings
+from database import users_collection
+
+# Raising BCRYPT_ROUNDS marks existing hashes as needing an update; they are
+# transparently rehashed the next time their owner logs in.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a thread per core gives real parallelism
+_workers = settings.PASSWORD_WORKERS or os.cpu_count() or 1
+_executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="password-hash")
+_pending = 0
+
+
+async def _run_password_job(func, *args):
+    """Run bcrypt work on the password pool, shedding load once the queue is full."""
+    global _pending
+    if _pending >= settings.PASSWORD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _run_password_job(pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Return whether the password matches and, if the hash is outdated, its replacement."""
+    return await _run_password_job(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def verify_and_upgrade(user: dict, plain_password: str) -> bool:
+    """Verify a stored user's password, rehashing it if the cost parameters changed."""
+    valid, new_hash = await verify_password(plain_password, user["password_hash"])
+    if valid and new_hash:
+        # Only replace the hash we verified against, in case it changed meanwhile
+        await users_collection.update_one(
+            {"_id": ObjectId(str(user["_id"])), "password_hash": user["password_hash"]},
+            {"$set": {"password_hash": new_hash}}
+        )
+    return valid
+
+
+class LoginThrottle:
+    """Sliding-window limit on failed logins per account and per client IP."""
+
+    def __init__(self, max_per_account: int, max_per_ip: int, window_seconds: int, max_keys: int = 10000):
+        self.max_per_account = max_per_account
+        self.max_per_ip = max_per_ip
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._failures = {}
+
+    def _recent(self, key: str) -> deque:
+        attempts = self._failures.get(key)
+        if attempts is None:
+            return deque()
+        cutoff = time.monotonic() - self.window
+        while attempts and attempts[0] < cutoff:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+        return attempts
+
+    def _keys(self, email: str, client_ip: Optional[str]):
+        keys = [(f"account:{email.lower()}", self.max_per_account)]
+        if client_ip:
+            keys.append((f"ip:{client_ip}", self.max_per_ip))
+        return keys
+
+    def check(self, email: str, client_ip: Optional[str]):
+        """Raise 429 before any bcrypt work if the account or IP is locked out."""
+        for key, limit in self._keys(email, client_ip):
+            attempts = self._recent(key)
+            if len(attempts) >= limit:
+                retry_after = int(attempts[0] + self.window - time.monotonic()) + 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many failed login attempts, please try again later",
+                    headers={"Retry-After": str(retry_after)},
+                )
+
+    def record_failure(self, email: str, client_ip: Optional[str]):
+        now = time.monotonic()
+        for key, _ in self._keys(email, client_ip):
+            self._failures.setdefault(key, deque()).append(now)
+        if len(self._failures) > self.max_keys:
+            for key in list(self._failures):
+                self._recent(key)
+
+    def record_success(self, email: str):
+        self._failures.pop(f"account:{email.lower()}", None)
+
+
+login_throttle = LoginThrottle(
+    settings.LOGIN_MAX_FAILURES_PER_ACCOUNT,
+    settings.LOGIN_MAX_FAILURES_PER_IP,
+    settings.LOGIN_THROTTLE_WINDOW_SECONDS,
+)
@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import docx
+from bson import ObjectId
+from openpyxl import Workbook
+from config import settings
+from database import projects_collection, export_jobs_collection
+from services.cloudinary_service import cloudinary_uploader
+
+logger = logging.getLogger(__name__)
+
+# Bump when the row layout changes so cached exports are not reused
+EXPORT_FORMAT_VERSION = 1
+PROGRESS_UPDATE_EVERY = 50  # rows between progress writes
+
+FULL_COLUMNS = [
+    "S/N", "Project Name", "Contractor", "Resident Engineer", "Progress Report", "Project Tags",
+    "Award Date", "Contract Sum", "Duration", "Mobilisation Paid", "Interim Certificate Earned",
+    "Progress of Work", "Remark",
+]
+ONGOING_COLUMNS = ["S/N", "Project Name", "Contractor", "Resident Engineer", "Progress Report"]
+
+EXPORT_KINDS = {
+    "all": {
+        "query": {},
+        "columns": FULL_COLUMNS,
+        "heading": "PROJECT PROGRESS REPORT AS OF {date}",
+    },
+    "ongoing": {
+        "query": {"project_tags": "ongoing"},
+        "columns": ONGOING_COLUMNS,
+        "heading": "ONGOING PROJECTS PROGRESS REPORT AS OF {date}",
+    },
+}
+
+# Exports are CPU-heavy (python-docx) and use the blocking pymongo client
+# underneath Motor, so they run on their own small pool.
+_executor = ThreadPoolExecutor(max_workers=settings.EXPORT_WORKERS, thread_name_prefix="project-export")
+
+
+def format_date(dt):
+    day = dt.day
+    suffix = "th" if 11 <= day <= 13 else {1: "st", 2: "nd", 3: "rd"}.get(day % 10, "th")
+    month = dt.strftime("%B")  # Full month name
+    year = dt.year
+    return f"{day}{suffix} {month} {year}"
+
+
+def format_currency(value):
+    try:
+        return f"₦{float(value):,.2f}"
+    except (ValueError, TypeError):
+        return "N/A"
+
+
+def format_progress(progress_of_work):
+    if isinstance(progress_of_work, dict):
+        sections = [f"{key.replace('_', ' ').title()}: {value}" for key, value in progress_of_work.items() if value]
+        return "\n".join(sections) if sections else "No progress reported"
+    return str(progress_of_work)
+
+
+def project_row(idx, proj, columns):
+    """Build one export row, restricted to `columns`, for both the XLSX and DOCX outputs."""
+    row = {
+        "S/N": idx + 1,
+        "Project Name": proj.get("project_name", "N/A"),
+        "Contractor": proj.get("contractor", "N/A"),
+        "Resident Engineer": proj.get("resident_engineer", "N/A"),
+        "Progress Report": proj.get("progress_report", "N/A"),
+        "Project Tags": proj.get("project_tags", "N/A"),
+        "Award Date": proj.get("award_date", "N/A"),
+        "Contract Sum": format_currency(proj.get("contract_sum", "N/A")),
+        "Duration": proj.get("duration", "N/A"),
+        "Mobilisation Paid": format_currency(proj.get("mobilisation_paid", "N/A")),
+        "Interim Certificate Earned": format_currency(proj.get("interim_certificate_earned", "N/A")),
+        "Progress of Work": format_progress(proj.get("progress_of_work", "No progress reported")),
+        "Remark": proj.get("remark", "N/A"),
+    }
+    return [row[column] for column in columns]
+
+
+def _project_cursor(query):
+    # Motor's delegate is the underlying blocking pymongo collection
+    return projects_collection.delegate.find(query).sort([("created_at", -1), ("_id", -1)])
+
+
+def dataset_hash(kind, heading):
+    """Hash the rows an export would contain without building any files."""
+    spec = EXPORT_KINDS[kind]
+    digest = hashlib.sha256(f"{EXPORT_FORMAT_VERSION}|{kind}|{heading}".encode())
+    for idx, proj in enumerate(_project_cursor(spec["query"])):
+        digest.update(json.dumps(project_row(idx, proj, spec["columns"]), default=str).encode())
+    return digest.hexdigest()
+
+
+def _new_docx(heading, columns):
+    doc = docx.Document()
+    doc.add_heading(heading, level=1)
+
+    table = doc.add_table(rows=1, cols=len(columns))
+    table.style = "Table Grid"
+    for cell in table.rows[0].cells:
+        cell.width = docx.shared.Inches(1.5)
+        for paragraph in cell.paragraphs:
+            paragraph.paragraph_format.space_after = docx.shared.Pt(6)
+
+    hdr_cells = table.rows[0].cells
+    for i, column in enumerate(columns):
+        hdr_cells[i].text = column
+        hdr_cells[i].paragraphs[0].runs[0].bold = True
+    return doc, table
+
+
+def _add_docx_row(table, columns, values):
+    row_cells = table.add_row().cells
+    for i, (column, value) in enumerate(zip(columns, values)):
+        if column == "Progress of Work":
+            paragraph = row_cells[i].paragraphs[0]
+            lines = str(value).split("\n")
+            paragraph.text = lines[0]
+            for line in lines[1:]:
+                if line.strip():
+                    paragraph.add_run("\n" + line)
+        else:
+            row_cells[i].text = str(value)
+
+
+def build_export_files(job_id, kind, heading):
+    """Stream projects into a write-only workbook and a DOCX table, reporting progress."""
+    spec = EXPORT_KINDS[kind]
+    columns = spec["columns"]
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Projects")
+    sheet.append(columns)
+    doc, table = _new_docx(heading, columns)
+
+    processed = 0
+    for idx, proj in enumerate(_project_cursor(spec["query"])):
+        values = project_row(idx, proj, columns)
+        sheet.append(values)
+        _add_docx_row(table, columns, values)
+        processed += 1
+        if processed % PROGRESS_UPDATE_EVERY == 0:
+            export_jobs_collection.delegate.update_one({"_id": job_id}, {"$set": {"processed": processed}})
+
+    output_excel = io.BytesIO()
+    workbook.save(output_excel)
+    output_excel.seek(0)
+
+    output_word = io.BytesIO()
+    doc.save(output_word)
+    output_word.seek(0)
+    return output_excel, output_word, processed
+
+
+def run_export_job(job_id):
+    jobs = export_jobs_collection.delegate
+    job = jobs.find_one_and_update(
+        {"_id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "started_at": datetime.utcnow()}}
+    )
+    if not job:
+        return
+
+    try:
+        kind = job["kind"]
+        spec = EXPORT_KINDS[kind]
+        heading = spec["heading"].format(date=format_date(datetime.now()))
+        total = projects_collection.delegate.count_documents(spec["query"])
+        jobs.update_one({"_id": job_id}, {"$set": {"total": total}})
+
+        content_hash = dataset_hash(kind, heading)
+        cached = jobs.find_one(
+            {"kind": kind, "content_hash": content_hash, "status": "completed"},
+            sort=[("finished_at", -1)]
+        )
+        if cached:
+            result = {
+                "spreadsheet_url": cached["spreadsheet_url"],
+                "word_doc_url": cached["word_doc_url"],
+                "row_count": cached["row_count"],
+                "processed": cached["row_count"],
+                "cached": True,
+            }
+        else:
+            output_excel, output_word, row_count = build_export_files(job_id, kind, heading)
+            result = {
+                "spreadsheet_url": cloudinary_uploader.upload(output_excel, folder="project_exports"),
+                "word_doc_url": cloudinary_uploader.upload(output_word, folder="project_exports"),
+                "row_count": row_count,
+                "processed": row_count,
+                "cached": False,
+            }
+
+        jobs.update_one({"_id": job_id}, {"$set": {
+            **result,
+            "content_hash": content_hash,
+            "column_count": len(spec["columns"]),
+            "status": "completed",
+            "finished_at": datetime.utcnow(),
+        }})
+    except Exception as e:
+        logger.error(f"Export job {job_id} failed: {e}", exc_info=True)
+        jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "failed", "error": str(e), "finished_at": datetime.utcnow()
+        }})
+
+
+async def create_export_job(kind: str, requested_by: str) -> dict:
+    """Queue an export and hand it to the worker pool; returns the job record."""
+    job = {
+        "_id": ObjectId(),
+        "kind": kind,
+        "status": "queued",
+        "processed": 0,
+        "total": None,
+        "requested_by": requested_by,
+        "created_at": datetime.utcnow(),
+    }
+    await export_jobs_collection.insert_one(job)
+    asyncio.get_running_loop().run_in_executor(_executor, run_export_job, job["_id"])
+    return job
+
+
+async def get_export_job(job_id: ObjectId):
+    return await export_jobs_collection.find_one({"_id": job_id})
+
+
+async def fail_interrupted_jobs():
+    """Mark jobs orphaned by a restart as failed so pollers don't wait forever."""
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.EXPORT_JOB_TIMEOUT_MINUTES)
+    await export_jobs_collection.update_many(
+        {"status": {"$in": ["queued", "running"]}, "created_at": {"$lt": cutoff}},
+        {"$set": {"status": "failed", "error": "Export was interrupted", "finished_at": datetime.utcnow()}}
+    )
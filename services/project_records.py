@@ -0,0 +1,106 @@
+import logging
+import math
+import re
+from pymongo import UpdateOne
+from config import settings
+from database import projects_collection
+from models.project import Project
+
+logger = logging.getLogger(__name__)
+
+MONEY_FIELDS = ["contract_sum", "mobilisation_paid", "interim_certificate_earned"]
+REPAIR_BATCH_SIZE = 500
+
+# Only fetch the fields the Project model exposes
+PROJECT_PROJECTION = {field: 1 for field in Project.model_fields if field != "id"}
+EMPTY_PROJECT = {field: None for field in Project.model_fields}
+
+# Project records are normalised when written (and legacy ones repaired by a
+# migration), so reads can hand stored documents straight to the response:
+#   - money fields are finite floats or None, never NaN or strings
+#   - progress_of_work is a dict or None
+#   - project_tags is lower case
+
+
+def normalize_money(value):
+    """Coerce a stored or submitted amount to a finite float, or None if it isn't one."""
+    if isinstance(value, str):
+        cleaned = re.sub(r"[^0-9.\-]", "", value)  # legacy imports stored "₦1,234.50"
+        try:
+            value = float(cleaned)
+        except ValueError:
+            return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value) if math.isfinite(value) else None
+
+
+def normalize_progress(value):
+    if value is None or isinstance(value, dict):
+        return value
+    if isinstance(value, list):
+        return {"entries": value}
+    return {"note": str(value)}
+
+
+def strip_nan(data):
+    """Recursively replace NaN/inf floats with None."""
+    if isinstance(data, float) and not math.isfinite(data):
+        return None
+    if isinstance(data, dict):
+        return {key: strip_nan(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [strip_nan(value) for value in data]
+    return data
+
+
+def normalize_project_fields(fields: dict) -> dict:
+    """Normalise the project fields being written; fields not present are left alone."""
+    normalized = dict(fields)
+    for field in MONEY_FIELDS:
+        if field in normalized:
+            normalized[field] = normalize_money(normalized[field])
+    if "progress_of_work" in normalized:
+        normalized["progress_of_work"] = strip_nan(normalize_progress(normalized["progress_of_work"]))
+    if normalized.get("project_tags"):
+        normalized["project_tags"] = normalized["project_tags"].lower()
+    return normalized
+
+
+def project_out(doc: dict):
+    """Turn a stored project into its response representation.
+
+    In fast mode the stored, already-normalised document is returned as a
+    plain dict, skipping Pydantic validation entirely.
+    """
+    doc["id"] = str(doc.pop("_id"))
+    if settings.PROJECT_FAST_SERIALIZATION:
+        return {**EMPTY_PROJECT, **doc}
+    return Project(**doc)
+
+
+async def repair_project_records():
+    """Normalise legacy project records: NaN, string amounts, non-dict progress, mixed-case tags."""
+    updates, repaired = [], 0
+    async for doc in projects_collection.find({}):
+        fields = {key: value for key, value in doc.items() if key != "_id"}
+        fixed = normalize_project_fields(strip_nan(fields))
+        changes = {
+            key: value for key, value in fixed.items()
+            if key not in fields or _differs(fields[key], value)
+        }
+        if not changes:
+            continue
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+        repaired += 1
+        if len(updates) >= REPAIR_BATCH_SIZE:
+            await projects_collection.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await projects_collection.bulk_write(updates, ordered=False)
+    logger.info(f"Repaired {repaired} project records")
+
+
+def _differs(old, new):
+    # NaN != NaN, so compare through repr for floats; type changes (str -> float) always count
+    return type(old) is not type(new) or repr(old) != repr(new)
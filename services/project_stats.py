@@ -0,0 +1,118 @@
+import json
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from database import projects_collection, documents_collection
+from services.response_cache import response_cache
+from services.project_records import MONEY_FIELDS
+
+TOP_CONTRACTORS = 50
+RECENT_WINDOWS_DAYS = [7, 30]
+
+# The dashboard is assembled from sections that are cached separately under
+# the tags of the data they read, so a document upload only recomputes the
+# document counts and a project edit only the financial totals.
+
+
+def _money_sums():
+    # Strings and NaN left behind by old imports must not poison the totals
+    # (NaN sorts below every number, so it fails the > -inf check)
+    return {
+        field: {"$sum": {"$cond": [
+            {"$and": [{"$isNumber": f"${field}"}, {"$gt": [f"${field}", float("-inf")]}]}, f"${field}", 0
+        ]}}
+        for field in MONEY_FIELDS
+    }
+
+
+def _totals_row(row, key_name):
+    return {key_name: row["_id"], "projects": row["projects"], **{field: row[field] for field in MONEY_FIELDS}}
+
+
+async def compute_project_totals() -> dict:
+    pipeline = [{"$facet": {
+        "overall": [{"$group": {"_id": None, "projects": {"$sum": 1}, **_money_sums()}}],
+        "by_tag": [
+            {"$group": {"_id": "$project_tags", "projects": {"$sum": 1}, **_money_sums()}},
+            {"$sort": {"contract_sum": -1}},
+        ],
+        "by_contractor": [
+            {"$group": {"_id": "$contractor", "projects": {"$sum": 1}, **_money_sums()}},
+            {"$sort": {"contract_sum": -1}},
+            {"$limit": TOP_CONTRACTORS},
+        ],
+    }}]
+    result = (await projects_collection.aggregate(pipeline).to_list(length=1))[0]
+    overall = result["overall"][0] if result["overall"] else {"projects": 0, **{field: 0 for field in MONEY_FIELDS}}
+    return {
+        "totals": {"projects": overall["projects"], **{field: overall[field] for field in MONEY_FIELDS}},
+        "by_tag": [_totals_row(row, "project_tags") for row in result["by_tag"]],
+        "by_contractor": [_totals_row(row, "contractor") for row in result["by_contractor"]],
+    }
+
+
+async def compute_document_counts() -> dict:
+    now = datetime.utcnow()
+    recent = {
+        f"last_{days}_days": [{"$match": {"created_at": {"$gte": now - timedelta(days=days)}}}, {"$count": "n"}]
+        for days in RECENT_WINDOWS_DAYS
+    }
+    pipeline = [{"$facet": {
+        "by_status": [{"$group": {"_id": {"project_id": "$project_id", "value": "$status"}, "n": {"$sum": 1}}}],
+        "by_type": [{"$group": {"_id": {"project_id": "$project_id", "value": "$document_type"}, "n": {"$sum": 1}}}],
+        **recent,
+    }}]
+    result = (await documents_collection.aggregate(pipeline).to_list(length=1))[0]
+
+    per_project = {}
+    for facet in ("by_status", "by_type"):
+        for row in result[facet]:
+            project = per_project.setdefault(row["_id"].get("project_id"), {"documents": 0, "by_status": {}, "by_type": {}})
+            project[facet][str(row["_id"].get("value"))] = row["n"]
+            if facet == "by_status":
+                project["documents"] += row["n"]
+
+    names = await _project_names(per_project)
+    projects = [
+        {"project_id": project_id, "project_name": names.get(project_id), **counts}
+        for project_id, counts in sorted(per_project.items(), key=lambda item: -item[1]["documents"])
+    ]
+    return {
+        "documents_by_project": projects,
+        "recent_documents": {
+            window: result[window][0]["n"] if result[window] else 0 for window in recent
+        },
+    }
+
+
+async def compute_recent_projects() -> dict:
+    since = datetime.utcnow() - timedelta(days=max(RECENT_WINDOWS_DAYS))
+    return {"recent_projects": {
+        "created_last_30_days": await projects_collection.count_documents({"created_at": {"$gte": since}}),
+        "updated_last_30_days": await projects_collection.count_documents({"updated_at": {"$gte": since}}),
+    }}
+
+
+async def _project_names(project_ids):
+    ids = [ObjectId(project_id) for project_id in project_ids if project_id and ObjectId.is_valid(project_id)]
+    cursor = projects_collection.find({"_id": {"$in": ids}}, {"project_name": 1})
+    return {str(project["_id"]): project.get("project_name") async for project in cursor}
+
+
+async def _cached_section(key: str, tags, build) -> dict:
+    entry = await response_cache.get(key)
+    if entry is not None:
+        return json.loads(entry["body"])
+    tag_versions = await response_cache.tag_versions(tags)
+    section = jsonable_encoder(await build())
+    await response_cache.set(key, json.dumps(section), "", tag_versions)
+    return section
+
+
+async def load_project_stats() -> dict:
+    stats = {}
+    stats.update(await _cached_section("stats:project_totals", ["projects"], compute_project_totals))
+    stats.update(await _cached_section("stats:recent_projects", ["projects"], compute_recent_projects))
+    # Document counts name their projects, so a project rename refreshes them too
+    stats.update(await _cached_section("stats:documents", ["documents", "projects"], compute_document_counts))
+    return stats
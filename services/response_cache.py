@@ -0,0 +1,179 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from config import settings
+
+# Entries remember the version of every tag they were built under;
+# invalidating a tag bumps its version, which makes those entries stale
+# without having to track or delete individual keys.
+
+
+class LRUCacheBackend:
+    """In-process LRU backend. Invalidations only reach the current worker."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._tag_versions = {}
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def tag_versions(self, tags: List[str]) -> dict:
+        return {tag: self._tag_versions.get(tag, 0) for tag in tags}
+
+    async def bump_tags(self, tags: Iterable[str]):
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+
+class SharedCacheBackend:
+    """Backend over a Redis-style client (get/set with ex/mget/incr), shared by all workers."""
+
+    def __init__(self, client, prefix: str = "dms:cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str):
+        raw = await self.client.get(self.prefix + key)
+        return json.loads(raw) if raw else None
+
+    async def set(self, key: str, entry: dict):
+        ttl = max(1, int(entry["expires_at"] - time.monotonic()))
+        stored = {**entry, "expires_at": 0}  # expiry is enforced by the store itself
+        await self.client.set(self.prefix + key, json.dumps(stored), ex=ttl)
+
+    async def tag_versions(self, tags: List[str]) -> dict:
+        if not tags:
+            return {}
+        values = await self.client.mget([self.prefix + "tag:" + tag for tag in tags])
+        return {tag: int(value or 0) for tag, value in zip(tags, values)}
+
+    async def bump_tags(self, tags: Iterable[str]):
+        for tag in tags:
+            await self.client.incr(self.prefix + "tag:" + tag)
+
+
+class LocalSharedStore:
+    """In-process stand-in for the shared store's client API, for tests and local runs."""
+
+    def __init__(self):
+        self._data = {}
+
+    def _live(self, key):
+        value = self._data.get(key)
+        if value is None:
+            return None
+        if value[1] is not None and value[1] < time.monotonic():
+            del self._data[key]
+            return None
+        return value[0]
+
+    async def get(self, key):
+        return self._live(key)
+
+    async def set(self, key, value, ex=None):
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    async def mget(self, keys):
+        return [self._live(key) for key in keys]
+
+    async def incr(self, key):
+        value = int(self._live(key) or 0) + 1
+        self._data[key] = (str(value), None)
+        return value
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = await self.backend.get(key)
+        if entry is None:
+            return None
+        current = await self.backend.tag_versions(list(entry["tags"]))
+        if current != entry["tags"]:
+            return None
+        return entry
+
+    async def tag_versions(self, tags: List[str]) -> dict:
+        return await self.backend.tag_versions(tags)
+
+    async def set(self, key: str, body: str, etag: str, tag_versions: dict):
+        entry = {
+            "body": body,
+            "etag": etag,
+            "tags": tag_versions,
+            "expires_at": time.monotonic() + self.ttl,
+        }
+        await self.backend.set(key, entry)
+
+    async def invalidate(self, *tags: str):
+        await self.backend.bump_tags(tags)
+
+
+def create_backend():
+    if settings.CACHE_BACKEND == "shared":
+        if not settings.CACHE_URL:
+            return SharedCacheBackend(LocalSharedStore())
+        import redis.asyncio as redis  # optional dependency, only needed for a real shared store
+        return SharedCacheBackend(redis.from_url(settings.CACHE_URL, decode_responses=True))
+    return LRUCacheBackend(settings.CACHE_MAX_ENTRIES)
+
+
+response_cache = ResponseCache(create_backend(), settings.CACHE_TTL)
+
+
+def _cache_key(request: Request) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+async def cached_response(request: Request, tags: List[str], build) -> Response:
+    """Serve a JSON response from the cache, building it with `build()` on a miss.
+
+    Responses carry an ETag; requests whose If-None-Match matches it get an
+    empty 304 instead of the body.
+    """
+    key = _cache_key(request)
+    entry = await response_cache.get(key)
+    if entry is None:
+        # Read tag versions before building, so a write that lands mid-build leaves this entry stale
+        tag_versions = await response_cache.tag_versions(tags)
+        payload = await build()
+        body = json.dumps(jsonable_encoder(payload), separators=(",", ":"))
+        etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+        await response_cache.set(key, body, etag, tag_versions)
+    else:
+        body, etag = entry["body"], entry["etag"]
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
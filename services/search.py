@@ -0,0 +1,70 @@
+import html
+import re
+from datetime import datetime
+from typing import List, Optional
+
+SNIPPET_RADIUS = 60  # characters of context either side of the first match
+MAX_HIGHLIGHTS = 3
+
+
+def search_terms(text: str) -> List[str]:
+    """Split a search string into lowercase words, ignoring $text operators."""
+    return [term for term in re.findall(r"\w+", text.lower()) if len(term) > 1]
+
+
+def text_search_filter(q: str) -> dict:
+    # $search treats its argument as words, not a pattern, so user input is safe here
+    return {"$text": {"$search": q}}
+
+
+def date_range_filter(created_from: Optional[datetime], created_to: Optional[datetime]) -> Optional[dict]:
+    if not created_from and not created_to:
+        return None
+    date_filter = {}
+    if created_from:
+        date_filter["$gte"] = created_from
+    if created_to:
+        date_filter["$lte"] = created_to
+    return date_filter
+
+
+def highlight(text: Optional[str], terms: List[str]) -> Optional[str]:
+    """Return an HTML-escaped snippet of `text` around the first matching term,
+    with every match wrapped in <mark>, or None when nothing matches."""
+    if not text or not terms:
+        return None
+    # Text search stems words, so also match longer forms ("drawing" -> "drawings")
+    pattern = re.compile(r"\b(" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+    first = pattern.search(text)
+    if not first:
+        return None
+
+    start = max(0, first.start() - SNIPPET_RADIUS)
+    end = min(len(text), first.end() + SNIPPET_RADIUS)
+    snippet = text[start:end]
+
+    parts = []
+    position = 0
+    for match in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[position:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        position = match.end()
+    parts.append(html.escape(snippet[position:]))
+
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(text) else "")
+
+
+def document_highlights(doc: dict, terms: List[str], comment_texts: List[str] = ()) -> List[str]:
+    """Collect up to MAX_HIGHLIGHTS snippets from a document's searchable fields
+    and from the text of its matching comments."""
+    fields = [doc.get("title"), doc.get("reference_number"), doc.get("description")]
+    fields.extend(comment_texts)
+
+    highlights = []
+    for text in fields:
+        snippet = highlight(text, terms)
+        if snippet:
+            highlights.append(snippet)
+            if len(highlights) >= MAX_HIGHLIGHTS:
+                break
+    return highlights
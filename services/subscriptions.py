@@ -0,0 +1,186 @@
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from config import settings
+from database import (
+    subscriptions_collection,
+    users_collection,
+    projects_collection,
+    documents_collection,
+    comments_collection,
+)
+from services.user_cache import get_cached_user
+
+logger = logging.getLogger(__name__)
+
+# Who hears about what. A subscription ties a user to a target:
+#   ("project", project_id)   members: the project's creator, or anyone who watches it
+#   ("document", document_id) the uploader, commenters and watchers of a document
+#                             (replies and their comments also reach the thread root)
+#   ("all", "*")              everything; held by the DIGEST_ROLES, as a daily digest
+# Each subscription carries the user's email and delivery mode, so fanning an
+# event out is a single query on (target_type, target_id).
+
+DELIVERY_MODES = ["immediate", "hourly", "daily"]  # most to least urgent
+TARGET_TYPES = ["project", "document"]
+ALL_TARGET = {"type": "all", "id": "*"}
+BACKFILL_BATCH_SIZE = 500
+
+
+def event_targets(project_id: Optional[str] = None, document_id: Optional[str] = None,
+                  thread_root: Optional[str] = None) -> List[dict]:
+    targets = []
+    if project_id:
+        targets.append({"type": "project", "id": project_id})
+    for target_id in (document_id, thread_root):
+        if target_id:
+            targets.append({"type": "document", "id": target_id})
+    return targets
+
+
+def next_digest_at(delivery: str, now: Optional[datetime] = None) -> datetime:
+    """When an event queued now goes out for this delivery mode."""
+    now = now or datetime.utcnow()
+    if delivery == "hourly":
+        return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    due = now.replace(hour=settings.DIGEST_HOUR_UTC, minute=0, second=0, microsecond=0)
+    return due if due > now else due + timedelta(days=1)
+
+
+def _subscription_upsert(user_id, email, delivery, target_type, target_id, reason):
+    now = datetime.utcnow()
+    return UpdateOne(
+        {"target_type": target_type, "target_id": target_id, "user_id": user_id},
+        {"$setOnInsert": {
+            "email": email,
+            "delivery": delivery,
+            "reason": reason,
+            "active": True,
+            "created_at": now,
+        }},
+        upsert=True
+    )
+
+
+async def subscribe(user_id: str, target_type: str, target_id: str, reason: str):
+    """Subscribe a user to a target; existing subscriptions, including muted ones, are left as they are."""
+    user = await get_cached_user(user_id)
+    if not user or not user.is_active:
+        return
+    delivery = user.notification_delivery or "immediate"
+    await subscriptions_collection.bulk_write(
+        [_subscription_upsert(user_id, user.email, delivery, target_type, target_id, reason)]
+    )
+
+
+async def watch(user_id: str, target_type: str, target_id: str):
+    """Explicitly follow a target, un-muting it if it was muted."""
+    await subscribe(user_id, target_type, target_id, "watcher")
+    await subscriptions_collection.update_one(
+        {"target_type": target_type, "target_id": target_id, "user_id": user_id},
+        {"$set": {"active": True}}
+    )
+
+
+async def mute(user_id: str, target_type: str, target_id: str) -> bool:
+    """Stop notifications for a target. Kept as inactive so later activity doesn't re-subscribe the user."""
+    result = await subscriptions_collection.update_one(
+        {"target_type": target_type, "target_id": target_id, "user_id": user_id},
+        {"$set": {"active": False}}
+    )
+    return result.matched_count > 0
+
+
+async def list_subscriptions(user_id: str) -> List[dict]:
+    cursor = subscriptions_collection.find({"user_id": user_id}, {"user_id": 0, "email": 0}).sort("created_at", -1)
+    subscriptions = []
+    async for subscription in cursor:
+        subscription["id"] = str(subscription.pop("_id"))
+        subscriptions.append(subscription)
+    return subscriptions
+
+
+async def set_delivery(user_id: str, delivery: str):
+    """Set the user's delivery mode for every current and future subscription."""
+    await users_collection.update_one(
+        {"_id": ObjectId(user_id)}, {"$set": {"notification_delivery": delivery, "updated_at": datetime.utcnow()}}
+    )
+    await subscriptions_collection.update_many({"user_id": user_id}, {"$set": {"delivery": delivery}})
+
+
+async def sync_user(user: dict):
+    """Refresh a user's copies of email and role-based subscription after their record changed."""
+    user_id = str(user["_id"])
+    if not user.get("is_active", True):
+        await subscriptions_collection.delete_many({"user_id": user_id})
+        return
+    await subscriptions_collection.update_many({"user_id": user_id}, {"$set": {"email": user["email"]}})
+    all_target = {"target_type": ALL_TARGET["type"], "target_id": ALL_TARGET["id"], "user_id": user_id}
+    if user.get("role", "staff") in settings.DIGEST_ROLES:
+        await subscriptions_collection.bulk_write([_subscription_upsert(
+            user_id, user["email"], user.get("notification_delivery") or "daily",
+            ALL_TARGET["type"], ALL_TARGET["id"], "role"
+        )])
+    else:
+        await subscriptions_collection.delete_one({**all_target, "reason": "role"})
+
+
+async def remove_user(user_id: str):
+    await subscriptions_collection.delete_many({"user_id": user_id})
+
+
+async def resolve_subscribers(targets: List[dict], exclude_user_id: Optional[str] = None) -> List[dict]:
+    """Active subscribers of any of the targets, one entry per user with their most urgent delivery."""
+    query = {
+        "$or": [{"target_type": target["type"], "target_id": target["id"]} for target in targets + [ALL_TARGET]],
+        "active": True,
+    }
+    recipients = {}
+    async for subscription in subscriptions_collection.find(query, {"user_id": 1, "email": 1, "delivery": 1}):
+        user_id = subscription["user_id"]
+        if user_id == exclude_user_id:
+            continue
+        current = recipients.get(user_id)
+        if current is None or DELIVERY_MODES.index(subscription["delivery"]) < DELIVERY_MODES.index(current["delivery"]):
+            recipients[user_id] = {"_id": user_id, "email": subscription["email"], "delivery": subscription["delivery"]}
+    return list(recipients.values())
+
+
+async def backfill_subscriptions():
+    """Subscribe existing users to what they created or commented on, and the digest roles to everything."""
+    users = {}
+    async for user in users_collection.find({"is_active": {"$ne": False}}, {"email": 1, "role": 1}):
+        users[str(user["_id"])] = user
+
+    operations, created = [], 0
+
+    async def add(user_id, target_type, target_id, reason, delivery="immediate"):
+        nonlocal operations, created
+        user = users.get(user_id)
+        if not user or not target_id:
+            return
+        operations.append(_subscription_upsert(user_id, user["email"], delivery, target_type, target_id, reason))
+        if len(operations) >= BACKFILL_BATCH_SIZE:
+            result = await subscriptions_collection.bulk_write(operations, ordered=False)
+            created += result.upserted_count
+            operations = []
+
+    for user_id, user in users.items():
+        if user.get("role", "staff") in settings.DIGEST_ROLES:
+            await add(user_id, ALL_TARGET["type"], ALL_TARGET["id"], "role", "daily")
+    async for project in projects_collection.find({"created_by": {"$type": "string"}}, {"created_by": 1}):
+        await add(project["created_by"], "project", str(project["_id"]), "member")
+    async for document in documents_collection.find({"uploaded_by": {"$type": "string"}}, {"uploaded_by": 1}):
+        await add(document["uploaded_by"], "document", str(document["_id"]), "uploader")
+    pairs = comments_collection.aggregate([
+        {"$group": {"_id": {"document_id": "$document_id", "user_id": "$user_id"}}},
+    ], allowDiskUse=True)
+    async for pair in pairs:
+        await add(pair["_id"].get("user_id"), "document", pair["_id"].get("document_id"), "commenter")
+
+    if operations:
+        result = await subscriptions_collection.bulk_write(operations, ordered=False)
+        created += result.upserted_count
+    logger.info(f"Created {created} notification subscriptions")
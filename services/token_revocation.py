@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from config import settings
+from database import revoked_tokens_collection
+
+logger = logging.getLogger(__name__)
+
+SYNC_OVERLAP_SECONDS = 5
+
+
+class RevocationList:
+    """In-memory view of revoked tokens, checked on every authenticated request.
+
+    Two kinds of entry are kept: single tokens by `jti`, and per-user cutoffs
+    that reject every token issued to that user before a point in time (used
+    when a user is deactivated or their role changes). Entries are dropped
+    once the tokens they cover would have expired anyway, so the list stays
+    small. Mongo holds the durable copy; each worker syncs from it.
+    """
+
+    def __init__(self):
+        self._tokens = {}  # jti -> expires_at
+        self._users = {}  # user id -> (not_before, expires_at)
+        self._synced_at = None
+
+    def is_revoked(self, jti: Optional[str], user_id: str, issued_at: datetime) -> bool:
+        if jti and jti in self._tokens:
+            return True
+        cutoff = self._users.get(user_id)
+        return cutoff is not None and issued_at < cutoff[0]
+
+    def _add(self, entry: dict):
+        if entry["kind"] == "token":
+            self._tokens[entry["jti"]] = entry["expires_at"]
+        else:
+            self._users[entry["user_id"]] = (entry["not_before"], entry["expires_at"])
+
+    def prune(self):
+        now = datetime.utcnow()
+        self._tokens = {jti: exp for jti, exp in self._tokens.items() if exp > now}
+        self._users = {uid: cutoff for uid, cutoff in self._users.items() if cutoff[1] > now}
+
+    async def revoke_token(self, jti: str, expires_at: datetime):
+        entry = {"kind": "token", "jti": jti, "expires_at": expires_at, "revoked_at": datetime.utcnow()}
+        self._add(entry)
+        await revoked_tokens_collection.insert_one(entry)
+
+    async def revoke_user(self, user_id: str):
+        """Reject every token issued to `user_id` up to now."""
+        # Token iat has whole-second precision, so tokens issued later in this second stay valid
+        now = datetime.utcnow().replace(microsecond=0)
+        # Access tokens are short-lived, but refresh tokens live for days
+        expires_at = now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        entry = {"kind": "user", "user_id": user_id, "not_before": now, "expires_at": expires_at, "revoked_at": now}
+        self._add(entry)
+        await revoked_tokens_collection.update_one(
+            {"kind": "user", "user_id": user_id}, {"$set": entry}, upsert=True
+        )
+
+    async def sync(self):
+        """Pull entries revoked since the last sync, including other workers' revocations."""
+        query = {"expires_at": {"$gt": datetime.utcnow()}}
+        if self._synced_at:
+            # Overlap windows a little so writes from workers with skewed clocks aren't missed
+            query["revoked_at"] = {"$gte": self._synced_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)}
+        started = datetime.utcnow()
+        async for entry in revoked_tokens_collection.find(query):
+            self._add(entry)
+        self._synced_at = started
+        self.prune()
+
+    def stats(self) -> dict:
+        return {"tokens": len(self._tokens), "users": len(self._users)}
+
+
+revocation_list = RevocationList()
+_sync_task = None
+
+
+async def _sync_loop():
+    while True:
+        await asyncio.sleep(settings.REVOCATION_SYNC_SECONDS)
+        try:
+            await revocation_list.sync()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Token revocation sync error: {e}", exc_info=True)
+
+
+async def start_revocation_sync():
+    global _sync_task
+    await revocation_list.sync()
+    _sync_task = asyncio.create_task(_sync_loop())
+
+
+async def stop_revocation_sync():
+    global _sync_task
+    if _sync_task is None:
+        return
+    _sync_task.cancel()
+    try:
+        await _sync_task
+    except asyncio.CancelledError:
+        pass
+    _sync_task = None
@@ -0,0 +1,94 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from config import settings
+from services.cloudinary_service import cloudinary_uploader
+from services.assets import acquire_existing, asset_file_item, register_upload, release_file_items
+
+logger = logging.getLogger(__name__)
+
+# Cloudinary's SDK is blocking, so uploads run on a dedicated, bounded pool
+# rather than the event loop or the shared request threadpool.
+_executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_WORKERS, thread_name_prefix="cloudinary-upload")
+
+
+async def run_in_upload_pool(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context so upload timings are attributed to its request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(file):
+    """SHA-256 and size of a seekable file, read in blocks; leaves the file rewound."""
+    file.seek(0)
+    digest, size = hashlib.sha256(), 0
+    for block in iter(functools.partial(file.read, HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+        size += len(block)
+    file.seek(0)
+    return digest.hexdigest(), size
+
+
+async def store_file(file, filename: str, folder: str, hashed: Optional[Tuple[str, int]] = None) -> dict:
+    """Store one seekable file, reusing the existing asset if the same bytes were uploaded before.
+
+    The file is hashed first (unless the caller passes the `hash_file`
+    result); a known checksum takes a reference on the stored asset and
+    nothing is sent to Cloudinary.
+    """
+    checksum, size = hashed or await run_in_upload_pool(hash_file, file)
+    existing = await acquire_existing(checksum)
+    if existing:
+        logger.info(f"Reusing stored asset {existing['public_id']} for {filename}")
+        return asset_file_item(existing, filename)
+
+    result = await run_in_upload_pool(cloudinary_uploader.upload_large, file, filename, folder=folder)
+    return await register_upload({
+        "url": result["secure_url"],
+        "name": filename,
+        "public_id": result["public_id"],
+        "resource_type": result.get("resource_type", "raw"),
+        "bytes": result.get("bytes", size),
+        "checksum": checksum,
+    })
+
+
+def file_item(uploaded: dict) -> dict:
+    """The FileItem stored on a document for one upload result."""
+    return {key: uploaded.get(key) for key in ("url", "name", "public_id", "resource_type", "bytes", "checksum")}
+
+
+async def _upload_one(file: UploadFile, folder: str) -> dict:
+    return await store_file(file.file, file.filename, folder)
+
+
+async def upload_files(files: List[UploadFile], folder: str = "ministry_works") -> List[dict]:
+    """Upload all files of a request concurrently.
+
+    Returns one dict per file (url, name, public_id, resource_type, bytes,
+    checksum) in the order the files were given. If any upload fails the
+    ones that succeeded are deleted again before raising, so no orphaned
+    assets are left behind.
+    """
+    results = await asyncio.gather(*(_upload_one(file, folder) for file in files), return_exceptions=True)
+
+    uploaded = [result for result in results if not isinstance(result, BaseException)]
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        await rollback_uploads(uploaded)
+        raise HTTPException(status_code=500, detail=f"File upload failed: {str(failures[0])}")
+    return uploaded
+
+
+async def rollback_uploads(uploaded: List[dict]):
+    """Release the assets of a document that was never saved."""
+    await release_file_items(uploaded, reason="rollback")
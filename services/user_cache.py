@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from config import settings
+from database import users_collection
+from models.user import User
+
+
+class UserCache:
+    """TTL + LRU cache of authenticated principals, keyed by user id.
+
+    Entries are per process, so writes in another worker only become visible
+    here once the TTL expires; writes in this process invalidate immediately.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str) -> Optional[User]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, user_id: str, user: User):
+        self._entries[user_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+
+async def get_cached_user(user_id: str) -> Optional[User]:
+    """Return the User for `user_id`, hitting Mongo only on a cache miss."""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    try:
+        user_doc = await users_collection.find_one({"_id": ObjectId(user_id)})
+    except InvalidId:
+        return None
+    if not user_doc:
+        return None
+
+    user = User(**user_doc, id=str(user_doc["_id"]))
+    user_cache.set(user_id, user)
+    return user
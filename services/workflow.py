@@ -0,0 +1,306 @@
+import logging
+import uuid
+from datetime import datetime
+from typing import List, Optional
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from config import settings
+from database import approvals_collection, documents_collection, signatures_collection
+from models.user import Principal
+from services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_TASKS = 500
+BACKFILL_BATCH_SIZE = 500
+
+# Document review as a state machine. A document's `status` moves
+#   pending -> in_review -> approved
+#                        -> rejected -> (resubmitted) in_review ...
+# through the steps of the approval chain configured for its document_type
+# (APPROVAL_CHAINS, "role:action" per step; action is "approve" or "sign").
+# The chain is copied onto the document when it is submitted, together with
+# `workflow_cycle` (one per submission) and `workflow_step`.
+#
+# Each step is a task in `approvals` (unique per document, cycle and step),
+# assigned to a role; deciding it records the transition there. Documents
+# only move with compare-and-set updates on (status, cycle, step), so two
+# people acting on the same step can't both succeed.
+
+DECISIONS = {"approve": "approved", "sign": "signed", "reject": "rejected"}
+
+
+def chain_for(document_type: str) -> List[dict]:
+    chains = settings.APPROVAL_CHAINS
+    steps = chains.get(document_type, chains.get("default", []))
+    chain = []
+    for step in steps:
+        role, _, action = step.partition(":")
+        chain.append({"role": role, "action": action or "approve"})
+    return chain
+
+
+def workflow_fields(document_type: str, previous_cycle: int = 0) -> dict:
+    """Fields that put a new or resubmitted document into review."""
+    steps = chain_for(document_type)
+    return {
+        "status": "in_review" if steps else "approved",
+        "workflow_steps": steps,
+        "workflow_cycle": previous_cycle + 1,
+        "workflow_step": 0,
+    }
+
+
+def _task_for(document: dict, step: int) -> UpdateOne:
+    """Idempotently create the task for a document's step."""
+    spec = document["workflow_steps"][step]
+    document_id = str(document["_id"])
+    return UpdateOne(
+        {"document_id": document_id, "cycle": document["workflow_cycle"], "step": step},
+        {"$setOnInsert": {
+            "role": spec["role"],
+            "action": spec["action"],
+            "status": "pending",
+            "document_type": document.get("document_type"),
+            "project_id": document.get("project_id"),
+            "title": document.get("title"),
+            "created_at": datetime.utcnow(),
+        }},
+        upsert=True
+    )
+
+
+async def open_first_task(document: dict):
+    """Create the first task of a document that was just put into review."""
+    await open_first_tasks([document])
+
+
+async def open_first_tasks(documents: List[dict]):
+    tasks = [_task_for(document, 0) for document in documents if document.get("status") == "in_review"]
+    if tasks:
+        await approvals_collection.bulk_write(tasks, ordered=False)
+
+
+async def submit_document(document_id: str) -> dict:
+    """(Re)submit a pending or rejected document for review."""
+    document = await documents_collection.find_one({"_id": ObjectId(document_id)})
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if document.get("status") not in (None, "pending", "rejected"):
+        raise HTTPException(status_code=409, detail=f"Document is already {document['status']}")
+
+    fields = workflow_fields(document["document_type"], document.get("workflow_cycle", 0))
+    result = await documents_collection.update_one(
+        {"_id": document["_id"], "status": document.get("status"), "workflow_cycle": document.get("workflow_cycle")},
+        {"$set": {**fields, "updated_at": datetime.utcnow()}}
+    )
+    if not result.modified_count:
+        raise HTTPException(status_code=409, detail="Document was changed by someone else, try again")
+    document.update(fields)
+    await open_first_task(document)
+    await response_cache.invalidate("documents")
+    return document
+
+
+def _can_act(user: Principal, task: dict) -> bool:
+    return user.role == "admin" or user.role == task["role"]
+
+
+async def decide_tasks(task_ids: List[str], user: Principal, decision: str, reason: Optional[str] = None,
+                       signature_url: Optional[str] = None) -> dict:
+    """Approve, sign or reject many tasks at once.
+
+    Every document moves with one compare-and-set update in a single bulk
+    write; the ones that matched are found again by the operation id the
+    update stamps on them. Returns the task ids that succeeded and an error
+    for each one that didn't.
+    """
+    if decision not in DECISIONS:
+        raise HTTPException(status_code=422, detail=f"decision must be one of {list(DECISIONS)}")
+    if len(task_ids) > MAX_BULK_TASKS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BULK_TASKS} tasks per request")
+
+    failed = []
+    oids = []
+    for task_id in dict.fromkeys(task_ids):
+        if ObjectId.is_valid(task_id):
+            oids.append(ObjectId(task_id))
+        else:
+            failed.append({"task_id": task_id, "error": "Invalid task id"})
+
+    tasks = {task["_id"]: task async for task in approvals_collection.find({"_id": {"$in": oids}})}
+    eligible = []
+    for oid in oids:
+        task = tasks.get(oid)
+        if task is None:
+            error = "Task not found"
+        elif task["status"] != "pending":
+            error = f"Task is already {task['status']}"
+        elif not _can_act(user, task):
+            error = f"Task is assigned to role {task['role']}"
+        elif decision != "reject" and decision != task["action"]:
+            error = f"Task needs a {task['action']} decision"
+        else:
+            eligible.append(task)
+            continue
+        failed.append({"task_id": str(oid), "error": error})
+
+    # One task per document; a second task for the same document can only be stale
+    by_document = {}
+    for task in eligible:
+        if task["document_id"] in by_document:
+            failed.append({"task_id": str(task["_id"]), "error": "Another task for this document is in the request"})
+        else:
+            by_document[task["document_id"]] = task
+
+    documents = {
+        str(doc["_id"]): doc async for doc in documents_collection.find(
+            {"_id": {"$in": [ObjectId(document_id) for document_id in by_document]}},
+            {"workflow_steps": 1, "workflow_cycle": 1, "workflow_step": 1, "status": 1,
+             "document_type": 1, "project_id": 1, "title": 1}
+        )
+    }
+
+    op_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    updates = []
+    for document_id, task in by_document.items():
+        document = documents.get(document_id)
+        if document is None:
+            continue
+        update = {"updated_at": now, "workflow_last_op": op_id}
+        if decision == "reject":
+            update["status"] = "rejected"
+        elif task["step"] + 1 >= len(document.get("workflow_steps") or []):
+            update["status"] = "approved"
+        else:
+            update["workflow_step"] = task["step"] + 1
+        change = {"$set": update}
+        if decision == "sign":
+            change["$addToSet"] = {"signed_by": user.id}
+        updates.append(UpdateOne(
+            {"_id": document["_id"], "status": "in_review",
+             "workflow_cycle": task["cycle"], "workflow_step": task["step"]},
+            change
+        ))
+    if updates:
+        await documents_collection.bulk_write(updates, ordered=False)
+
+    moved = {
+        str(doc["_id"]) async for doc in documents_collection.find(
+            {"_id": {"$in": [ObjectId(document_id) for document_id in by_document]}, "workflow_last_op": op_id},
+            {"_id": 1}
+        )
+    }
+    succeeded = [task for document_id, task in by_document.items() if document_id in moved]
+    conflicted = [task for document_id, task in by_document.items() if document_id not in moved]
+
+    if succeeded:
+        await _record_decisions(succeeded, documents, user, decision, reason, signature_url, now)
+        await response_cache.invalidate("documents")
+    if conflicted:
+        await _resolve_conflicts(conflicted)
+        failed.extend(
+            {"task_id": str(task["_id"]), "error": "Document was changed by someone else"} for task in conflicted
+        )
+
+    return {"succeeded": [str(task["_id"]) for task in succeeded], "failed": failed}
+
+
+async def _record_decisions(tasks, documents, user, decision, reason, signature_url, now):
+    await approvals_collection.update_many(
+        {"_id": {"$in": [task["_id"] for task in tasks]}, "status": "pending"},
+        {"$set": {"status": DECISIONS[decision], "approved_by": user.id, "reason": reason, "decided_at": now}}
+    )
+    if decision != "reject":
+        next_tasks = []
+        for task in tasks:
+            document = documents[task["document_id"]]
+            if task["step"] + 1 < len(document["workflow_steps"]):
+                next_tasks.append(_task_for(document, task["step"] + 1))
+        if next_tasks:
+            await approvals_collection.bulk_write(next_tasks, ordered=False)
+    if decision == "sign":
+        await signatures_collection.insert_many([{
+            "document_id": task["document_id"],
+            "user_id": user.id,
+            "approval_id": str(task["_id"]),
+            "signature_url": signature_url,
+            "signed_at": now,
+        } for task in tasks])
+
+
+async def _resolve_conflicts(tasks):
+    """Tasks whose document no longer sits at their step are superseded; a missing current task is recreated."""
+    documents = documents_collection.find(
+        {"_id": {"$in": [ObjectId(task["document_id"]) for task in tasks]}},
+        {"workflow_steps": 1, "workflow_cycle": 1, "workflow_step": 1, "status": 1,
+         "document_type": 1, "project_id": 1, "title": 1}
+    )
+    current = {str(doc["_id"]): doc async for doc in documents}
+    stale, repairs = [], []
+    for task in tasks:
+        document = current.get(task["document_id"])
+        if document is None or document.get("status") != "in_review" or \
+                (document.get("workflow_cycle"), document.get("workflow_step")) != (task["cycle"], task["step"]):
+            stale.append(task["_id"])
+            if document is not None and document.get("status") == "in_review":
+                repairs.append(_task_for(document, document["workflow_step"]))
+    if stale:
+        await approvals_collection.update_many(
+            {"_id": {"$in": stale}, "status": "pending"}, {"$set": {"status": "superseded"}}
+        )
+    if repairs:
+        await approvals_collection.bulk_write(repairs, ordered=False)
+
+
+async def cancel_document_tasks(document_id: str):
+    """Take a deleted document's open tasks out of every inbox."""
+    await approvals_collection.update_many(
+        {"document_id": document_id, "status": "pending"},
+        {"$set": {"status": "cancelled", "decided_at": datetime.utcnow()}}
+    )
+
+
+def inbox_query(user: Principal) -> dict:
+    query = {"status": "pending"}
+    if user.role != "admin":
+        query["role"] = user.role
+    return query
+
+
+async def start_pending_workflows():
+    """Put documents that were waiting as "pending" before the workflow engine into review."""
+    started = 0
+    batch = []
+    cursor = documents_collection.find(
+        {"status": "pending", "workflow_cycle": {"$exists": False}},
+        {"document_type": 1, "project_id": 1, "title": 1}
+    )
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            started += await _start_batch(batch)
+            batch = []
+    if batch:
+        started += await _start_batch(batch)
+    logger.info(f"Put {started} pending documents into review")
+
+
+async def _start_batch(documents):
+    now = datetime.utcnow()
+    updates, tasks = [], []
+    for document in documents:
+        fields = workflow_fields(document.get("document_type"))
+        updates.append(UpdateOne(
+            {"_id": document["_id"], "workflow_cycle": {"$exists": False}},
+            {"$set": {**fields, "updated_at": now}}
+        ))
+        document.update(fields)
+        if fields["status"] == "in_review":
+            tasks.append(_task_for(document, 0))
+    await documents_collection.bulk_write(updates, ordered=False)
+    if tasks:
+        await approvals_collection.bulk_write(tasks, ordered=False)
+    return len(updates)
@@ -0,0 +1,5 @@
+import os
+
+# Settings are read at import time; these let the app modules load without a .env
+for name in ("MONGO_URL", "SECRET_KEY", "CLOUD_NAME", "API_KEY", "API_SECRET", "GMAIL_PASS", "GMAIL_USER"):
+    os.environ.setdefault(name, "mongodb://localhost:27017" if name == "MONGO_URL" else "test")
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("httpx")
+
+from bson import ObjectId  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from main import app  # noqa: E402
+from models.user import Principal  # noqa: E402
+from services.auth import get_current_user, get_current_admin_user  # noqa: E402
+import routes.assets  # noqa: E402
+import routes.projects  # noqa: E402
+
+ADMIN = Principal(id=str(ObjectId()), email="admin@example.com", role="admin")
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: ADMIN
+    app.dependency_overrides[get_current_admin_user] = lambda: ADMIN
+    # Without a `with` block the lifespan (Mongo, background workers) doesn't run
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_export_job_status_is_serialisable(client, monkeypatch):
+    job_id = ObjectId()
+    job = {"_id": job_id, "kind": "all", "status": "running", "content_hash": "abc", "created_at": datetime.utcnow()}
+
+    async def get_export_job(oid):
+        return dict(job) if oid == job_id else None
+
+    monkeypatch.setattr(routes.projects, "get_export_job", get_export_job)
+    response = client.get(f"/api/projects/export/jobs/{job_id}")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["id"] == str(job_id)
+    assert "_id" not in body and "content_hash" not in body
+
+
+def test_export_job_status_not_found(client, monkeypatch):
+    async def get_export_job(oid):
+        return None
+
+    monkeypatch.setattr(routes.projects, "get_export_job", get_export_job)
+    assert client.get(f"/api/projects/export/jobs/{ObjectId()}").status_code == 404
+
+
+def test_reconciliation_status_is_serialisable(client, monkeypatch):
+    job_id = ObjectId()
+
+    async def get_reconciliation(oid):
+        return {"_id": oid, "status": "completed", "orphans": [], "created_at": datetime.utcnow()}
+
+    monkeypatch.setattr(routes.assets, "get_reconciliation", get_reconciliation)
+    response = client.get(f"/api/assets/reconcile/{job_id}")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["id"] == str(job_id)
+    assert "_id" not in body
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("motor")
+
+from services.migrations import MIGRATIONS, _index_signature  # noqa: E402
+
+
+def _declared(version, collection, name):
+    migration = next(m for m in MIGRATIONS if m["version"] == version)
+    model = next(m for m in migration["indexes"][collection] if m.document["name"] == name)
+    return _index_signature(model.document["key"].items(), model.document)
+
+
+def test_text_index_matches_server_spec():
+    # Key spec as returned by index_information() for documents_text
+    server = {
+        "key": [("_fts", "text"), ("_ftsx", 1)],
+        "weights": {"title": 10, "reference_number": 8, "description": 4, "comments.content": 1},
+        "default_language": "english",
+    }
+    assert _index_signature(server["key"], server) == _declared(4, "documents", "documents_text")
+
+
+def test_compound_text_index_keeps_plain_fields():
+    server = {"key": [("project_id", 1.0), ("_fts", "text"), ("_ftsx", 1)]}
+    assert _index_signature(server["key"], server) == (
+        (("project_id", 1), ("_fts", "text"), ("_ftsx", 1)), False, None
+    )
+
+
+def test_unique_flag_is_part_of_signature():
+    server = {"key": [("email", 1)], "unique": True}
+    assert _index_signature(server["key"], server) == _declared(1, "users", "email_1")
+
+
+def test_dropped_indexes_are_not_declared():
+    from services.migrations import declared_indexes
+
+    names = {model.document["name"] for model in declared_indexes()["documents"]}
+    assert "project_id_1_created_at_-1" not in names
+    assert "project_id_1_created_at_-1__id_-1" in names
+
+
+def test_ttl_is_part_of_signature():
+    from services.migrations import declared_indexes
+
+    declared = next(model for model in declared_indexes()["logs"] if model.document["name"] == "timestamp_1")
+    server = {"key": [("timestamp", 1)], "expireAfterSeconds": 60.0}
+    assert _index_signature(server["key"], server) != _index_signature(
+        declared.document["key"].items(), declared.document
+    )
+    server["expireAfterSeconds"] = declared.document["expireAfterSeconds"]
+    assert _index_signature(server["key"], server) == _index_signature(
+        declared.document["key"].items(), declared.document
+    )